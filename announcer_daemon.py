@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Optional long-running announcer: every bot and checker in one process.
+
+The workflows start a fresh runner for each script, so every trigger pays for
+checkout, pip install, imports, config parsing and state loading before a
+single feed is read. This daemon imports the scripts once and runs them as
+jobs inside one asyncio loop. Config, compiled templates, the bots' seen-sets,
+feed validators and the pooled HTTP sessions stay warm between passes.
+
+The bots run one at a time, since they share state_rss.json. The checkers
+then run through checker_runner, which orders them by the state files they
+touch. Feed downloads are shared within a pass: the paid feed is fetched
+once for the paid bot, arcs, extras and completions. They are dropped before
+the next pass, so later passes still see new entries.
+
+A pass starts on a timer (DAEMON_INTERVAL) or on a local trigger, which takes
+the place of repository_dispatch:
+
+    curl -X POST http://127.0.0.1:8787/trigger -d '{"feed": "paid"}'
+
+``feed`` is "paid", "free", "comments" or "all" (the default), the same
+values the rss-feed repo sends as ``client_payload.feed``. Triggers that
+arrive during a pass are merged into the next one.
+
+Run with ``python announcer_daemon.py``. State commits are batched per pass,
+as in the workflows. Restart the daemon after changing config/ or the
+installed rss-feed mappings; templates are picked up on their own.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import os
+import time
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import feed_cache
+from checker_runner import FEED_STAGES, Stage, run_stages, stages_for
+from config_loader import positive_float_env
+from discord_delivery import report_stats
+from git_state_commit import flush_pending
+from run_metrics import span, start_run, write_report
+
+# Trigger name -> bots, run first and one at a time (they share
+# state_rss.json). The checkers then run through checker_runner, which
+# orders them by the state they touch and shares one feed cache.
+BOT_GROUPS: dict[str, list[str]] = {
+    "paid": ["bot_paid_chapters"],
+    "free": ["bot_free_chapters"],
+    "comments": ["bot_comments"],
+}
+
+
+DAEMON_INTERVAL = positive_float_env("DAEMON_INTERVAL", 300)
+DAEMON_HOST = str(os.getenv("DAEMON_HOST", "127.0.0.1")).strip() or "127.0.0.1"
+DAEMON_PORT = int(positive_float_env("DAEMON_PORT", 8787))
+
+
+def checker_stages(groups: set[str]) -> list[Stage]:
+    feeds = [feed for feed in FEED_STAGES if feed in groups]
+    if not feeds:
+        return []
+    return stages_for(feeds[0] if len(feeds) == 1 else "all")
+
+
+async def run_bot(module_name: str) -> None:
+    # run_once hands its blocking steps (feed downloads, state writes, git) to
+    # worker threads, so /trigger and /health keep answering during a pass.
+    with span(f"bot.{module_name}"):
+        await importlib.import_module(module_name).run_once()
+
+
+class Announcer:
+    """Runs passes one at a time and merges triggers that arrive meanwhile."""
+
+    def __init__(self) -> None:
+        self.pending: set[str] = set()
+        self.wake = asyncio.Event()
+        self.last_pass: dict[str, Any] = {}
+
+    def trigger(self, feed: str = "all") -> bool:
+        feed = (feed or "all").strip().lower()
+        if feed == "all":
+            self.pending.update(BOT_GROUPS)
+        elif feed in BOT_GROUPS:
+            self.pending.add(feed)
+        else:
+            return False
+        self.wake.set()
+        return True
+
+    async def run_pass(self, groups: set[str]) -> None:
+        started = time.monotonic()
+        failed: list[str] = []
+
+        # Each pass fetches fresh feeds; jobs within a pass share them.
+        feed_cache.clear()
+        try:
+            for name, group in BOT_GROUPS.items():
+                if name not in groups:
+                    continue
+                for module_name in group:
+                    print(f"▶️ {module_name}")
+                    try:
+                        await run_bot(module_name)
+                    except (Exception, SystemExit) as exc:
+                        failed.append(module_name)
+                        print(f"❌ {module_name} failed: {exc!r}")
+
+            stages = checker_stages(groups)
+            if stages:
+                results = await asyncio.to_thread(run_stages, stages)
+                failed.extend(name for name, status in results.items() if status != "ok")
+        finally:
+            await asyncio.to_thread(flush_pending)
+
+        elapsed = time.monotonic() - started
+        self.last_pass = {
+            "groups": sorted(groups),
+            "failed": failed,
+            "seconds": round(elapsed, 2),
+            "finished_at": time.time(),
+        }
+        report_stats()
+        write_report()
+        print(f"✅ Pass over {', '.join(sorted(groups))} done in {elapsed:.2f}s ({len(failed)} failed)")
+
+    async def worker(self) -> None:
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            groups, self.pending = self.pending, set()
+            if groups:
+                await self.run_pass(groups)
+
+    async def schedule(self, interval: float) -> None:
+        while True:
+            self.trigger("all")
+            await asyncio.sleep(interval)
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        status, body = 400, {"error": "bad request"}
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length") or 0)
+            raw = await reader.readexactly(length) if length else b""
+
+            if len(request_line) >= 2:
+                method, target = request_line[0].upper(), urlsplit(request_line[1])
+                if method == "GET" and target.path == "/health":
+                    status, body = 200, {"ok": True, "pending": sorted(self.pending), "last_pass": self.last_pass}
+                elif method == "POST" and target.path == "/trigger":
+                    feed = (parse_qs(target.query).get("feed") or [""])[0]
+                    if raw.strip():
+                        payload = json.loads(raw)
+                        feed = str(payload.get("feed") or feed) if isinstance(payload, dict) else feed
+                    if self.trigger(feed or "all"):
+                        status, body = 202, {"queued": sorted(self.pending)}
+                    else:
+                        body = {"error": f"unknown feed {feed!r}", "feeds": ["all", *BOT_GROUPS]}
+                else:
+                    status, body = 404, {"error": "not found"}
+        except (ValueError, asyncio.IncompleteReadError) as exc:
+            body = {"error": str(exc)}
+
+        data = json.dumps(body).encode("utf-8")
+        reason = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(*, host: str = DAEMON_HOST, port: int = DAEMON_PORT, interval: float = DAEMON_INTERVAL) -> None:
+    announcer = Announcer()
+    server = await asyncio.start_server(announcer.handle_http, host, port)
+    print(f"🚀 Announcer daemon listening on http://{host}:{port} (pass every {interval:g}s)")
+
+    async with server:
+        await asyncio.gather(announcer.worker(), announcer.schedule(interval))
+
+
+if __name__ == "__main__":
+    start_run("announcer_daemon")
+    asyncio.run(serve())
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Indexed arc history for new_arc_checker.
+
+A history file lists a novel's arcs as "【Arc N】 Name" titles in two ordered
+lists, unlocked and locked, plus the last announced title. The checker used
+to answer every question about them with a scan: which locked arc a free
+base belongs to, whether a base is known yet, the highest arc number. Long
+quick-transmigration novels carry 100+ arcs, and a full rescan asks those
+questions for every arc-start entry in both feeds.
+
+ArcHistory keeps the lists as insertion-ordered dicts and indexes them by
+base name (the title without its "【Arc N】" label), so those lookups and the
+locked → unlocked move are O(1), and it keeps the highest arc number cached.
+The JSON written back is the same as before; keys it does not manage
+are carried through untouched.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any
+
+ARC_NUMBER_RE = re.compile(r"【Arc\s*(\d+)】")
+ARC_LABEL_RE = re.compile(r"^【Arc\s*\d+】\s*")
+
+
+def arc_number(title: str) -> int | None:
+    """Arc number from a title containing 【Arc N】, or None."""
+    match = ARC_NUMBER_RE.search(title)
+    return int(match.group(1)) if match else None
+
+
+def arc_base(title: str) -> str:
+    """Title without its leading 【Arc N】 label."""
+    return ARC_LABEL_RE.sub("", title).strip()
+
+
+class ArcHistory:
+    """One novel's arc history with base-name indexes.
+
+    ``unlocked`` and ``locked`` return the titles in their saved order. Add
+    titles through ``add_unlocked`` / ``add_locked`` and move them with
+    ``unlock`` so the indexes stay in step; duplicates are dropped on the
+    way in.
+    """
+
+    def __init__(self, data: dict[str, Any] | None = None) -> None:
+        data = dict(data or {})
+        self._unlocked: dict[str, None] = {}
+        self._locked: dict[str, None] = {}
+        # base -> locked titles with that base, oldest first.
+        self._locked_by_base: dict[str, dict[str, None]] = {}
+        # base -> number of titles (either list) with that base.
+        self._base_counts: dict[str, int] = {}
+        self.max_number = 0
+
+        for title in data.pop("unlocked", None) or []:
+            self.add_unlocked(title)
+        for title in data.pop("locked", None) or []:
+            self.add_locked(title)
+
+        self.last_announced: str = data.pop("last_announced", "") or ""
+        self.extra: dict[str, Any] = data
+
+    # ── reading ──────────────────────────────────────────────────────────────
+
+    @property
+    def unlocked(self) -> list[str]:
+        return list(self._unlocked)
+
+    @property
+    def locked(self) -> list[str]:
+        return list(self._locked)
+
+    @property
+    def newest_locked(self) -> str | None:
+        return next(reversed(self._locked), None)
+
+    def has_base(self, base: str) -> bool:
+        return base in self._base_counts
+
+    def find_locked(self, base: str) -> str | None:
+        """The locked title for a base, as the checker matched it before.
+
+        The old scan took the first locked title ending with the base. An
+        exact base match is what that finds in practice; the scan is kept as
+        a fallback for bases that are only a suffix of a stored name.
+        """
+        exact = self._locked_by_base.get(base)
+        if exact:
+            return next(iter(exact))
+        return next((title for title in self._locked if title.endswith(base)), None)
+
+    # ── changing ─────────────────────────────────────────────────────────────
+
+    def _index(self, title: str) -> None:
+        base = arc_base(title)
+        self._base_counts[base] = self._base_counts.get(base, 0) + 1
+        number = arc_number(title)
+        if number and number > self.max_number:
+            self.max_number = number
+
+    def add_unlocked(self, title: str) -> bool:
+        if title in self._unlocked:
+            return False
+        self._unlocked[title] = None
+        self._index(title)
+        return True
+
+    def add_locked(self, title: str) -> bool:
+        if title in self._locked:
+            return False
+        self._locked[title] = None
+        self._locked_by_base.setdefault(arc_base(title), {})[title] = None
+        self._index(title)
+        return True
+
+    def unlock(self, title: str) -> bool:
+        """Move a locked title to unlocked; True if unlocked gained it."""
+        del self._locked[title]
+        base = arc_base(title)
+        same_base = self._locked_by_base[base]
+        del same_base[title]
+        if not same_base:
+            del self._locked_by_base[base]
+
+        if title in self._unlocked:
+            # It was listed twice; now it is only counted once.
+            self._base_counts[base] -= 1
+            return False
+        self._unlocked[title] = None
+        return True
+
+    # ── saving ───────────────────────────────────────────────────────────────
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "unlocked": self.unlocked,
+            "locked": self.locked,
+            "last_announced": self.last_announced,
+            **self.extra,
+        }
+
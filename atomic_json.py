@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Crash-safe JSON files for state, history and validators.
+
+``write_json_atomic`` never leaves a half-written file behind. It writes a
+temp file in the same folder, fsyncs it, and renames it over the target. A
+kill mid-write leaves the old file untouched. Before the rename, the old
+file is hard-linked to ``<name>.bak`` (copied where links are not
+supported), so the previous good version is always one step away.
+
+``read_json`` is the matching loader. When the file is missing, empty or
+corrupt and a ``.bak`` exists, it restores the backup and returns that
+instead of quietly starting from scratch. Starting from scratch is what used
+to reset seen GUIDs and re-announce old chapters.
+
+Temp names are unique per write, so two jobs writing the same file never
+interleave bytes; the last rename wins. ``write_text_atomic`` and
+``write_bytes_atomic`` do the same for other files (cached banners, metrics
+textfiles), without a backup by default.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import IO, Any, Callable
+
+_MISSING = object()
+
+
+def backup_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".bak")
+
+
+def _fsync_dir(folder: Path) -> None:
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _refresh_backup(path: Path) -> None:
+    bak = backup_path(path)
+    tmp_bak = bak.with_name(f".{bak.name}.{os.getpid()}.tmp")
+    try:
+        os.link(path, tmp_bak)
+    except FileNotFoundError:
+        return
+    except OSError:
+        shutil.copy2(path, tmp_bak)
+    os.replace(tmp_bak, bak)
+
+
+def _write_atomic(path: str | Path, write: Callable[[IO], None], *, binary: bool, backup: bool) -> None:
+    path = Path(path)
+    folder = path.parent if str(path.parent) else Path(".")
+    folder.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_name = tempfile.mkstemp(dir=folder, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if backup and path.exists():
+            _refresh_backup(path)
+
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+    _fsync_dir(folder)
+
+
+def write_json_atomic(
+    path: str | Path,
+    data: Any,
+    *,
+    indent: int | None = 2,
+    backup: bool = True,
+    default: Callable[[Any], Any] | None = None,
+) -> None:
+    """Write data as JSON to path via temp file + fsync + rename.
+
+    ``default`` is passed to json.dump for objects it cannot serialise.
+    """
+    _write_atomic(
+        path,
+        lambda f: json.dump(data, f, indent=indent, ensure_ascii=False, default=default),
+        binary=False,
+        backup=backup,
+    )
+
+
+def write_text_atomic(path: str | Path, text: str, *, backup: bool = False) -> None:
+    """Write text (UTF-8) to path the same way as write_json_atomic."""
+    _write_atomic(path, lambda f: f.write(text), binary=False, backup=backup)
+
+
+def write_bytes_atomic(path: str | Path, data: bytes, *, backup: bool = False) -> None:
+    """Write raw bytes to path the same way as write_json_atomic."""
+    _write_atomic(path, lambda f: f.write(data), binary=True, backup=backup)
+
+
+def _restore(bak: Path, path: Path) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.restore.tmp")
+    shutil.copy2(bak, tmp)
+    os.replace(tmp, path)
+
+
+def _read(path: Path) -> Any:
+    with path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_json(path: str | Path, default: Any = _MISSING) -> Any:
+    """Load JSON from path, recovering from path.bak if path is unusable.
+
+    Returns a copy of ``default`` when neither file exists. A corrupt file
+    with no usable backup raises the original error; guessing "first run"
+    there is what causes mass re-announcements.
+    """
+    path = Path(path)
+    try:
+        return _read(path)
+    except FileNotFoundError as exc:
+        error: Exception = exc
+    except (ValueError, UnicodeDecodeError) as exc:
+        error = exc
+
+    bak = backup_path(path)
+    try:
+        data = _read(bak)
+    except FileNotFoundError:
+        data = _MISSING
+    except (ValueError, UnicodeDecodeError):
+        print(f"⚠️ Backup {bak} is unreadable too.")
+        data = _MISSING
+
+    if data is not _MISSING:
+        print(f"♻️ {path} was unusable ({error.__class__.__name__}); restored it from {bak}")
+        _restore(bak, path)
+        return data
+
+    if isinstance(error, FileNotFoundError) and default is not _MISSING:
+        return copy.deepcopy(default)
+    raise error
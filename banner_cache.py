@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Disk cache for rendered completion banners.
+
+Building a banner means downloading the cover, decoding it, cropping it to
+the template's ratio and PNG-encoding the result, all inside the send path
+of a completion announcement. The finished files are kept in banner_cache/
+instead, named by a hash of everything that shapes them: image URL, the
+image's ETag (or Last-Modified), output size, crop position and attachment
+filename (which carries the NSFW spoiler prefix).
+
+A lookup costs one HEAD request for the validator. A replaced cover gets a
+new validator and so a new entry. Images served without either header are
+cached until evicted. The folder is capped at BANNER_CACHE_MAX_MB; hits
+refresh a file's mtime and the least recently used files go first.
+
+tools/prerender_banners.py fills the cache ahead of time for every novel
+with a last_chapter, so the completion post only reads a file.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import mimetypes
+import os
+from pathlib import Path
+
+import requests
+
+from announcement_banner import build_announcement_banner
+from atomic_json import write_bytes_atomic
+from config_loader import file_value, positive_float_env, repo_path
+
+
+BANNER_CACHE_DIR = str(file_value("banner_cache_dir", "banner_cache") or "banner_cache")
+BANNER_CACHE_MAX_MB = positive_float_env("BANNER_CACHE_MAX_MB", 64)
+BANNER_HEAD_TIMEOUT = positive_float_env("BANNER_HEAD_TIMEOUT", 10)
+
+Attachment = tuple[str, bytes, str]
+
+
+def cache_dir() -> Path:
+    return repo_path(BANNER_CACHE_DIR)
+
+
+def image_validator(image_url: str) -> str | None:
+    """ETag or Last-Modified of the image; "" if it has neither, None if unreachable."""
+    try:
+        resp = requests.head(image_url, allow_redirects=True, timeout=BANNER_HEAD_TIMEOUT)
+        resp.raise_for_status()
+    except requests.RequestException as exc:
+        print(f"⚠️ Could not check banner image {image_url}: {exc}")
+        return None
+    return resp.headers.get("ETag") or resp.headers.get("Last-Modified") or ""
+
+
+def cache_key(
+    image_url: str,
+    validator: str,
+    output_size: tuple[int, int] | None,
+    crop_position: str,
+    filename: str,
+) -> str:
+    material = json.dumps(
+        [image_url, validator, list(output_size) if output_size else None, crop_position, filename]
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _find_entry(key: str) -> Path | None:
+    # The suffix records the content type build_announcement_banner returned.
+    return next(cache_dir().glob(f"{key}.*"), None)
+
+
+def _read_entry(path: Path, filename: str) -> Attachment | None:
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)  # LRU: a hit counts as a use
+    except OSError:
+        pass
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return filename, data, content_type
+
+
+def evict(keep: Path | None = None) -> int:
+    """Drop least recently used banners until the folder fits the cap."""
+    limit = int(BANNER_CACHE_MAX_MB * 1024 * 1024)
+    files = []
+    for path in cache_dir().glob("*"):
+        if path.name.startswith(".") or not path.is_file():
+            continue
+        st = path.stat()
+        files.append((st.st_mtime_ns, st.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files, key=lambda item: item[0]):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def cached_banner(
+    image_url: str,
+    *,
+    output_size: tuple[int, int] | None,
+    crop_position: str,
+    filename: str,
+) -> Attachment | None:
+    """The banner attachment for an image, built only on a cache miss."""
+    validator = image_validator(image_url)
+    if validator is None:
+        # Without a validator a stale cover cannot be told apart; build fresh.
+        return build_announcement_banner(
+            image_url, output_size=output_size, crop_position=crop_position, filename=filename
+        )
+
+    key = cache_key(image_url, validator, output_size, crop_position, filename)
+    path = _find_entry(key)
+    hit = _read_entry(path, filename) if path is not None else None
+    if hit is not None:
+        print(f"🖼️ Banner cache hit for {filename} ({path.name})")
+        return hit
+
+    attachment = build_announcement_banner(
+        image_url, output_size=output_size, crop_position=crop_position, filename=filename
+    )
+    if attachment:
+        _, data, content_type = attachment
+        suffix = mimetypes.guess_extension(content_type or "") or ".bin"
+        path = cache_dir() / f"{key}{suffix}"
+        write_bytes_atomic(path, data)
+        evict(keep=path)
+    return attachment
@@ -1,13 +1,16 @@
 import os
-import json
 import asyncio
-import feedparser
 from dateutil import parser as dateparser
-import aiohttp
 from message_context import build_feed_context, entry_get
-from message_renderer import render_message, to_discord_api_payload
-from guid_state import entry_guid_identity, format_seen_guid, raw_guid_from_entry, seen_guid_identities
-from git_state_commit import commit_state_update
+from message_renderer import render_message
+from guid_state import SeenGuids, entry_guid_identity, entry_nonce, format_seen_guid, raw_guid_from_entry
+from git_state_commit import commit_paths_if_changed
+from state_journal import JournaledState, journal_path
+from feed_cache import feeds_unchanged, fetch_feed, save_validators, validators_path
+from feed_stream import unseen_entries
+from discord_delivery import RestSender
+from outbox import Outbox
+from run_metrics import start_run
 
 # ─── CONFIG ────────────────────────────────────────────────────────────────────
 from config_loader import (
@@ -26,9 +29,12 @@ CHANNEL_ID = server_channel_id_str("comments")
 
 STATE_FILE = require_file_value("rss_state_path")
 STATE_CHANGED = False
+FEED_SCOPE = "bot_comments"
+VALIDATORS_CHANGED = False
+STATE = JournaledState(STATE_FILE, journal_path(FEED_SCOPE))
+OUTBOX = Outbox(FEED_SCOPE)
 FEED_KEY   = require_feed_value("comments", "last_guid_key")
 RSS_URL    = require_feed_url("comments")
-API_URL    = f"https://discord.com/api/v10/channels/{CHANNEL_ID}/messages"
 
 SEEN_KEY       = require_feed_value("comments", "seen_key")
 LAST_POST_TIME = require_feed_value("comments", "last_post_time_key")
@@ -37,44 +43,52 @@ TIME_BACKSTOP  = bool(require_feeds_value("time_backstop"))
 # ────────────────────────────────────────────────────────────────────────────────
 
 def load_state():
-    try:
-        st = json.load(open(STATE_FILE, encoding="utf-8"))
-    except (FileNotFoundError, json.JSONDecodeError):
-        st = {
-          "free_last_guid":     None,
-          "paid_last_guid":     None,
-          "comments_last_guid": None,
-          SEEN_KEY:             [],
-          LAST_POST_TIME:       None,
-        }
-        save_state(st)
-        return st
+    st = STATE.load({
+        "free_last_guid":     None,
+        "paid_last_guid":     None,
+        "comments_last_guid": None,
+        SEEN_KEY:             [],
+        LAST_POST_TIME:       None,
+    })
 
     # migrate if missing
     changed = False
     if SEEN_KEY not in st:
-        st[SEEN_KEY] = []
         changed = True
+    if not isinstance(st.get(SEEN_KEY), SeenGuids):  # already live when STATE was reused
+        st[SEEN_KEY] = SeenGuids(st.get(SEEN_KEY), cap=SEEN_CAP)
     if LAST_POST_TIME not in st:
         st[LAST_POST_TIME] = None
         changed = True
     if changed:
-        save_state(st)
+        STATE.mark_dirty()
     return st
 
-def save_state(state):
+def save_state():
+    """Write the journaled state to STATE_FILE once, at the end of the run."""
     global STATE_CHANGED
-    # cap the seen list
-    if isinstance(state.get(SEEN_KEY), list) and len(state[SEEN_KEY]) > SEEN_CAP:
-        state[SEEN_KEY] = state[SEEN_KEY][-SEEN_CAP:]
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
-    STATE_CHANGED = True
+    if STATE.compact():
+        STATE_CHANGED = True
+
+
+def save_feed_validators():
+    """Remember this feed's ETag/Last-Modified once every entry was handled."""
+    global VALIDATORS_CHANGED
+    if save_validators(FEED_SCOPE):
+        VALIDATORS_CHANGED = True
 
 
 def commit_state_if_changed():
+    paths = []
     if STATE_CHANGED:
-        commit_state_update(STATE_FILE)
+        paths.extend([STATE_FILE, journal_path(FEED_SCOPE)])
+    if VALIDATORS_CHANGED:
+        paths.append(validators_path(FEED_SCOPE))
+    if OUTBOX.changed:
+        paths.append(OUTBOX.path.parent)  # queue file plus queued attachments
+        OUTBOX.changed = False
+    if paths:
+        commit_paths_if_changed(paths)
 
 def normalize_guid(entry):
     return format_seen_guid(entry, default_host="")
@@ -145,10 +159,14 @@ def build_comment_title(comment_txt: str, comment_image: str = "") -> str:
     return f"{start_marker}{safe_comment}{end_marker}"
 
 async def main():
+    if await asyncio.to_thread(feeds_unchanged, [RSS_URL], scope=FEED_SCOPE):
+        print("🛑 Comments feed unchanged since the last run.")
+        return
+
     state   = load_state()
-    feed    = feedparser.parse(RSS_URL)
-    entries = list(reversed(feed.entries))  # oldest → newest (keep your order)
-    seen = seen_guid_identities(state.get(SEEN_KEY, []))
+    seen    = state[SEEN_KEY]
+    # Streamed newest first up to the already-sent comments; oldest → newest (keep your order)
+    entries = list(reversed(await asyncio.to_thread(lambda: unseen_entries(fetch_feed(RSS_URL), seen))))
 
     # optional time backstop
     last_post_time = state.get(LAST_POST_TIME)
@@ -172,14 +190,13 @@ async def main():
                 continue
         if not include_nu_comments and is_novel_updates_entry(e):
             norm = normalize_guid(e)
-            state[SEEN_KEY].append(norm)
-            seen.add(guid_key)
+            seen.add(norm)
             skipped_nu_comments += 1
             continue
         to_send.append(e)
 
     if skipped_nu_comments:
-        save_state(state)
+        STATE.mark_dirty()
         print(
             f"🚫 Skipped {skipped_nu_comments} Novel Updates comment(s) "
             "because include_novel_updates_comments is false."
@@ -188,16 +205,17 @@ async def main():
     last = state.get(FEED_KEY)
     
     if not to_send:
+        save_feed_validators()
         print("🛑 No new comments to send.")
         return
 
-    headers = {
-        "Authorization": f"Bot {TOKEN}",
-        "Content-Type":  "application/json",
-    }
+    # Earlier queued comments go first, so the channel keeps its order.
+    await asyncio.to_thread(OUTBOX.drain, TOKEN)
 
-    async with aiohttp.ClientSession() as session:
+    async with RestSender(TOKEN, CHANNEL_ID) as sender:
+        send = OUTBOX.wrap(CHANNEL_ID, sender)
         new_last = last
+        failed = 0
 
         for entry in to_send:
             guid        = entry.get("guid") or entry.get("id")
@@ -222,29 +240,41 @@ async def main():
                 "comment_role_tail": role_tail,
             })
             
-            payload = to_discord_api_payload(render_message("comments", ctx))
-
-            async with session.post(API_URL, headers=headers, json=payload) as resp:
-                text = await resp.text()
-                if resp.status in (200, 204):
-                    print(f"✅ Sent comment {guid}")
-                    norm = normalize_guid(entry)
-                    state[SEEN_KEY].append(norm)
-                    seen.add(entry_guid_identity(entry))
-                    state[LAST_POST_TIME] = (parse_pub_iso(entry) or dateparser.parse("1970-01-01")).isoformat()
-                    new_last = raw_guid_from_entry(entry)
-                    save_state(state)
-                else:
-                    print(f"❌ Error {resp.status} for {guid}: {text}")
+            payload = render_message("comments", ctx)
+            payload["nonce"] = entry_nonce(CHANNEL_ID, entry)
+            if await send(payload):
+                print(f"✅ Sent comment {guid}")
+                STATE.update(
+                    append={SEEN_KEY: normalize_guid(entry)},
+                    set={LAST_POST_TIME: (parse_pub_iso(entry) or dateparser.parse("1970-01-01")).isoformat()},
+                )
+                new_last = raw_guid_from_entry(entry)
+            else:
+                failed += 1
+                print(f"❌ Failed to send comment {guid}")
 
         # ─── Save the new last_guid once ───────────────────────────────
         if new_last and new_last != last:
-            state[FEED_KEY] = new_last
-            save_state(state)
+            STATE.update(set={FEED_KEY: new_last})
             print(f"💾 Updated {STATE_FILE} → {new_last}")
 
-if __name__ == "__main__":
+        # Failed comments must be retried, so keep refetching the feed.
+        if not failed:
+            save_feed_validators()
+
+async def run_once():
+    """One full pass, state write and commit included (also used by the daemon)."""
+    global STATE_CHANGED, VALIDATORS_CHANGED
     try:
-        asyncio.run(main())
+        await main()
     finally:
-        commit_state_if_changed()
+        # Retry whatever is queued (also from earlier runs) before committing.
+        await asyncio.to_thread(OUTBOX.drain_until_empty, TOKEN)
+        await asyncio.to_thread(save_state)
+        await asyncio.to_thread(commit_state_if_changed)
+        STATE_CHANGED = VALIDATORS_CHANGED = False
+
+
+if __name__ == "__main__":
+    start_run("bot_comments")
+    asyncio.run(run_once())
@@ -1,20 +1,24 @@
 import os
-import json
 import asyncio
-import feedparser
 import re
 from datetime import datetime, timezone
 from dateutil import parser as dateparser
 import html
 from urllib.parse import urlsplit, urlunsplit
 
-import discord
 import requests
 
 from message_context import build_feed_context
-from message_renderer import render_message, to_discord_py_kwargs
-from guid_state import entry_guid_identity, format_seen_guid, raw_guid_from_entry, seen_guid_identities
-from git_state_commit import commit_state_update
+from message_renderer import render_message
+from chapter_batches import coalescing_enabled, group_chapters, render_chapter_batch
+from guid_state import SeenGuids, entry_guid_identity, entry_nonce, format_seen_guid, raw_guid_from_entry
+from git_state_commit import commit_paths_if_changed
+from state_journal import JournaledState, journal_path
+from feed_cache import feeds_unchanged, fetch_feed, save_validators, validators_path
+from feed_stream import unseen_entries
+from discord_delivery import deliver
+from outbox import Outbox
+from run_metrics import start_run
 
 from novel_mappings import get_translator_url
 
@@ -49,6 +53,10 @@ CHANNEL_ID = server_channel_id("free_chapters")
 
 STATE_FILE = require_file_value("rss_state_path")
 STATE_CHANGED = False
+FEED_SCOPE = "bot_free_chapters"
+VALIDATORS_CHANGED = False
+STATE = JournaledState(STATE_FILE, journal_path(FEED_SCOPE))
+OUTBOX = Outbox(FEED_SCOPE)
 FEED_KEY   = require_feed_value("free", "last_guid_key")
 RSS_URL    = require_feed_url("free")
 
@@ -64,42 +72,52 @@ TRANSLATOR_URL = str(server_value("translator_url", "") or "").strip()
 # ────────────────────────────────────────────────────────────────────────────────
 
 def load_state():
-    try:
-        st = json.load(open(STATE_FILE, encoding="utf-8"))
-    except (FileNotFoundError, json.JSONDecodeError):
-        st = {
-            "free_last_guid":     None,
-            "paid_last_guid":     None,
-            "comments_last_guid": None,
-            SEEN_KEY:             [],
-            LAST_POST_TIME:       None,
-        }
-        save_state(st)
-        return st
-
+    st = STATE.load({
+        "free_last_guid":     None,
+        "paid_last_guid":     None,
+        "comments_last_guid": None,
+        SEEN_KEY:             [],
+        LAST_POST_TIME:       None,
+    })
+
+    # migrate if missing
     changed = False
     if SEEN_KEY not in st:
-        st[SEEN_KEY] = []
         changed = True
+    if not isinstance(st.get(SEEN_KEY), SeenGuids):  # already live when STATE was reused
+        st[SEEN_KEY] = SeenGuids(st.get(SEEN_KEY), cap=SEEN_CAP)
     if LAST_POST_TIME not in st:
         st[LAST_POST_TIME] = None
         changed = True
     if changed:
-        save_state(st)
+        STATE.mark_dirty()
     return st
 
-def save_state(state):
+def save_state():
+    """Write the journaled state to STATE_FILE once, at the end of the run."""
     global STATE_CHANGED
-    if isinstance(state.get(SEEN_KEY), list) and len(state[SEEN_KEY]) > SEEN_CAP:
-        state[SEEN_KEY] = state[SEEN_KEY][-SEEN_CAP:]
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
-    STATE_CHANGED = True
+    if STATE.compact():
+        STATE_CHANGED = True
+
+
+def save_feed_validators():
+    """Remember this feed's ETag/Last-Modified once every entry was handled."""
+    global VALIDATORS_CHANGED
+    if save_validators(FEED_SCOPE):
+        VALIDATORS_CHANGED = True
 
 
 def commit_state_if_changed():
+    paths = []
     if STATE_CHANGED:
-        commit_state_update(STATE_FILE)
+        paths.extend([STATE_FILE, journal_path(FEED_SCOPE)])
+    if VALIDATORS_CHANGED:
+        paths.append(validators_path(FEED_SCOPE))
+    if OUTBOX.changed:
+        paths.append(OUTBOX.path.parent)  # queue file plus queued attachments
+        OUTBOX.changed = False
+    if paths:
+        commit_paths_if_changed(paths)
 
 def is_nsfw(entry) -> bool:
     cat = (entry.get("category") or "").strip().upper()
@@ -201,12 +219,16 @@ def parse_pub_iso(entry):
         return None
 
 async def send_new_entries():
+    if await asyncio.to_thread(feeds_unchanged, [RSS_URL], scope=FEED_SCOPE):
+        print("🛑 Free feed unchanged since the last run—nothing to send.")
+        return
+
     state = load_state()
     last  = state.get(FEED_KEY)
-    feed  = feedparser.parse(RSS_URL)
-    entries = list(reversed(feed.entries))  # oldest → newest
+    seen  = state[SEEN_KEY]
+    # Streamed newest first up to the already-announced entries; oldest → newest
+    entries = list(reversed(await asyncio.to_thread(lambda: unseen_entries(fetch_feed(RSS_URL), seen))))
 
-    seen = seen_guid_identities(state.get(SEEN_KEY, []))
     last_post_time = state.get(LAST_POST_TIME)
     last_post_dt = dateparser.parse(last_post_time) if (TIME_BACKSTOP and last_post_time) else None
 
@@ -225,27 +247,20 @@ async def send_new_entries():
         to_send.append(e)
 
     if not to_send:
-        print("🛑 No new free chapters—skipping Discord login.")
+        save_feed_validators()
+        print("🛑 No new free chapters—nothing to send.")
         return
 
-    intents = discord.Intents.default()
-    bot = discord.Client(intents=intents)
-
-    @bot.event
-    async def on_ready():
-        channel = bot.get_channel(CHANNEL_ID)
-        if channel is None:
-            print(f"❌ Cannot find channel {CHANNEL_ID}")
-            await bot.close()
-            return
-
+    async def announce(send):
         updated_titles = set()  # (title, host)
+        held_any = False
+        failed = False
+        ready = []  # (entry, ctx) still to announce, in feed order
 
         new_last = last
 
         for entry in to_send:
             guid = entry.get("guid") or entry.get("id")
-            guid_key = entry_guid_identity(entry)
 
             # Pull source fields first
             host        = (entry.get("host") or "").strip()
@@ -267,12 +282,9 @@ async def send_new_entries():
                     f"{ctx.get('title', '')} / {ctx.get('chapter', '')} / {guid}. "
                     "announce_first_chapter_release is false."
                 )
+                held_any = True
                 continue
             
-            title = ctx["title"]
-            chapter = ctx["chapter"]
-            updated_titles.add((title, host))
-            
             ctx.update({
                 "chapter_mention": mention_line,
                 "global_mention": GLOBAL_MENTION,
@@ -283,43 +295,72 @@ async def send_new_entries():
                 ),
             })
             
-            payload = render_message("free_chapters", ctx)
-            kwargs = to_discord_py_kwargs(payload)
-            
-            await channel.send(**kwargs)
+            ready.append((entry, ctx))
 
-            print(f"📨 Sent: {chapter} / {guid}")
-
-            # mark as seen and bump time (timezone-aware)
-            norm = normalize_guid(entry)
-            state[SEEN_KEY].append(norm)
-            seen.add(guid_key)
-            dt = parse_pub_iso(entry) or datetime.now(timezone.utc)
-            state[LAST_POST_TIME] = dt.isoformat()
-            save_state(state)
+        if coalescing_enabled():
+            groups = group_chapters(
+                ready,
+                key=lambda item: item[1].get("short_code"),
+                when=lambda item: parse_pub_iso(item[0]),
+            )
+        else:
+            groups = [[item] for item in ready]
+
+        for group in groups:
+            if len(group) == 1:
+                payload = render_message("free_chapters", group[0][1])
+            else:
+                payload = render_chapter_batch("free_chapters", [ctx for _, ctx in group])
+            payload["nonce"] = entry_nonce(CHANNEL_ID, *(entry for entry, _ in group))
+            if not await send(payload):
+                failed = True
+                break
+
+            for entry, ctx in group:
+                guid = entry.get("guid") or entry.get("id")
+                print(f"📨 Sent: {ctx['chapter']} / {guid}")
+                updated_titles.add((ctx["title"], (entry.get("host") or "").strip()))
+
+                # mark as seen and bump time (timezone-aware)
+                dt = parse_pub_iso(entry) or datetime.now(timezone.utc)
+                STATE.update(
+                    append={SEEN_KEY: normalize_guid(entry)},
+                    set={LAST_POST_TIME: dt.isoformat()},
+                )
 
-            new_last = raw_guid_from_entry(entry)
+                new_last = raw_guid_from_entry(entry)
 
         if new_last and new_last != state.get(FEED_KEY):
-            state[FEED_KEY] = new_last
-            save_state(state)
+            STATE.update(set={FEED_KEY: new_last})
             print(f"💾 Updated {STATE_FILE}[\"{FEED_KEY}\"] → {new_last}")
 
+        # Held or unsent chapters must be looked at again, so keep refetching the feed.
+        if not held_any and not failed:
+            save_feed_validators()
+
         # 🔔 trigger once per novel
         for title, host in updated_titles:
             try:
-                trigger_status_update(title, host)
+                await asyncio.to_thread(trigger_status_update, title, host)
             except Exception as exc:
                 print(f"⚠️ Optional card status update crashed for {title}; skipped: {exc}")
 
-        await asyncio.sleep(1)
-        await bot.close()
-
-    await bot.start(TOKEN)
+    await deliver(TOKEN, CHANNEL_ID, announce, outbox=OUTBOX)
     
 
-if __name__ == "__main__":
+async def run_once():
+    """One full pass, state write and commit included (also used by the daemon)."""
+    global STATE_CHANGED, VALIDATORS_CHANGED
     try:
-        asyncio.run(send_new_entries())
+        await send_new_entries()
     finally:
-        commit_state_if_changed()
\ No newline at end of file
+        # Retry whatever is queued (also from earlier runs) before committing.
+        await asyncio.to_thread(OUTBOX.drain_until_empty, TOKEN)
+        await asyncio.to_thread(save_state)
+        await asyncio.to_thread(commit_state_if_changed)
+        STATE_CHANGED = VALIDATORS_CHANGED = False
+
+
+if __name__ == "__main__":
+    start_run("bot_free_chapters")
+    asyncio.run(run_once())
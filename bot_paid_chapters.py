@@ -1,20 +1,24 @@
 import os
-import json
 import asyncio
-import feedparser
 import re
 from datetime import datetime, timezone
 from dateutil import parser as dateparser
 import html
 from urllib.parse import urlsplit, urlunsplit
 
-import discord
 import requests
 
 from message_context import build_feed_context
-from message_renderer import render_message, to_discord_py_kwargs
-from guid_state import entry_guid_identity, format_seen_guid, raw_guid_from_entry, seen_guid_identities
-from git_state_commit import commit_state_update
+from message_renderer import render_message
+from chapter_batches import coalescing_enabled, group_chapters, render_chapter_batch
+from guid_state import SeenGuids, entry_guid_identity, entry_nonce, format_seen_guid, raw_guid_from_entry
+from git_state_commit import commit_paths_if_changed
+from state_journal import JournaledState, journal_path
+from feed_cache import feeds_unchanged, fetch_feed, save_validators, validators_path
+from feed_stream import unseen_entries
+from discord_delivery import deliver
+from outbox import Outbox
+from run_metrics import start_run
 
 from novel_mappings import get_translator_url, get_coin_emoji
 
@@ -37,6 +41,10 @@ CHANNEL_ID = server_channel_id("paid_chapters")
 
 STATE_FILE = require_file_value("rss_state_path")
 STATE_CHANGED = False
+FEED_SCOPE = "bot_paid_chapters"
+VALIDATORS_CHANGED = False
+STATE = JournaledState(STATE_FILE, journal_path(FEED_SCOPE))
+OUTBOX = Outbox(FEED_SCOPE)
 FEED_KEY   = require_feed_value("paid", "last_guid_key")
 RSS_URL    = require_feed_url("paid")
 
@@ -53,46 +61,54 @@ TRANSLATOR_URL = str(server_value("translator_url", "") or "").strip()
 
 
 def load_state():
-    try:
-        st = json.load(open(STATE_FILE, encoding="utf-8"))
-    except (FileNotFoundError, json.JSONDecodeError):
-        # first run / corrupted file -> seed with all keys, including the new ones
-        st = {
-            "free_last_guid":     None,
-            "paid_last_guid":     None,
-            "comments_last_guid": None,
-            SEEN_KEY:             [],
-            LAST_POST_TIME:       None,
-        }
-        save_state(st)
-        return st
+    st = STATE.load({
+        "free_last_guid":     None,
+        "paid_last_guid":     None,
+        "comments_last_guid": None,
+        SEEN_KEY:             [],
+        LAST_POST_TIME:       None,
+    })
 
     # ── put the migration block HERE (existing state on disk) ──
     changed = False
     if SEEN_KEY not in st:
-        st[SEEN_KEY] = []
         changed = True
+    if not isinstance(st.get(SEEN_KEY), SeenGuids):  # already live when STATE was reused
+        st[SEEN_KEY] = SeenGuids(st.get(SEEN_KEY), cap=SEEN_CAP)
     if LAST_POST_TIME not in st:
         st[LAST_POST_TIME] = None
         changed = True
     if changed:
-        save_state(st)
+        STATE.mark_dirty()
     return st
 
 
-def save_state(state):
+def save_state():
+    """Write the journaled state to STATE_FILE once, at the end of the run."""
     global STATE_CHANGED
-    if isinstance(state.get(SEEN_KEY), list) and len(state[SEEN_KEY]) > SEEN_CAP:
-        state[SEEN_KEY] = state[SEEN_KEY][-SEEN_CAP:]
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
-    STATE_CHANGED = True
+    if STATE.compact():
+        STATE_CHANGED = True
+
+
 
+def save_feed_validators():
+    """Remember this feed's ETag/Last-Modified once every entry was handled."""
+    global VALIDATORS_CHANGED
+    if save_validators(FEED_SCOPE):
+        VALIDATORS_CHANGED = True
 
 
 def commit_state_if_changed():
+    paths = []
     if STATE_CHANGED:
-        commit_state_update(STATE_FILE)
+        paths.extend([STATE_FILE, journal_path(FEED_SCOPE)])
+    if VALIDATORS_CHANGED:
+        paths.append(validators_path(FEED_SCOPE))
+    if OUTBOX.changed:
+        paths.append(OUTBOX.path.parent)  # queue file plus queued attachments
+        OUTBOX.changed = False
+    if paths:
+        commit_paths_if_changed(paths)
 
 def is_nsfw(entry) -> bool:
     cat = (entry.get("category") or "").strip().upper()
@@ -201,9 +217,9 @@ def parse_pub_iso(entry):
 
 def parse_custom_emoji(e: str):
     """
-    Try to turn something like "<:mistmint_currency:1433046707121422487>"
-    or "<a:dance:1234567890>" into a PartialEmoji that can be passed as
-    Button(emoji=...).
+    Normalise something like "<:mistmint_currency:1433046707121422487>"
+    or "<a:dance:1234567890>" for a button's emoji field; the renderer turns
+    it into the API emoji object.
 
     If it's plain unicode like "🔥", return the unicode string.
     If it's junk / empty, return None.
@@ -213,19 +229,8 @@ def parse_custom_emoji(e: str):
 
     s = e.strip()
 
-    m = re.match(
-        r"^<(?P<anim>a?):(?P<name>[A-Za-z0-9_]+):(?P<id>\d+)>$",
-        s
-    )
-    if m:
-        animated = bool(m.group("anim"))
-        name     = m.group("name")
-        emoji_id = int(m.group("id"))
-        return discord.PartialEmoji(
-            name=name,
-            id=emoji_id,
-            animated=animated,
-        )
+    if re.match(r"^<a?:[A-Za-z0-9_]+:\d+>$", s):
+        return s
 
     if "<" not in s and ">" not in s and ":" not in s and len(s) <= 8:
         return s
@@ -237,12 +242,12 @@ def get_coin_button_parts_from_feed(coin_text: str, host: str = ""):
     """
     Parse <coin> like:
       "5", "<:mistmint_currency:143...> 5", "🔥 5", "🔥5"
-    Return (label_text, emoji_obj_or_unicode).
+    Return (label_text, custom_or_unicode_emoji).
     """
     s = (coin_text or "").strip()
     original = s
     label_text = ""
-    emoji_obj = None
+    emoji = None
 
     if not s:
         return "Read here", None
@@ -251,14 +256,14 @@ def get_coin_button_parts_from_feed(coin_text: str, host: str = ""):
     # so get it from rss-feed host mappings instead of storing it in <coin>.
     mapped_emoji = parse_custom_emoji(get_coin_emoji(host))
     if mapped_emoji:
-        emoji_obj = mapped_emoji
+        emoji = mapped_emoji
 
     # Backward compatible with old feed shape: <coin><:emoji:id> 5</coin>.
     m = re.match(r"^\s*(<a?:[A-Za-z0-9_]+:\d+>)", s)
     if m:
         feed_emoji = parse_custom_emoji(m.group(1))
         if feed_emoji:
-            emoji_obj = feed_emoji
+            emoji = feed_emoji
         s = s[m.end():]
     else:
         m2 = re.match(r"^\s*(\S+)", s)
@@ -268,7 +273,7 @@ def get_coin_button_parts_from_feed(coin_text: str, host: str = ""):
             if not re.fullmatch(r"\d+", tok):
                 maybe = parse_custom_emoji(tok)
                 if maybe:
-                    emoji_obj = maybe
+                    emoji = maybe
                     s = s[m2.end():]
 
     mnum = re.search(r"\d+", s) or re.search(r"\d+", original)
@@ -278,17 +283,21 @@ def get_coin_button_parts_from_feed(coin_text: str, host: str = ""):
     if not label_text:
         label_text = "Read here"
 
-    return label_text, emoji_obj
+    return label_text, emoji
 
 
 async def send_new_paid_entries():
+    if await asyncio.to_thread(feeds_unchanged, [RSS_URL], scope=FEED_SCOPE):
+        print("🛑 Paid feed unchanged since the last run—nothing to send.")
+        return
+
     state = load_state()
     last = state.get(FEED_KEY)
 
-    feed = feedparser.parse(RSS_URL)
-    entries = list(reversed(feed.entries))  # oldest → newest order
+    seen = state[SEEN_KEY]
+    # Streamed newest first up to the already-announced entries; oldest → newest order
+    entries = list(reversed(await asyncio.to_thread(lambda: unseen_entries(fetch_feed(RSS_URL), seen))))
 
-    seen = seen_guid_identities(state.get(SEEN_KEY, []))
     last_post_time = state.get(LAST_POST_TIME)
     last_post_dt = (
         dateparser.parse(last_post_time)
@@ -311,25 +320,18 @@ async def send_new_paid_entries():
         to_send.append(e)
 
     if not to_send:
-        print("🛑 No new paid chapters—skipping Discord login.")
+        save_feed_validators()
+        print("🛑 No new paid chapters—nothing to send.")
         return
 
-    intents = discord.Intents.default()
-    bot = discord.Client(intents=intents)
-
-    @bot.event
-    async def on_ready():
-        channel = bot.get_channel(CHANNEL_ID)
-        if not channel:
-            print(f"❌ Cannot find channel {CHANNEL_ID}")
-            await bot.close()
-            return
-
+    async def announce(send):
+        held_any = False
+        failed = False
+        ready = []  # (entry, ctx) still to announce, in feed order
         new_last = last
 
         for entry in to_send:
             guid = entry.get("guid") or entry.get("id")
-            guid_key = entry_guid_identity(entry)
 
             host = (entry.get("host") or "").strip()
             series_role = get_series_role(entry)
@@ -349,9 +351,10 @@ async def send_new_paid_entries():
                     f"{ctx.get('title', '')} / {ctx.get('chapter', '')} / {guid}. "
                     "announce_first_chapter_release is false."
                 )
+                held_any = True
                 continue
             
-            label_text, emoji_obj = get_coin_button_parts_from_feed(
+            label_text, emoji = get_coin_button_parts_from_feed(
                 ctx["coin"],
                 ctx.get("host", ""),
             )
@@ -365,42 +368,68 @@ async def send_new_paid_entries():
                     or TRANSLATOR_URL
                 ),
                 "button_label": label_text,
-                "button_emoji": str(emoji_obj or ""),
+                "button_emoji": emoji or "",
             })
             
-            payload = render_message("paid_chapters", ctx)
-            kwargs = to_discord_py_kwargs(payload)
-            
-            await channel.send(**kwargs)
-            
-            chapter = ctx["chapter"]
-            print(f"📨 Sent paid: {chapter} / {guid}")
-
-            norm = normalize_guid(entry)
-            state[SEEN_KEY].append(norm)
-            seen.add(guid_key)
+            ready.append((entry, ctx))
 
-            dt = parse_pub_iso(entry) or datetime.now(timezone.utc)
-            state[LAST_POST_TIME] = dt.isoformat()
-
-            save_state(state)
-            new_last = raw_guid_from_entry(entry)
+        if coalescing_enabled():
+            groups = group_chapters(
+                ready,
+                key=lambda item: item[1].get("short_code"),
+                when=lambda item: parse_pub_iso(item[0]),
+            )
+        else:
+            groups = [[item] for item in ready]
+
+        for group in groups:
+            if len(group) == 1:
+                payload = render_message("paid_chapters", group[0][1])
+            else:
+                payload = render_chapter_batch("paid_chapters", [ctx for _, ctx in group])
+            payload["nonce"] = entry_nonce(CHANNEL_ID, *(entry for entry, _ in group))
+            if not await send(payload):
+                failed = True
+                break
+
+            for entry, ctx in group:
+                guid = entry.get("guid") or entry.get("id")
+                chapter = ctx["chapter"]
+                print(f"📨 Sent paid: {chapter} / {guid}")
+
+                dt = parse_pub_iso(entry) or datetime.now(timezone.utc)
+                STATE.update(
+                    append={SEEN_KEY: normalize_guid(entry)},
+                    set={LAST_POST_TIME: dt.isoformat()},
+                )
+                new_last = raw_guid_from_entry(entry)
 
         if new_last and new_last != state.get(FEED_KEY):
-            state[FEED_KEY] = new_last
-            save_state(state)
+            STATE.update(set={FEED_KEY: new_last})
             print(
                 f"💾 Updated {STATE_FILE}[\"{FEED_KEY}\"] → {new_last}"
             )
 
-        await asyncio.sleep(1)
-        await bot.close()
+        # Held or unsent chapters must be looked at again, so keep refetching the feed.
+        if not held_any and not failed:
+            save_feed_validators()
 
-    await bot.start(TOKEN)
+    await deliver(TOKEN, CHANNEL_ID, announce, outbox=OUTBOX)
 
 
-if __name__ == "__main__":
+async def run_once():
+    """One full pass, state write and commit included (also used by the daemon)."""
+    global STATE_CHANGED, VALIDATORS_CHANGED
     try:
-        asyncio.run(send_new_paid_entries())
+        await send_new_paid_entries()
     finally:
-        commit_state_if_changed()
+        # Retry whatever is queued (also from earlier runs) before committing.
+        await asyncio.to_thread(OUTBOX.drain_until_empty, TOKEN)
+        await asyncio.to_thread(save_state)
+        await asyncio.to_thread(commit_state_if_changed)
+        STATE_CHANGED = VALIDATORS_CHANGED = False
+
+
+if __name__ == "__main__":
+    start_run("bot_paid_chapters")
+    asyncio.run(run_once())
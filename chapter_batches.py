@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Coalesce chapter announcements into one message per novel.
+
+When a novel drops ten chapters at once, the chapter bots used to send ten
+messages, each with its own role ping and each taking its own rate-limit
+slot. With coalescing on, a run of consecutive new chapters of the same
+novel (same short code) published within CHAPTER_COALESCE_WINDOW seconds go
+out as one message. That message carries one ping, one embed per chapter (Discord
+allows 10) and the chapters' buttons. It is rendered from the template's
+[batch] variant.
+
+Only neighbours are merged, so messages still go out in feed order and
+the bots' last_guid / last_post_time only ever move forward. A lone chapter
+still uses the normal template. Coalescing is opt-in: set
+CHAPTER_COALESCE=1 or "coalesce_chapters": true in config/server.json.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Any, Callable, Hashable, Iterable, TypeVar
+
+from config_loader import positive_float_env, server_value
+from message_renderer import render_message
+
+T = TypeVar("T")
+
+MAX_EMBEDS = 10  # Discord's limit per message
+MAX_ROW_BUTTONS = 5
+MAX_ACTION_ROWS = 5
+BATCH_VARIANT = "batch"
+
+
+CHAPTER_COALESCE_WINDOW = positive_float_env("CHAPTER_COALESCE_WINDOW", 3600)
+
+
+def coalescing_enabled() -> bool:
+    raw = os.getenv("CHAPTER_COALESCE")
+    if raw is None:
+        raw = server_value("coalesce_chapters", False)
+    if isinstance(raw, bool):
+        return raw
+    return str(raw).strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def group_chapters(
+    items: Iterable[T],
+    *,
+    key: Callable[[T], Hashable],
+    when: Callable[[T], datetime | None],
+    window: float = CHAPTER_COALESCE_WINDOW,
+    limit: int = MAX_EMBEDS,
+) -> list[list[T]]:
+    """Merge runs of consecutive items with the same key into groups.
+
+    An item joins the group just before it when the keys match, the group
+    spans at most window seconds and holds fewer than limit items; otherwise
+    it starts a new group. Concatenating the groups gives items back in
+    their original order. Items without a key or a time stay on their own.
+    """
+    groups: list[list[T]] = []
+    current_key: Hashable = None
+    started: datetime | None = None
+
+    for item in items:
+        item_key, item_time = key(item), when(item)
+        if not item_key or item_time is None:
+            groups.append([item])
+            current_key = started = None
+            continue
+
+        if groups and current_key == item_key and started is not None:
+            group = groups[-1]
+            try:
+                fits = abs((item_time - started).total_seconds()) <= window
+            except TypeError:  # naive vs aware timestamps
+                fits = False
+            if fits and len(group) < limit:
+                group.append(item)
+                continue
+
+        groups.append([item])
+        current_key, started = item_key, item_time
+
+    return groups
+
+
+def render_chapter_batch(name: str, contexts: list[dict[str, Any]]) -> dict[str, Any]:
+    """One message for several chapters, from the [batch] variant of name.
+
+    Every chapter is rendered with the batch fields added (batch_count,
+    first_chapter, last_chapter). The first render supplies the content and
+    mentions. The embeds and link buttons of all of them are collected.
+    """
+    batch = {
+        "batch_count": len(contexts),
+        "first_chapter": contexts[0].get("chapter", ""),
+        "last_chapter": contexts[-1].get("chapter", ""),
+    }
+    rendered = [render_message(name, {**ctx, **batch}, variant=BATCH_VARIANT) for ctx in contexts]
+
+    payload = rendered[0]
+    embeds = [embed for message in rendered for embed in message.get("embeds") or []]
+    if embeds:
+        payload["embeds"] = embeds[:MAX_EMBEDS]
+
+    buttons = [
+        button
+        for message in rendered
+        for row in (message.get("components") or {}).get("action_rows") or []
+        for button in row.get("buttons") or []
+    ]
+    if buttons:
+        rows = [buttons[i:i + MAX_ROW_BUTTONS] for i in range(0, len(buttons), MAX_ROW_BUTTONS)]
+        payload["components"] = {"action_rows": [{"buttons": row} for row in rows[:MAX_ACTION_ROWS]]}
+
+    return payload
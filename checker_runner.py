@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Run the RSS checkers as one dependency-ordered pass in a single process.
+
+rss_to_discord.yml used to chain arc → extra → paid completion as separate
+jobs only so their state writes could not collide. Each job started a fresh
+runner and downloaded the same paid feeds again. Here every checker is a
+stage that declares the state it reads and writes. Stages run in one
+process and share one feed cache, so each feed is downloaded and parsed once.
+
+Ordering follows the declarations, in STAGES order:
+  - a stage that writes a state file waits for every earlier stage that
+    writes it (state.json is loaded, changed and saved whole);
+  - a stage that reads a state file waits for every earlier stage that
+    writes it, so it sees their results.
+Everything else runs concurrently on threads. Reading a file that a later
+stage is rewriting is safe: writes are atomic renames. A failed stage does
+not stop the ones after it. Every state write is already on disk, so the
+next stage sees exactly what a separate job would have seen.
+
+Usage: python checker_runner.py --feed paid|free|all
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable
+
+from config_loader import file_value
+from run_metrics import span, start_run
+
+STATE_JSON = str(file_value("state_path", "state.json"))
+ARC_HISTORY = str(file_value("arc_history_dir", "arc_history"))
+
+
+class Stage:
+    """One checker run: module.main(argv), plus the state it touches.
+
+    Per-checker feed validator files are not listed; no two stages share one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        module: str,
+        argv: Iterable[str] | None = None,
+        *,
+        reads: Iterable[str] = (),
+        writes: Iterable[str] = (),
+    ) -> None:
+        self.name = name
+        self.module = module
+        self.argv = list(argv) if argv is not None else None
+        self.reads = set(reads)
+        self.writes = set(writes)
+
+    def run(self) -> None:
+        main = importlib.import_module(self.module).main
+        if self.argv is None:
+            main()
+        else:
+            main(self.argv)
+
+
+STAGES = [
+    Stage("new_novel", "new_novel_checker", ["--feed", "free"], reads={STATE_JSON}, writes={STATE_JSON}),
+    # Needs the launch_free flags new_novel_checker records.
+    Stage("arc", "new_arc_checker", reads={STATE_JSON}, writes={ARC_HISTORY}),
+    Stage("extra", "new_extra_checker", reads={STATE_JSON}, writes={STATE_JSON}),
+    Stage("paid_completion", "completed_novel_checker", ["--feed", "paid"], reads={STATE_JSON}, writes={STATE_JSON}),
+    Stage("free_completion", "completed_novel_checker", ["--feed", "free"], reads={STATE_JSON}, writes={STATE_JSON}),
+]
+
+# Which stages each repository_dispatch feed runs, as in rss_to_discord.yml.
+FEED_STAGES = {
+    "paid": {"arc", "extra", "paid_completion"},
+    "free": {"new_novel", "arc", "free_completion"},
+}
+
+
+def stages_for(feed: str) -> list[Stage]:
+    if feed == "all":
+        return list(STAGES)
+    names = FEED_STAGES[feed]
+    return [stage for stage in STAGES if stage.name in names]
+
+
+def dependencies(stages: list[Stage]) -> dict[str, list[str]]:
+    """Map each stage name to the earlier stages it must wait for."""
+    deps: dict[str, list[str]] = {}
+    for i, stage in enumerate(stages):
+        deps[stage.name] = [
+            earlier.name
+            for earlier in stages[:i]
+            if earlier.writes & (stage.reads | stage.writes)
+        ]
+    return deps
+
+
+def run_stages(stages: list[Stage]) -> dict[str, str]:
+    """Run stages in dependency order; return name -> "ok" or "failed"."""
+    deps = dependencies(stages)
+    results: dict[str, str] = {}
+    lock = threading.Lock()
+
+    def run(stage: Stage, waits: list[Future]) -> None:
+        for future in waits:
+            future.result()
+
+        started = time.monotonic()
+        print(f"▶️ {stage.name} started")
+        try:
+            with span(f"checker.{stage.name}"):
+                stage.run()
+        except (Exception, SystemExit) as exc:
+            print(f"❌ {stage.name} failed: {exc!r}")
+            status = "failed"
+        else:
+            print(f"✅ {stage.name} finished in {time.monotonic() - started:.2f}s")
+            status = "ok"
+
+        with lock:
+            results[stage.name] = status
+
+    # One thread per stage: a waiting stage only blocks its own thread.
+    with ThreadPoolExecutor(max_workers=max(1, len(stages)), thread_name_prefix="checker") as pool:
+        futures: dict[str, Future] = {}
+        for stage in stages:
+            waits = [futures[name] for name in deps[stage.name]]
+            futures[stage.name] = pool.submit(run, stage, waits)
+
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the RSS checkers in one process.")
+    parser.add_argument("--feed", choices=["paid", "free", "all"], default="all")
+    args = parser.parse_args(argv)
+
+    results = run_stages(stages_for(args.feed))
+    summary: dict[str, int] = {}
+    for status in results.values():
+        summary[status] = summary.get(status, 0) + 1
+    print("📋 Checkers: " + ", ".join(f"{count} {status}" for status, count in sorted(summary.items())))
+    return 0 if all(status == "ok" for status in results.values()) else 1
+
+
+if __name__ == "__main__":
+    start_run("checker_runner")
+    sys.exit(main())
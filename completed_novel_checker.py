@@ -18,10 +18,8 @@ Usage:
 """
 
 import argparse
-import json
 import os
 import sys
-import feedparser
 import requests
 import re
 from datetime import datetime
@@ -33,8 +31,14 @@ except Exception:
     def get_translator_url(host, novel_title=""):
         return ""
 from message_renderer import render_message, to_discord_api_payload
+from guid_state import message_nonce
+from feed_cache import feeds_unchanged, fetch_feed, inputs_fingerprint, save_validators, validators_path
+from outbox import Outbox
 from git_state_commit import commit_state_update
-from announcement_banner import build_announcement_banner
+from atomic_json import read_json, write_json_atomic
+from banner_cache import cached_banner
+from completion_matcher import CompletionMatcher
+from run_metrics import start_run
 
 try:
     from status_update_dispatcher import trigger_status_update
@@ -67,8 +71,9 @@ from config_loader import (
 )
 
 STATE_PATH = require_file_value("state_path")
-BOT_TOKEN  = os.environ["DISCORD_BOT_TOKEN"]
+BOT_TOKEN  = os.getenv("DISCORD_BOT_TOKEN", "")  # checked in main(), so tools can import this without it
 CHANNEL_ID = server_channel_id_str("announcements")
+OUTBOX     = Outbox("completed_novel_checker")  # shared by --feed paid and free
 
 COMPLETE_ROLE = role_id_to_mention(require_role_value("complete"))
 NSFW_ROLE     = role_id_to_mention(require_role_value("nsfw"))
@@ -150,16 +155,11 @@ def get_series_role_from_short_code(short_code: str) -> str:
     return role_id_to_mention(role_id) if role_id else ""
 
 def load_state(path=STATE_PATH):
-    try:
-        with open(path, encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    return read_json(path, {})
 
 
 def save_state(state, path=STATE_PATH):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
+    write_json_atomic(path, state)
 
 
 def normalize_message_payload(message: dict) -> dict:
@@ -175,31 +175,20 @@ def send_bot_message(
     """
     Post the rendered TOML payload via your bot account to channel_id.
     """
-    url = f"https://discord.com/api/v10/channels/{channel_id}/messages"
     payload = normalize_message_payload(message_payload)
 
     if attachment:
         filename, file_bytes, content_type = attachment
         payload = dict(payload)
         payload["attachments"] = [{"id": 0, "filename": filename}]
-        r = requests.post(
-            url,
-            headers={"Authorization": f"Bot {bot_token}"},
-            data={"payload_json": json.dumps(payload, ensure_ascii=False)},
+        OUTBOX.post(
+            bot_token,
+            channel_id,
+            payload,
             files={"files[0]": (filename, file_bytes, content_type)},
-            timeout=30,
         )
     else:
-        r = requests.post(
-            url,
-            headers={
-                "Authorization": f"Bot {bot_token}",
-                "Content-Type": "application/json",
-            },
-            json=payload,
-            timeout=20,
-        )
-    r.raise_for_status()
+        OUTBOX.post(bot_token, channel_id, payload)
 
 
 def safe_send_bot(
@@ -212,9 +201,9 @@ def safe_send_bot(
         send_bot_message(bot_token, channel_id, message_payload, attachment=attachment)
         return True
       
-    except requests.HTTPError as e:
-        status = e.response.status_code if e.response else "?"
-        body   = e.response.text       if e.response else ""
+    except requests.RequestException as e:
+        status = e.response.status_code if e.response is not None else "?"
+        body   = e.response.text       if e.response is not None else str(e)
         print(f"⚠️ Bot send failed ({status}):\n{body}", file=sys.stderr)
         return False
 
@@ -327,7 +316,7 @@ def build_completion_attachment(novel: dict):
     )
 
     try:
-        attachment = build_announcement_banner(
+        attachment = cached_banner(
             featured_image,
             output_size=output_size,
             crop_position=crop_position,
@@ -432,198 +421,156 @@ def load_novels():
     return novels
 
 
-def main():
+def completion_key_for(novel: dict, feed_type: str) -> str:
+    if feed_type == "paid":
+        return "paid_completion"
+    if novel.get("paid_feed"):
+        return "free_completion"
+    return "only_free_completion"
+
+
+def entry_date(entry) -> datetime:
+    if entry.get("published_parsed"):
+        return datetime(*entry.published_parsed[:6])
+    if entry.get("updated_parsed"):
+        return datetime(*entry.updated_parsed[:6])
+    return datetime.now()
+
+
+def announce_completion(novel, entry, feed_type, state, bot_token, channel_id) -> bool:
+    """Send the completion for the novel's last-chapter entry; False if the send failed."""
+    novel_id = novel["novel_title"]
+    completion_key = completion_key_for(novel, feed_type)
+
+    # use a clean title for display (prefer base)
+    chap_field = (entry.get("chapter") or "").strip()
+    novel_for_message = dict(novel, feed_translator_url=get_entry_translator_url(entry))
+    completion_attachment = build_completion_attachment(novel)
+
+    if completion_key == "only_free_completion":
+        # --- ONLY-FREE CASE (series with no paid feed at all) ---
+        duration = get_duration(novel.get("start_date", ""), entry_date(entry))
+        msg = build_only_free_completion(novel_for_message, chap_field, entry.link, duration)
+        label = "only-free completion"
+    elif completion_key == "paid_completion":
+        # --- PAID COMPLETION CASE ---
+        duration = get_duration(novel.get("start_date", ""), entry_date(entry))
+        msg = build_paid_completion(novel_for_message, chap_field, entry.link, duration)
+        label = "paid-completion"
+    else:
+        # --- STANDARD FREE COMPLETION (series that also had a paid feed) ---
+        msg = build_free_completion(novel_for_message, chap_field, entry.link)
+        label = "free-completion"
+    msg["nonce"] = message_nonce(channel_id, novel_id, completion_key)
+    print(f"→ Built message of {len(msg.get('content', ''))} characters")
+
+    success = safe_send_bot(
+        bot_token,
+        channel_id,
+        msg,
+        attachment=completion_attachment,
+    )
+    if not success:
+        print(
+            f"→ Not marking {novel_id} as ‘{completion_key}’ "
+            f"because send failed"
+        )
+        return False
+
+    print(f"✔️ Sent {label} announcement for {novel_id}")
+    state.setdefault(novel_id, {})[completion_key] = {
+        "chapter": chap_field,
+        "sent_at": datetime.now().isoformat()
+    }
+    save_state(state)
+    commit_state_update(STATE_PATH)
+
+    if completion_key == "paid_completion":
+        try:
+            trigger_status_update(
+                novel_id,
+                novel.get("host", ""),
+                source="paid_completion",
+                short_code=novel.get("short_code", ""),
+            )
+        except Exception as exc:
+            print(
+                f"⚠️ Optional card status update crashed for {novel_id}; "
+                f"skipped: {exc}"
+            )
+    return True
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("--feed", choices=["paid", "free"], required=True)
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     bot_token  = BOT_TOKEN
     channel_id = CHANNEL_ID
     if not (bot_token and channel_id):
         sys.exit("❌ Missing DISCORD_BOT_TOKEN or config/server.json announcements channel")
 
-    state  = load_state()
+    OUTBOX.drain(bot_token)
+    try:
+        _run(args, bot_token, channel_id)
+    finally:
+        if OUTBOX.settle(bot_token):
+            commit_state_update(str(OUTBOX.path.parent))
+
+
+def _run(args: argparse.Namespace, bot_token: str, channel_id: str) -> None:
     novels = load_novels()
+    feed_scope = f"completed_novel_checker_{args.feed}"
+    feed_urls = [novel.get(f"{args.feed}_feed") for novel in novels]
 
-    for novel in reversed(novels):
-        novel_id  = novel["novel_title"]
-        last_chap = novel.get("last_chapter")
-        if not last_chap:
-            continue
+    if feeds_unchanged(feed_urls, scope=feed_scope, fingerprint=inputs_fingerprint(novels)):
+        print(f"🛑 {args.feed} feeds unchanged since the last run; nothing to check.")
+        return
 
-        feed_type = args.feed              # "paid" or "free"
-        feed_key  = f"{feed_type}_feed"    # "paid_feed" or "free_feed"
-        url       = novel.get(feed_key)
-        if not url:
-            continue
+    state  = load_state()
+    all_done = True
+    feed_type = args.feed              # "paid" or "free"
+    feed_key  = f"{feed_type}_feed"    # "paid_feed" or "free_feed"
 
-        # Skip completed novels before fetching/parsing their RSS feed.
-        if feed_type == "paid":
-            completion_key = "paid_completion"
-        elif novel.get("paid_feed"):
-            completion_key = "free_completion"
-        else:
-            completion_key = "only_free_completion"
+    # Skip completed novels before fetching/parsing their RSS feed, and
+    # group the rest by feed so each feed is scanned once for all of them.
+    pending_by_url: dict[str, list[dict]] = {}
+    for novel in reversed(novels):
+        novel_id = novel["novel_title"]
+        url      = novel.get(feed_key)
+        if not (novel.get("last_chapter") and url):
+            continue
 
+        completion_key = completion_key_for(novel, feed_type)
         if state.get(novel_id, {}).get(completion_key):
             print(f"→ skipping {novel_id} ({completion_key}) — already notified")
             continue
+        pending_by_url.setdefault(url, []).append(novel)
 
-        # parse RSS
-        resp = requests.get(url)
-        feed = feedparser.parse(resp.text)
+    for url, pending in pending_by_url.items():
+        # parse RSS (fetched and parsed once per URL for the whole run)
+        cached = fetch_feed(url)
+        entries = cached.entries
         print(
-            f"Parsing {feed_key} for {novel_id}: got {len(feed.entries)} entries "
-            f"(Content-Type: {resp.headers.get('Content-Type')})"
+            f"Parsing {feed_key} for {len(pending)} novel(s): got {len(entries)} entries "
+            f"(Content-Type: {cached.content_type})"
         )
 
-        # look for the last_chapter marker in feed entries
-        for entry in feed.entries:
-            # (optional) guard by novel title if using shared feed
-            entry_title = (entry.get("title") or "").strip()
-            if entry_title and entry_title != novel_id:
-                continue
-        
-            base = entry.get("chapter") or entry.get("chapter", "") or ""
-            ext  = entry.get("chaptername") or ""
-        
-            # 1) use combined string only for matching
-            chap_match = f"{base} {ext}".strip()
-        
-            if last_chap not in chap_match:
+        # look for every pending novel's last_chapter marker in one pass
+        matches = CompletionMatcher(pending).scan(entries)
+
+        for novel in pending:
+            entry = matches.get(novel["novel_title"])
+            if entry is None:
                 continue
-        
-            # 2) use a clean title for display (prefer base)
-            chap_field = base.strip()
-            novel_for_message = dict(novel, feed_translator_url=get_entry_translator_url(entry))
-            completion_attachment = build_completion_attachment(novel)
-
-            # --- ONLY-FREE CASE (series with no paid feed at all) ---
-            if feed_type == "free" and not novel.get("paid_feed"):
-                # guard specifically for only_free_completion so we don't double announce
-                if state.get(novel_id, {}).get("only_free_completion"):
-                    print(f"→ skipping {novel_id} (only_free_completion) — already notified")
-                    break
-
-                # compute duration…
-                if entry.get("published_parsed"):
-                    chap_date = datetime(*entry.published_parsed[:6])
-                elif entry.get("updated_parsed"):
-                    chap_date = datetime(*entry.updated_parsed[:6])
-                else:
-                    chap_date = datetime.now()
-
-                duration = get_duration(novel.get("start_date", ""), chap_date)
-
-                msg = build_only_free_completion(novel_for_message, chap_field, entry.link, duration)
-                print(f"→ Built message of {len(msg.get('content', ''))} characters")
-
-                success = safe_send_bot(
-                    bot_token,
-                    channel_id,
-                    msg,
-                    attachment=completion_attachment,
-                )
-                if success:
-                    print(f"✔️ Sent only-free completion announcement for {novel_id}")
-                    state.setdefault(novel_id, {})["only_free_completion"] = {
-                        "chapter": chap_field,
-                        "sent_at": datetime.now().isoformat()
-                    }
-                    save_state(state)
-                    commit_state_update(STATE_PATH)
-                else:
-                    print(
-                        f"→ Not marking {novel_id} as ‘only_free_completion’ "
-                        f"because send failed"
-                    )
-                break
-
-            # --- PAID COMPLETION CASE ---
-            elif feed_type == "paid":
-                # extra guard for paid_completion
-                if state.get(novel_id, {}).get("paid_completion"):
-                    print(f"→ skipping {novel_id} (paid_completion) — already notified")
-                    break
-
-                # compute duration…
-                if entry.get("published_parsed"):
-                    chap_date = datetime(*entry.published_parsed[:6])
-                elif entry.get("updated_parsed"):
-                    chap_date = datetime(*entry.updated_parsed[:6])
-                else:
-                    chap_date = datetime.now()
-
-                duration = get_duration(novel.get("start_date", ""), chap_date)
-
-                msg = build_paid_completion(novel_for_message, chap_field, entry.link, duration)
-                print(f"→ Built message of {len(msg.get('content', ''))} characters")
-
-                success = safe_send_bot(
-                    bot_token,
-                    channel_id,
-                    msg,
-                    attachment=completion_attachment,
-                )
-                if success:
-                    print(f"✔️ Sent paid-completion announcement for {novel_id}")
-                    state.setdefault(novel_id, {})["paid_completion"] = {
-                        "chapter": chap_field,
-                        "sent_at": datetime.now().isoformat()
-                    }
-                    save_state(state)
-                    commit_state_update(STATE_PATH)
-
-                    try:
-                        trigger_status_update(
-                            novel_id,
-                            novel.get("host", ""),
-                            source="paid_completion",
-                            short_code=novel.get("short_code", ""),
-                        )
-                    except Exception as exc:
-                        print(
-                            f"⚠️ Optional card status update crashed for {novel_id}; "
-                            f"skipped: {exc}"
-                        )
-                else:
-                    print(
-                        f"→ Not marking {novel_id} as ‘paid_completion’ "
-                        f"because send failed"
-                    )
-                break
-
-            # --- STANDARD FREE COMPLETION (series that also had a paid feed) ---
-            elif feed_type == "free":
-                # extra guard for free_completion
-                if state.get(novel_id, {}).get("free_completion"):
-                    print(f"→ skipping {novel_id} (free_completion) — already notified")
-                    break
-
-                msg = build_free_completion(novel_for_message, chap_field, entry.link)
-                print(f"→ Built message of {len(msg.get('content', ''))} characters")
-
-                success = safe_send_bot(
-                    bot_token,
-                    channel_id,
-                    msg,
-                    attachment=completion_attachment,
-                )
-                if success:
-                    print(f"✔️ Sent free-completion announcement for {novel_id}")
-                    state.setdefault(novel_id, {})["free_completion"] = {
-                        "chapter": chap_field,
-                        "sent_at": datetime.now().isoformat()
-                    }
-                    save_state(state)
-                    commit_state_update(STATE_PATH)
-                else:
-                    print(
-                        f"→ Not marking {novel_id} as ‘free_completion’ "
-                        f"because send failed"
-                    )
-                break
+            if not announce_completion(novel, entry, feed_type, state, bot_token, channel_id):
+                all_done = False
+
+    if all_done and save_validators(feed_scope):
+        commit_state_update(str(validators_path(feed_scope)))
 
 
 if __name__ == "__main__":
+    start_run("completed_novel_checker")
     main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Find last-chapter entries for many novels in one pass over each feed.
+
+completed_novel_checker used to walk a feed once per pending novel, testing
+``last_chapter in "<chapter> <chaptername>"`` on every entry. Novels from one
+host share a feed, so the same entries were scanned once per novel.
+
+CompletionMatcher indexes the pending novels by title and compiles all their
+``last_chapter`` markers into one Aho-Corasick automaton. A feed is then read
+once. A titled entry is routed straight to its novel's marker. An untitled
+entry, which could be any novel's, gets one walk of the automaton over its
+chapter text, finding every marker at once. Matching costs O(feed text) per
+feed however many novels share it.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Iterable
+
+
+class MarkerAutomaton:
+    """Aho-Corasick automaton over a fixed set of substrings."""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[str]] = [[]]
+
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            if pattern not in self._out[node]:
+                self._out[node].append(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> set[str]:
+        """Every pattern that occurs in text."""
+        found = set(self._out[0])  # the empty marker matches anything
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+def chapter_text(entry: Any) -> str:
+    """The text last_chapter is matched against, as the checker built it."""
+    base = entry.get("chapter") or ""
+    ext = entry.get("chaptername") or ""
+    return f"{base} {ext}".strip()
+
+
+class CompletionMatcher:
+    """Index of (novel title, last_chapter) for the novels pending on one feed.
+
+    ``scan`` returns, per novel title, the first feed entry carrying that
+    novel's marker. A titled entry is only checked against its own novel's
+    marker. An entry without a title may belong to any novel on the feed, as
+    before, so it goes through the automaton of all markers.
+    """
+
+    def __init__(self, novels: Iterable[dict]) -> None:
+        self._marker_for: dict[str, str] = {}
+        self._titles_for: dict[str, list[str]] = {}
+        for novel in novels:
+            title, marker = novel["novel_title"], novel["last_chapter"]
+            self._marker_for[title] = marker
+            self._titles_for.setdefault(marker, []).append(title)
+        self._automaton = MarkerAutomaton(self._titles_for)
+
+    def scan(self, entries: Iterable[Any]) -> dict[str, Any]:
+        pending = set(self._marker_for)
+        matches: dict[str, Any] = {}
+
+        for entry in entries:
+            title = (entry.get("title") or "").strip()
+            if title:
+                if title in pending and self._marker_for[title] in chapter_text(entry):
+                    matches[title] = entry
+                    pending.discard(title)
+            else:
+                for marker in self._automaton.find_all(chapter_text(entry)):
+                    for novel_title in self._titles_for[marker]:
+                        if novel_title in pending:
+                            matches[novel_title] = entry
+                            pending.discard(novel_title)
+
+            if not pending:
+                break
+
+        return matches
@@ -1,28 +1,77 @@
 # -*- coding: utf-8 -*-
+"""Config access for every bot and checker.
+
+Nothing is read at import time. FILES, FEEDS, ROLES, EMBEDS, SERVER,
+NOVEL_DISCORD_MAP and TAG_ROLE_MAP are loaded the first time they are used
+(module attributes or the helpers below), so a script that exits early only
+pays for the files it actually touched.
+
+On top of that, the parsed and validated config is kept in one snapshot file
+(config/.snapshot.json by default). When every source file still matches the
+size and mtime (or, after a fresh checkout, the sha256) recorded there, the
+whole config comes from a single JSON read with no TOML parsing. Any change
+to a source file rebuilds the snapshot on the next start. A source that fails
+to load is never written to the snapshot; its error is raised when that value
+is first used, just like before.
+"""
 from __future__ import annotations
 
 import json
+import os
 from pathlib import Path
 from typing import Any
 
-try:
-    import tomllib
-except ModuleNotFoundError:
-    import tomli as tomllib
-
 BASE_DIR = Path(__file__).resolve().parent
 
+_FALSEY = {"0", "false", "no", "n", "off"}
+_SNAPSHOT_VERSION = 1
+
 
 def repo_path(relative_path: str | Path) -> Path:
     path = Path(relative_path)
     return path if path.is_absolute() else BASE_DIR / path
 
 
+def positive_float_env(name: str, default: float) -> float:
+    """Numeric setting from the environment; default when unset, invalid or <= 0."""
+    try:
+        value = float(str(os.getenv(name, default)).strip())
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def positive_int_env(name: str, default: int) -> int:
+    """Like positive_float_env, for whole numbers."""
+    try:
+        value = int(str(os.getenv(name, default)).strip())
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def non_negative_int_env(name: str, default: int) -> int:
+    """Like positive_int_env, but 0 is allowed (usually meaning "no limit")."""
+    try:
+        value = int(str(os.getenv(name, default)).strip())
+    except (TypeError, ValueError):
+        return default
+    return value if value >= 0 else default
+
+
+def _tomllib() -> Any:
+    try:
+        import tomllib
+    except ModuleNotFoundError:
+        import tomli as tomllib
+    return tomllib
+
+
 def load_toml(relative_path: str | Path, *, required: bool = True, default: Any = None) -> Any:
     path = repo_path(relative_path)
 
     try:
-        return tomllib.loads(path.read_text(encoding="utf-8"))
+        return _tomllib().loads(path.read_text(encoding="utf-8"))
     except FileNotFoundError:
         if required:
             raise RuntimeError(f"Missing required TOML config file: {relative_path}")
@@ -45,11 +94,28 @@ def load_json(relative_path: str | Path, *, required: bool = True, default: Any
         return {} if default is None else default
 
 
-FILES = load_json("config/files.json")
-FEEDS = load_json("config/feeds.json")
-ROLES = load_json("config/roles.json")
-EMBEDS = load_json("config/embeds.json", required=False, default={})
-SERVER = load_json("config/server.json")
+# Loaded config values by module attribute name.
+_CONFIG: dict[str, Any] = {}
+_SNAPSHOT_TRIED = False
+
+
+def _config(name: str) -> Any:
+    value = _CONFIG.get(name)
+    if value is None:
+        if not _SNAPSHOT_TRIED:
+            _load_config()
+        value = _CONFIG.get(name)
+    if value is None:
+        # Not in a snapshot: load it alone so its error surfaces right here.
+        files = {} if name == "FILES" else _config("FILES")
+        value = _CONFIG[name] = _load_source(name, files)
+    return value
+
+
+def __getattr__(name: str) -> Any:
+    if name in _SOURCES:
+        return _config(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def require_value(source: dict, key: str, label: str) -> Any:
@@ -60,15 +126,19 @@ def require_value(source: dict, key: str, label: str) -> Any:
 
 
 def require_file_value(key: str) -> Any:
-    return require_value(FILES, key, "files")
+    return require_value(_config("FILES"), key, "files")
+
+
+def file_value(key: str, default: Any = None) -> Any:
+    return _config("FILES").get(key, default)
 
 
 def require_feeds_value(key: str) -> Any:
-    return require_value(FEEDS, key, "feeds")
+    return require_value(_config("FEEDS"), key, "feeds")
 
 
 def require_feed_value(feed_name: str, key: str) -> Any:
-    feed = FEEDS.get(feed_name)
+    feed = _config("FEEDS").get(feed_name)
     if not isinstance(feed, dict):
         raise RuntimeError(f"Missing required feed config: feeds.{feed_name}")
     return require_value(feed, key, f"feeds.{feed_name}")
@@ -97,15 +167,15 @@ def require_feed_url(feed_name: str) -> str:
 
 
 def require_role_value(key: str) -> Any:
-    return require_value(ROLES, key, "roles")
+    return require_value(_config("ROLES"), key, "roles")
 
 
 def require_server_value(key: str) -> Any:
-    return require_value(SERVER, key, "server")
+    return require_value(_config("SERVER"), key, "server")
 
 
 def server_value(key: str, default: Any = None) -> Any:
-    return SERVER.get(key, default)
+    return _config("SERVER").get(key, default)
 
 
 def server_channel_id(key: str) -> int:
@@ -121,24 +191,37 @@ def server_guild_id() -> str:
 
 
 def embed_value(key: str, default: Any = None) -> Any:
-    return EMBEDS.get(key, default)
+    return _config("EMBEDS").get(key, default)
 
 
 def require_embed_value(key: str) -> Any:
-    return require_value(EMBEDS, key, "embeds")
+    return require_value(_config("EMBEDS"), key, "embeds")
 
 def embed_color_hex(key: str, default: str) -> str:
-    colors = EMBEDS.get("colors", {})
+    embeds = _config("EMBEDS")
+    colors = embeds.get("colors", {})
 
     if isinstance(colors, dict):
         value = colors.get(key)
     else:
         value = None
 
-    value = value or EMBEDS.get(key) or default
+    value = value or embeds.get(key) or default
     return str(value).strip().lstrip("#")
 
 
+# Resolved colors, built up once per process: (color key, default, short code,
+# novel color) -> int, and short code -> rss-feed theme color. Both depend on
+# EMBEDS and the rss-feed mappings, so reload_config() empties them.
+_RESOLVED_COLORS: dict[tuple[str, str, str, str], int] = {}
+_NOVEL_COLORS: dict[str, str] = {}
+
+
+def clear_color_cache() -> None:
+    _RESOLVED_COLORS.clear()
+    _NOVEL_COLORS.clear()
+
+
 def get_novel_color_from_short_code(short_code: str) -> str:
     """
     Returns the novel's theme/Discord color from rss-feed mappings.
@@ -154,6 +237,13 @@ def get_novel_color_from_short_code(short_code: str) -> str:
     if not short_code:
         return ""
 
+    color = _NOVEL_COLORS.get(short_code)
+    if color is None:
+        color = _NOVEL_COLORS[short_code] = _lookup_novel_color(short_code)
+    return color
+
+
+def _lookup_novel_color(short_code: str) -> str:
     try:
         from novel_mappings import get_novel_details_by_short_code
     except Exception:
@@ -194,7 +284,19 @@ def embed_color(
       1. explicit novel_color if passed
       2. theme_color / discord_color from rss-feed using short_code
       3. default fallback
+
+    Results are memoised per process; see clear_color_cache().
     """
+    cache_key = (key, default, (short_code or "").strip().upper(), novel_color or "")
+    color = _RESOLVED_COLORS.get(cache_key)
+    if color is None:
+        color = _RESOLVED_COLORS[cache_key] = _resolve_embed_color(
+            key, default, short_code=short_code, novel_color=novel_color
+        )
+    return color
+
+
+def _resolve_embed_color(key: str, default: str, *, short_code: str, novel_color: str) -> int:
     configured = embed_color_hex(key, default)
     configured_key = str(configured or "").strip().casefold()
 
@@ -252,7 +354,7 @@ def load_novel_discord_map(path: str | Path | None = None) -> dict:
 
 def get_novel_discord_config(short_code: str) -> dict:
     short_code = (short_code or "").strip().upper()
-    return NOVEL_DISCORD_MAP.get(short_code, {})
+    return _config("NOVEL_DISCORD_MAP").get(short_code, {})
 
 
 def get_novel_role_id(short_code: str) -> str:
@@ -286,5 +388,178 @@ def load_tag_role_map(path: str | Path | None = None) -> dict:
     }
 
 
-NOVEL_DISCORD_MAP = load_novel_discord_map()
-TAG_ROLE_MAP = load_tag_role_map()
+# Module attribute name -> config file. The two maps are located through
+# files.json instead.
+_JSON_SOURCES = {
+    "FILES": "config/files.json",
+    "FEEDS": "config/feeds.json",
+    "ROLES": "config/roles.json",
+    "EMBEDS": "config/embeds.json",
+    "SERVER": "config/server.json",
+}
+_MAP_SOURCES = {
+    "NOVEL_DISCORD_MAP": ("novel_discord_map_file", load_novel_discord_map),
+    "TAG_ROLE_MAP": ("tag_role_map_file", load_tag_role_map),
+}
+_SOURCES = (*_JSON_SOURCES, *_MAP_SOURCES)
+
+
+def _source_path(name: str, files: dict) -> str:
+    if name in _JSON_SOURCES:
+        return _JSON_SOURCES[name]
+    return str(require_value(files, _MAP_SOURCES[name][0], "files"))
+
+
+def _load_source(name: str, files: dict) -> Any:
+    if name == "EMBEDS":
+        return load_json(_JSON_SOURCES[name], required=False, default={})
+    if name in _JSON_SOURCES:
+        return load_json(_JSON_SOURCES[name])
+    return _MAP_SOURCES[name][1](_source_path(name, files))
+
+
+def snapshot_path() -> Path | None:
+    raw = str(os.getenv("CONFIG_SNAPSHOT", "config/.snapshot.json")).strip()
+    if not raw or raw.lower() in _FALSEY:
+        return None
+    return repo_path(raw)
+
+
+def _stamp(relative_path: str, *, with_hash: bool = True) -> list | None:
+    path = repo_path(relative_path)
+    try:
+        st = path.stat()
+        digest = _sha256(path) if with_hash else ""
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size, digest]
+
+
+def _sha256(path: Path) -> str:
+    import hashlib
+
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _stamp_matches(relative_path: str, recorded: Any) -> bool:
+    current = _stamp(relative_path, with_hash=False)
+    if current is None or recorded is None:
+        return current is None and recorded is None
+    if not isinstance(recorded, list) or len(recorded) != 3:
+        return False
+    if current[:2] == recorded[:2]:
+        return True
+    # git checkouts reset mtimes; fall back to comparing contents.
+    fresh = _stamp(relative_path)
+    if fresh is None or fresh[1:] != recorded[1:]:
+        return False
+    recorded[0] = fresh[0]
+    return True
+
+
+def _read_snapshot(path: Path) -> dict[str, Any] | None:
+    try:
+        snap = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(snap, dict) or snap.get("version") != _SNAPSHOT_VERSION:
+        return None
+    config, sources = snap.get("config"), snap.get("sources")
+    if not isinstance(config, dict) or not isinstance(sources, dict):
+        return None
+    if set(config) != set(_SOURCES) or not all(isinstance(v, dict) for v in config.values()):
+        return None
+    before = json.dumps(sources)
+    if not all(_stamp_matches(src, stamp) for src, stamp in sources.items()):
+        return None
+    if json.dumps(sources) != before:
+        # Same contents under a new mtime: record it so the next start
+        # can skip hashing.
+        _write_snapshot(path, config, sources)
+    return config
+
+
+def _build_config() -> tuple[dict[str, Any], dict[str, Exception], dict[str, Any]]:
+    """Load every source; return (values, errors by name, source stamps)."""
+    values: dict[str, Any] = {}
+    errors: dict[str, Exception] = {}
+    sources: dict[str, Any] = {}
+
+    for name in _SOURCES:
+        if name != "FILES" and "FILES" in errors:
+            errors[name] = errors["FILES"]
+            continue
+        try:
+            src = _source_path(name, values.get("FILES", {}))
+            # Stamp before loading, so an edit racing the load leaves the
+            # snapshot stale rather than silently out of date.
+            stamp = _stamp(src)
+            values[name] = _load_source(name, values.get("FILES", {}))
+        except Exception as e:
+            errors[name] = e
+            continue
+        sources[src] = stamp
+
+    return values, errors, sources
+
+
+def _write_snapshot(path: Path, values: dict[str, Any], sources: dict[str, Any]) -> None:
+    from atomic_json import write_json_atomic
+
+    snap = {"version": _SNAPSHOT_VERSION, "sources": sources, "config": values}
+    try:
+        write_json_atomic(path, snap, indent=None, backup=False)
+    except OSError as e:
+        print(f"⚠️ Could not write config snapshot {path}: {e}")
+
+
+def _load_config() -> None:
+    global _SNAPSHOT_TRIED
+    _SNAPSHOT_TRIED = True
+
+    path = snapshot_path()
+    if path is None:
+        return
+
+    config = _read_snapshot(path)
+    if config is None:
+        values, errors, sources = _build_config()
+        # Failed sources stay unloaded, so _config() raises their error
+        # at the first use, as an eager load would have at import.
+        if not errors:
+            _write_snapshot(path, values, sources)
+        config = values
+
+    for name, value in config.items():
+        _CONFIG.setdefault(name, value)
+
+
+def reload_config() -> None:
+    """
+    Re-reads every config file and drops values derived from them.
+
+    Values already handed out are updated in place, so names imported
+    elsewhere with "from config_loader import ..." see the new config too.
+    The snapshot is rebuilt.
+    """
+    global _SNAPSHOT_TRIED
+
+    values, errors, sources = _build_config()
+    if errors:
+        raise next(iter(errors.values()))
+
+    for name, fresh in values.items():
+        current = _CONFIG.get(name)
+        if current is None:
+            _CONFIG[name] = fresh
+        else:
+            current.clear()
+            current.update(fresh)
+
+    path = snapshot_path()
+    if path is not None:
+        _write_snapshot(path, values, sources)
+    _SNAPSHOT_TRIED = True
+
+    clear_color_cache()
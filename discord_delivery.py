@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""How the chapter bots get a rendered message into Discord.
+
+The default is REST. One pooled aiohttp session posts each rendered payload
+(through ``to_discord_api_payload``) straight to the channel's messages
+endpoint, the same way bot_comments.py does. A run sends its first
+announcement right after the feed check, without a gateway handshake,
+identify, or guild cache download first.
+
+Set CHAPTER_DELIVERY_MODE=gateway to go back to the discord.py client
+login. Both modes hand the bot the same ``send(payload) -> bool`` callable,
+so the announce loop does not care which one is in use.
+
+Every REST send in the repo goes through the same rate-limit engine, both
+``post_message`` (requests, used by the checkers) and ``RestSender``
+(aiohttp, used by the bots). ``LIMITER`` learns Discord's buckets from the
+X-RateLimit-* headers of each response and waits for the bucket to reset
+before it runs dry. Then 429s are retried after their ``retry_after``, and
+5xx and network errors are retried with jittered backoff. ``STATS`` counts
+sent, failed, retried and rate-limited messages; the totals are printed
+when the process exits.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+import requests
+
+from config_loader import positive_float_env
+from message_renderer import to_discord_api_payload
+from run_metrics import count, record_span, span
+
+if TYPE_CHECKING:
+    import aiohttp  # only for annotations; loaded lazily by RestSender
+
+API_BASE = "https://discord.com/api/v10"
+
+Send = Callable[[dict[str, Any]], Awaitable[bool]]
+Announce = Callable[[Send], Awaitable[None]]
+
+DELIVERY_MODES = {"rest", "gateway"}
+
+
+DISCORD_HTTP_TIMEOUT = positive_float_env("DISCORD_HTTP_TIMEOUT", 20)
+DISCORD_SEND_RETRIES = int(positive_float_env("DISCORD_SEND_RETRIES", 5))
+DISCORD_RETRY_DELAY = positive_float_env("DISCORD_RETRY_DELAY", 1)
+
+# 429 and 5xx are worth another attempt; any other status is final.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def channel_messages_url(channel_id: int | str) -> str:
+    return f"{API_BASE}/channels/{channel_id}/messages"
+
+
+def bot_headers(token: str) -> dict[str, str]:
+    return {
+        "Authorization": f"Bot {token}",
+        "Content-Type":  "application/json",
+    }
+
+
+def message_route(channel_id: int | str) -> str:
+    """Rate-limit route key: Discord buckets per route and channel."""
+    return f"POST /channels/{channel_id}/messages"
+
+
+def _float_or_none(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Discord bucket state learned from response headers.
+
+    Routes map to the bucket id from X-RateLimit-Bucket (routes that share a
+    bucket share its budget). A 429 with the global flag blocks every route.
+    Thread-safe, so checkers running side by side share one view.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: dict[str, str] = {}
+        self._buckets: dict[str, dict[str, Any]] = {}
+        self._global_until = 0.0
+
+    def acquire(self, route: str) -> float:
+        """Reserve one request on route; 0.0 when reserved.
+
+        Otherwise nothing is reserved and the result is how long to wait
+        before calling acquire again. Callers loop until they get 0.0, so
+        only ``remaining`` of them go through per bucket window instead of
+        every waiter at once when the window resets.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(self._routes.get(route, route))
+            if bucket is not None and bucket["remaining"] is not None and bucket["reset_at"] <= now:
+                if bucket["limit"] is None:
+                    bucket["remaining"] = None  # budget unknown until the next response
+                else:
+                    # Refill from the last known limit; the next response
+                    # replaces this guess with Discord's own numbers.
+                    bucket["remaining"] = bucket["limit"]
+                    bucket["reset_at"] = now + (bucket["window"] or DISCORD_RETRY_DELAY)
+
+            wait = self._global_until - now
+            if wait > 0:
+                return wait
+            if bucket is not None and bucket["remaining"] is not None:
+                if bucket["remaining"] <= 0:
+                    return max(bucket["reset_at"] - now, 0.001)
+                bucket["remaining"] -= 1
+        return 0.0
+
+    def update(self, route: str, status: int, headers: Any, body: str = "") -> float:
+        """Record one response; for a 429 return how long Discord asked us to wait."""
+        headers = headers or {}
+        now = time.monotonic()
+
+        retry_after = 0.0
+        is_global = False
+        if status == 429:
+            try:
+                data = json.loads(body) if body else {}
+            except ValueError:
+                data = {}
+            if not isinstance(data, dict):
+                data = {}
+            retry_after = (
+                _float_or_none(data.get("retry_after"))
+                or _float_or_none(headers.get("Retry-After"))
+                or DISCORD_RETRY_DELAY
+            )
+            is_global = (
+                bool(data.get("global"))
+                or str(headers.get("X-RateLimit-Global", "")).lower() == "true"
+                or headers.get("X-RateLimit-Scope") == "global"
+            )
+
+        with self._lock:
+            bucket_id = headers.get("X-RateLimit-Bucket")
+            if bucket_id:
+                self._routes[route] = bucket_id
+            bucket = self._buckets.setdefault(
+                self._routes.get(route, route),
+                {"remaining": None, "reset_at": 0.0, "limit": None, "window": 0.0},
+            )
+
+            limit = _float_or_none(headers.get("X-RateLimit-Limit"))
+            remaining = _float_or_none(headers.get("X-RateLimit-Remaining"))
+            reset_after = _float_or_none(headers.get("X-RateLimit-Reset-After"))
+            if limit is not None:
+                bucket["limit"] = int(limit)
+            if remaining is not None:
+                bucket["remaining"] = int(remaining)
+            if reset_after is not None:
+                bucket["reset_at"] = now + reset_after
+                bucket["window"] = max(bucket["window"], reset_after)
+
+            if status == 429:
+                if is_global:
+                    self._global_until = max(self._global_until, now + retry_after)
+                else:
+                    bucket["remaining"] = 0
+                    bucket["reset_at"] = max(bucket["reset_at"], now + retry_after)
+
+        return retry_after
+
+
+class DeliveryStats:
+    """Throughput counters for every message sent through this module."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.waited = 0.0
+        self.started: float | None = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic()
+
+    def record(self, *, sent: int = 0, failed: int = 0, retries: int = 0,
+               rate_limited: int = 0, waited: float = 0.0) -> None:
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+            self.retries += retries
+            self.rate_limited += rate_limited
+            self.waited += waited
+        count("discord_messages_sent", sent)
+        count("discord_messages_failed", failed)
+        count("discord_retries", retries)
+        count("discord_429s", rate_limited)
+        count("discord_wait_seconds", waited)
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+        rate = self.sent / elapsed if elapsed > 0 else 0.0
+        return (
+            f"{self.sent} sent, {self.failed} failed, {self.retries} retried "
+            f"({self.rate_limited} rate-limited), {self.waited:.2f}s waiting, "
+            f"{rate:.2f} msg/s"
+        )
+
+
+LIMITER = RateLimiter()
+STATS = DeliveryStats()
+
+
+def report_stats() -> None:
+    if STATS.sent or STATS.failed:
+        print(f"📊 Discord delivery: {STATS.summary()}")
+
+
+atexit.register(report_stats)
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, DISCORD_RETRY_DELAY * (2 ** (attempt - 1)))
+
+
+def _next_delay(route: str, attempt: int, status: int, headers: Any, text: str) -> float | None:
+    """Record one attempt; return the wait before retrying, or None when final.
+
+    status 0 means the request never got a response (network error/timeout).
+    """
+    retry_after = LIMITER.update(route, status, headers, text) if status else 0.0
+
+    if 200 <= status < 300:
+        STATS.record(sent=1)
+        return None
+
+    if attempt < DISCORD_SEND_RETRIES and (status == 0 or status in RETRY_STATUSES):
+        if status == 429:
+            delay = retry_after + random.uniform(0, 0.25)
+        else:
+            delay = _backoff(attempt)
+        STATS.record(retries=1, rate_limited=int(status == 429), waited=delay)
+        reason = f"HTTP {status}" if status else "network error"
+        print(
+            f"⏳ Discord {reason} on {route}; retrying in {delay:.2f}s "
+            f"(attempt {attempt}/{DISCORD_SEND_RETRIES})"
+        )
+        return delay
+
+    STATS.record(failed=1)
+    return None
+
+
+_HTTP: requests.Session | None = None
+
+
+def _http_session() -> requests.Session:
+    global _HTTP
+    if _HTTP is None:
+        _HTTP = requests.Session()
+    return _HTTP
+
+
+def post_message(
+    token: str,
+    channel_id: int | str,
+    payload: dict[str, Any],
+    *,
+    files: dict[str, tuple] | None = None,
+) -> requests.Response:
+    """POST one Discord API message payload, honouring rate limits.
+
+    ``payload`` is already in API shape (see ``to_discord_api_payload``). With
+    ``files`` it is sent as multipart ``payload_json``. Raises
+    requests.HTTPError / RequestException once the retries are used up.
+    """
+    url = channel_messages_url(channel_id)
+    route = message_route(channel_id)
+    STATS.start()
+
+    with span("discord_send"):
+        for attempt in range(1, DISCORD_SEND_RETRIES + 1):
+            wait = LIMITER.acquire(route)
+            while wait > 0:
+                STATS.record(waited=wait)
+                time.sleep(wait)
+                wait = LIMITER.acquire(route)
+
+            try:
+                if files:
+                    resp = _http_session().post(
+                        url,
+                        headers={"Authorization": f"Bot {token}"},
+                        data={"payload_json": json.dumps(payload, ensure_ascii=False)},
+                        files=files,
+                        timeout=DISCORD_HTTP_TIMEOUT,
+                    )
+                else:
+                    resp = _http_session().post(
+                        url,
+                        headers=bot_headers(token),
+                        json=payload,
+                        timeout=DISCORD_HTTP_TIMEOUT,
+                    )
+            except requests.RequestException as exc:
+                delay = _next_delay(route, attempt, 0, {}, "")
+                if delay is None:
+                    raise
+                print(f"⚠️ {exc}")
+                time.sleep(delay)
+                continue
+
+            delay = _next_delay(route, attempt, resp.status_code, resp.headers, resp.text)
+            if delay is None:
+                if not resp.ok:
+                    print(f"⚠️ Discord API error {resp.status_code}: {resp.text}")
+                resp.raise_for_status()
+                return resp
+            time.sleep(delay)
+
+        raise RuntimeError("unreachable")
+
+
+def delivery_mode() -> str:
+    mode = str(os.getenv("CHAPTER_DELIVERY_MODE", "rest")).strip().lower()
+    if mode not in DELIVERY_MODES:
+        print(f"⚠️ Unknown CHAPTER_DELIVERY_MODE={mode!r}; using rest.")
+        return "rest"
+    return mode
+
+
+class RestSender:
+    """Post rendered payloads to one channel over a pooled aiohttp session.
+
+    Use as ``async with RestSender(token, channel_id) as send: await send(payload)``.
+    """
+
+    def __init__(self, token: str, channel_id: int | str) -> None:
+        self.url = channel_messages_url(channel_id)
+        self.route = message_route(channel_id)
+        self.headers = bot_headers(token)
+        self.session: aiohttp.ClientSession | None = None
+        # Status of the last attempt (0: no response), for the outbox.
+        self.last_status: int | None = None
+        self._client_errors: tuple[type[BaseException], ...] = (asyncio.TimeoutError,)
+
+    async def __aenter__(self) -> "RestSender":
+        # Imported here so the checkers, which only use post_message, start
+        # without loading aiohttp.
+        import aiohttp
+
+        self._client_errors = (aiohttp.ClientError, asyncio.TimeoutError)
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=DISCORD_HTTP_TIMEOUT),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __call__(self, payload: dict[str, Any]) -> bool:
+        body = to_discord_api_payload(payload)
+        STATS.start()
+
+        with span("discord_send"):
+            for attempt in range(1, DISCORD_SEND_RETRIES + 1):
+                wait = LIMITER.acquire(self.route)
+                while wait > 0:
+                    STATS.record(waited=wait)
+                    await asyncio.sleep(wait)
+                    wait = LIMITER.acquire(self.route)
+
+                try:
+                    async with self.session.post(self.url, json=body) as resp:
+                        status, headers, text = resp.status, resp.headers, await resp.text()
+                except self._client_errors as exc:
+                    print(f"⚠️ Discord API request failed: {exc!r}")
+                    status, headers, text = 0, {}, ""
+
+                self.last_status = status
+                delay = _next_delay(self.route, attempt, status, headers, text)
+                if delay is None:
+                    if status and not 200 <= status < 300:
+                        print(f"❌ Discord API error {status}: {text}")
+                    return 200 <= status < 300
+                await asyncio.sleep(delay)
+
+        return False
+
+
+async def run_gateway(token: str, channel_id: int, announce: Announce) -> None:
+    """Log in with discord.py, run announce once the channel is ready, then close."""
+    import discord
+
+    from discord_py_payload import to_discord_py_kwargs
+
+    bot = discord.Client(intents=discord.Intents.default())
+    login_started = time.perf_counter()
+
+    @bot.event
+    async def on_ready():
+        record_span("discord_login", time.perf_counter() - login_started)
+        try:
+            channel = bot.get_channel(channel_id)
+            if channel is None:
+                print(f"❌ Cannot find channel {channel_id}")
+                return
+
+            async def send(payload: dict[str, Any]) -> bool:
+                with span("discord_send"):
+                    await channel.send(**to_discord_py_kwargs(payload))
+                count("discord_messages_sent")
+                return True
+
+            await announce(send)
+            await asyncio.sleep(1)
+        finally:
+            await bot.close()
+
+    await bot.start(token)
+
+
+async def deliver(token: str, channel_id: int, announce: Announce, *, outbox: Any = None) -> None:
+    """Run announce with a sender for the configured CHAPTER_DELIVERY_MODE.
+
+    With an ``outbox.Outbox``, its due messages go out first and transient
+    send failures are queued instead of failing. Draining what is left is
+    up to the caller.
+    """
+    if outbox is None:
+        run = announce
+    else:
+        await asyncio.to_thread(outbox.drain, token)
+
+        async def run(send: Send) -> None:
+            await announce(outbox.wrap(channel_id, send))
+
+    if delivery_mode() == "gateway":
+        await run_gateway(token, channel_id, run)
+        return
+
+    async with RestSender(token, channel_id) as sender:
+        await run(sender)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""discord.py objects built from rendered message payloads.
+
+Only the gateway delivery path sends through a discord.py client, so this is
+the one module that imports discord.py. ``message_renderer`` still exposes
+these names and loads them from here on first use.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any
+
+from message_renderer import button_style_value
+
+try:
+    import discord
+    from discord import Embed
+    from discord.ui import Button, View
+except Exception:
+    discord = None
+    Embed = None
+    Button = None
+    View = None
+
+
+def parse_custom_emoji(value: Any) -> Any:
+    """Return discord.py PartialEmoji for <:name:id>, or unicode emoji string."""
+    if value is None:
+        return None
+
+    s = str(value).strip()
+    if not s:
+        return None
+
+    m = re.match(r"^<(?P<animated>a?):(?P<name>[A-Za-z0-9_]+):(?P<id>\d+)>$", s)
+    if m and discord is not None:
+        return discord.PartialEmoji(
+            name=m.group("name"),
+            id=int(m.group("id")),
+            animated=bool(m.group("animated")),
+        )
+
+    # Unicode emoji / plain text emoji.
+    return s
+
+
+def build_embed(data: dict[str, Any]) -> Any:
+    """Convert a rendered embed dict into discord.Embed."""
+    if Embed is None:
+        raise RuntimeError("discord.py is not available, cannot build discord.Embed")
+
+    data = dict(data)
+    color = data.pop("color", None)
+
+    embed = Embed(
+        title=data.pop("title", None),
+        url=data.pop("url", None),
+        description=data.pop("description", None),
+        color=color,
+    )
+
+    timestamp = data.pop("timestamp", None)
+    if timestamp:
+        from dateutil import parser as dateparser
+        try:
+            embed.timestamp = dateparser.parse(str(timestamp))
+        except Exception:
+            pass
+
+    author = data.pop("author", None)
+    if isinstance(author, dict) and author.get("name"):
+        embed.set_author(**author)
+
+    thumbnail = data.pop("thumbnail", None)
+    if isinstance(thumbnail, dict) and thumbnail.get("url"):
+        embed.set_thumbnail(url=thumbnail["url"])
+
+    image = data.pop("image", None)
+    if isinstance(image, dict) and image.get("url"):
+        embed.set_image(url=image["url"])
+
+    footer = data.pop("footer", None)
+    if isinstance(footer, dict) and (footer.get("text") or footer.get("icon_url")):
+        embed.set_footer(**footer)
+
+    for field in data.pop("fields", []) or []:
+        if not isinstance(field, dict):
+            continue
+        embed.add_field(
+            name=field.get("name") or "\u200b",
+            value=field.get("value") or "\u200b",
+            inline=bool(field.get("inline", False)),
+        )
+
+    return embed
+
+
+def build_view(components: Any) -> Any:
+    """Convert rendered TOML components into a discord.ui.View for classic buttons."""
+    if not components:
+        return None
+    if View is None or Button is None:
+        raise RuntimeError("discord.py is not available, cannot build discord.ui.View")
+
+    # Expected TOML shape:
+    # [components]
+    # [[components.action_rows]]
+    # [[components.action_rows.buttons]]
+    rows = []
+    if isinstance(components, dict):
+        rows = components.get("action_rows") or []
+    elif isinstance(components, list):
+        rows = components
+
+    view = View()
+
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+
+        for button in row.get("buttons", []) or row.get("components", []) or []:
+            if not isinstance(button, dict):
+                continue
+
+            style = str(button.get("style", "link")).strip().lower()
+
+            # For now, only link buttons are safe/generic for your current scripts.
+            if style != "link" and button_style_value(style) != 5:
+                continue
+
+            kwargs = {
+                "label": button.get("label") or None,
+                "url": button.get("url") or None,
+            }
+
+            emoji = parse_custom_emoji(button.get("emoji"))
+            if emoji:
+                kwargs["emoji"] = emoji
+
+            if kwargs["url"]:
+                view.add_item(Button(**kwargs))
+
+    return view if view.children else None
+
+
+def build_allowed_mentions(allowed_mentions: Any) -> Any:
+    """Convert rendered allowed_mentions dict into discord.AllowedMentions."""
+    if discord is None:
+        raise RuntimeError("discord.py is not available, cannot build AllowedMentions")
+
+    if not isinstance(allowed_mentions, dict):
+        return None
+
+    parse = set(allowed_mentions.get("parse") or [])
+
+    users_value: bool | list[Any]
+    roles_value: bool | list[Any]
+
+    if "users" in parse:
+        users_value = True
+    else:
+        users = [str(x).strip() for x in allowed_mentions.get("users", []) if str(x).strip()]
+        users_value = [discord.Object(id=int(x)) for x in users] if users else False
+
+    if "roles" in parse:
+        roles_value = True
+    else:
+        roles = [str(x).strip() for x in allowed_mentions.get("roles", []) if str(x).strip()]
+        roles_value = [discord.Object(id=int(x)) for x in roles] if roles else False
+
+    return discord.AllowedMentions(
+        everyone=("everyone" in parse),
+        users=users_value,
+        roles=roles_value,
+        replied_user=bool(allowed_mentions.get("replied_user", False)),
+    )
+
+
+def to_discord_py_kwargs(payload: dict[str, Any]) -> dict[str, Any]:
+    """
+    Convert rendered payload into kwargs for discord.py:
+      await channel_or_thread.send(**kwargs)
+    """
+    kwargs: dict[str, Any] = {}
+
+    if payload.get("content") not in (None, ""):
+        kwargs["content"] = payload["content"]
+
+    embeds_data = payload.get("embeds") or []
+    embeds = [build_embed(e) for e in embeds_data if isinstance(e, dict)]
+
+    if len(embeds) == 1:
+        kwargs["embed"] = embeds[0]
+    elif len(embeds) > 1:
+        kwargs["embeds"] = embeds
+
+    view = build_view(payload.get("components"))
+    if view:
+        kwargs["view"] = view
+
+    allowed_mentions = build_allowed_mentions(payload.get("allowed_mentions"))
+    if allowed_mentions is not None:
+        kwargs["allowed_mentions"] = allowed_mentions
+
+    if int(payload.get("flags", 0)) & 4:
+        kwargs["suppress_embeds"] = True
+
+    if payload.get("nonce") not in (None, ""):
+        kwargs["nonce"] = payload["nonce"]  # discord.py adds enforce_nonce
+
+    return kwargs
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""Per-process feed cache shared by every checker and bot.
+
+Most novels point at the same aggregated free/paid feed URLs, so a single run
+used to download and parse the same document once per novel. Everything here
+is keyed by URL: the first caller fetches and parses, every later caller gets
+the same parsed result.
+
+Treat the parsed feeds as read-only. Filter into a local list instead of
+assigning to ``feed.entries``; another checker may be reading the same object.
+
+Conditional GET: each checker ("scope") keeps the ETag/Last-Modified it last
+processed in feed_validators/<scope>.json. ``feeds_unchanged`` sends those
+validators and returns True when every feed answers 304, so the checker can
+stop before logging in, rendering, or loading state. Validators are only
+written by ``save_validators`` after a run finished cleanly, so a failed send
+is retried on the next run instead of being hidden behind a 304.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable
+
+import feedparser
+import requests
+
+from atomic_json import write_json_atomic
+from config_loader import file_value, positive_float_env, repo_path
+from message_context import FeedEntry
+from run_metrics import count, span
+
+_FEEDS: dict[str, "CachedFeed"] = {}
+_URL_LOCKS: dict[str, threading.Lock] = {}
+_LOCK = threading.Lock()
+
+# Validators from 200 responses seen in this process, and per-scope bookkeeping.
+_LATEST_VALIDATORS: dict[str, dict[str, str]] = {}
+_SCOPES: dict[str, dict[str, Any]] = {}
+
+_FALSEY = {"0", "false", "no", "n", "off"}
+
+
+FEED_FETCH_TIMEOUT = positive_float_env("FEED_FETCH_TIMEOUT", 20)
+FEED_FETCH_RETRIES = int(positive_float_env("FEED_FETCH_RETRIES", 3))
+FEED_FETCH_RETRY_DELAY = positive_float_env("FEED_FETCH_RETRY_DELAY", 1)
+VALIDATORS_DIR = str(file_value("feed_validators_dir", "feed_validators") or "feed_validators")
+
+# 429 and 5xx are worth another attempt; any other status is final.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CachedFeed:
+    """One fetched feed document plus its lazily parsed feedparser result.
+
+    ``entries`` holds the same items as FeedEntry records.
+
+    Header names are lowercased, which is also what feedparser expects from
+    response_headers.
+    """
+
+    def __init__(self, url: str, status: int, headers: Any, body: bytes) -> None:
+        self.url = url
+        self.status = status
+        self.headers = {str(k).lower(): str(v) for k, v in dict(headers or {}).items()}
+        self.body = body
+        self._parsed: Any = None
+        self._entries: list[FeedEntry] | None = None
+        self._parse_lock = threading.Lock()
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get("content-type", "")
+
+    @property
+    def parsed(self) -> Any:
+        if self._parsed is None:
+            with self._parse_lock:
+                if self._parsed is None:
+                    with span("feed_parse"):
+                        self._parsed = feedparser.parse(self.body, response_headers=self.headers)
+                    count("entries_parsed", len(self._parsed.entries))
+        return self._parsed
+
+    @property
+    def entries(self) -> list[FeedEntry]:
+        """The parsed entries as FeedEntry records, resolved once per feed."""
+        if self._entries is None:
+            parsed = self.parsed
+            with span("feed_parse"):
+                entries = [FeedEntry.from_entry(entry) for entry in parsed.entries]
+            with self._parse_lock:
+                if self._entries is None:
+                    self._entries = entries
+        return self._entries
+
+
+def _url_lock(url: str) -> threading.Lock:
+    with _LOCK:
+        lock = _URL_LOCKS.get(url)
+        if lock is None:
+            lock = _URL_LOCKS[url] = threading.Lock()
+        return lock
+
+
+def _response_validators(headers: dict[str, str]) -> dict[str, str]:
+    out = {}
+    if headers.get("etag"):
+        out["etag"] = headers["etag"]
+    if headers.get("last-modified"):
+        out["last_modified"] = headers["last-modified"]
+    return out
+
+
+def _request_headers(validators: dict[str, str] | None) -> dict[str, str]:
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def record_response(url: str, status: int, headers: Any, body: bytes) -> CachedFeed:
+    """Wrap one finished HTTP response and remember its validators."""
+    count("feeds_fetched")
+    if status == 304:
+        count("feeds_not_modified")
+        return CachedFeed(url, 304, headers, b"")
+    count("feed_bytes", len(body))
+
+    cached = CachedFeed(url, status, headers, body)
+    if not cached.ok:
+        print(f"⚠️ Feed fetch for {url} returned HTTP {status}")
+        return cached
+
+    validators = _response_validators(cached.headers)
+    if validators:
+        _LATEST_VALIDATORS[url] = validators
+    return cached
+
+
+def retry_delay(attempt: int) -> float:
+    return FEED_FETCH_RETRY_DELAY * (2 ** (attempt - 1))
+
+
+_HTTP: requests.Session | None = None
+
+
+def _http_session() -> requests.Session:
+    # One pooled session, so repeated runs in one process reuse connections.
+    global _HTTP
+    if _HTTP is None:
+        _HTTP = requests.Session()
+    return _HTTP
+
+
+def _download(url: str, validators: dict[str, str] | None = None) -> CachedFeed:
+    for attempt in range(1, FEED_FETCH_RETRIES + 1):
+        try:
+            resp = _http_session().get(
+                url,
+                headers=_request_headers(validators),
+                timeout=FEED_FETCH_TIMEOUT,
+            )
+        except requests.RequestException as exc:
+            print(f"⚠️ Feed fetch failed for {url} (attempt {attempt}/{FEED_FETCH_RETRIES}): {exc}")
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt == FEED_FETCH_RETRIES:
+                return record_response(url, resp.status_code, resp.headers, resp.content)
+            print(f"⚠️ Feed fetch for {url} returned HTTP {resp.status_code}; retrying.")
+
+        if attempt < FEED_FETCH_RETRIES:
+            time.sleep(retry_delay(attempt))
+
+    return CachedFeed(url, 0, {}, b"")
+
+
+def _raise_for_feed(cached: CachedFeed) -> None:
+    if cached.status == 0:
+        raise requests.ConnectionError(
+            f"Could not fetch {cached.url} after {FEED_FETCH_RETRIES} attempt(s)"
+        )
+    raise requests.HTTPError(f"Feed fetch for {cached.url} returned HTTP {cached.status}")
+
+
+def fetch_feed(url: str) -> CachedFeed:
+    """Return the cached download for url, fetching it on first use.
+
+    Raises requests.RequestException when the feed cannot be fetched, so a
+    feed-host outage fails the run instead of looking like an empty feed.
+    Failures are not cached; a later caller in the same run tries again.
+    """
+    cached = _FEEDS.get(url)
+    if cached is not None:
+        return cached
+
+    with _url_lock(url):
+        cached = _FEEDS.get(url)
+        if cached is not None:
+            return cached
+
+        with span("feed_fetch"):
+            cached = _download(url)
+        if not cached.ok:
+            _raise_for_feed(cached)
+        _FEEDS[url] = cached
+        return cached
+
+
+def get_feed(url: str) -> Any:
+    """Return the parsed feed for url; parsing happens once per process."""
+    return fetch_feed(url).parsed
+
+
+def feed_entries(url: str) -> list[FeedEntry]:
+    """Return the feed's entries as FeedEntry records, built once per process."""
+    return fetch_feed(url).entries
+
+
+def conditional_get_enabled() -> bool:
+    return str(os.getenv("FEED_CONDITIONAL_GET", "1")).strip().lower() not in _FALSEY
+
+
+def inputs_fingerprint(value: Any) -> str:
+    """Hash whatever besides the feed body decides a checker's output.
+
+    A checker whose mapping data changed (say a new last_chapter) must not be
+    skipped just because the feed itself is unchanged.
+    """
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def validators_path(scope: str) -> Path:
+    return repo_path(Path(VALIDATORS_DIR) / f"{scope}.json")
+
+
+def _load_validators(scope: str) -> dict[str, Any]:
+    path = validators_path(scope)
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"fingerprint": "", "feeds": {}}
+
+    if not isinstance(data, dict):
+        return {"fingerprint": "", "feeds": {}}
+
+    feeds = data.get("feeds")
+    return {
+        "fingerprint": str(data.get("fingerprint") or ""),
+        "feeds": feeds if isinstance(feeds, dict) else {},
+    }
+
+
+def _unique(urls: Iterable[str]) -> list[str]:
+    out: list[str] = []
+    for url in urls:
+        if url and url not in out:
+            out.append(url)
+    return out
+
+
+def prefetch(urls: Iterable[str], *, validators: dict[str, dict] | None = None) -> dict[str, CachedFeed]:
+    """Download every url that is not cached yet, concurrently when possible.
+
+    Successful bodies go into the cache for the synchronous checker code that
+    follows; the raw results (including 304s and failures) are returned to
+    the caller. Nothing is raised here: a feed that failed is fetched again,
+    and raises, when the checker reads it with fetch_feed.
+    """
+    from feed_prefetch import fetch_many
+
+    pending = [url for url in _unique(urls) if url not in _FEEDS]
+    if not pending:
+        return {}
+
+    # Hold the per-url locks while downloading, so a checker running on
+    # another thread waits for this download instead of starting its own.
+    # Sorted, so two overlapping prefetches cannot deadlock.
+    locks = [_url_lock(url) for url in sorted(pending)]
+    for lock in locks:
+        lock.acquire()
+    try:
+        pending = [url for url in pending if url not in _FEEDS]
+        if not pending:
+            return {}
+
+        with span("feed_fetch"):
+            results = fetch_many(pending, validators or {})
+        for url, cached in results.items():
+            if cached.ok:
+                _FEEDS.setdefault(url, cached)
+        return results
+    finally:
+        for lock in locks:
+            lock.release()
+
+
+def feeds_unchanged(urls: Iterable[str], *, scope: str, fingerprint: str = "") -> bool:
+    """Return True when every url is unchanged for this scope's validators.
+
+    This is also the run's prefetch stage: every url the checker needs is
+    requested concurrently up front, so a changed run continues with all
+    bodies already cached and the per-novel loops never wait on the network.
+    """
+    urls = _unique(urls)
+    stored = _load_validators(scope)
+    _SCOPES[scope] = {"urls": urls, "fingerprint": fingerprint, "stored": stored}
+
+    if not urls:
+        return False
+
+    conditional = conditional_get_enabled() and all(stored["feeds"].get(url) for url in urls)
+    if conditional and stored["fingerprint"] != fingerprint:
+        print(f"ℹ️ Inputs for {scope} changed since the last run; fetching full feeds.")
+        conditional = False
+
+    if not conditional:
+        prefetch(urls)
+        return False
+
+    # Feeds another checker already downloaded in this process are compared
+    # by validator instead of being requested again.
+    if any(
+        url in _FEEDS and _LATEST_VALIDATORS.get(url) != stored["feeds"][url]
+        for url in urls
+    ):
+        prefetch(urls)
+        return False
+
+    results = prefetch(urls, validators=stored["feeds"])
+    not_modified = [url for url, cached in results.items() if cached.status == 304]
+    # A checker on another thread may have cached some of them meanwhile.
+    cached_changed = any(
+        url not in results and _LATEST_VALIDATORS.get(url) != stored["feeds"][url]
+        for url in urls
+    )
+    if not cached_changed and len(not_modified) == len(results):
+        print(f"ℹ️ {len(urls)} feed(s) unchanged for {scope} (HTTP 304).")
+        return True
+
+    # Something changed, so this run also needs the bodies of the 304 feeds.
+    prefetch(not_modified)
+    return False
+
+
+def save_validators(scope: str) -> bool:
+    """Persist the validators of this run's feeds for scope.
+
+    Call only when the run handled every entry it was given. Returns True when
+    the file changed (so the caller knows to commit it).
+    """
+    info = _SCOPES.get(scope)
+    if info is None:
+        return False
+
+    stored = info["stored"]
+    feeds = {}
+    for url in info["urls"]:
+        validators = _LATEST_VALIDATORS.get(url) or stored["feeds"].get(url)
+        if validators:
+            feeds[url] = validators
+
+    data = {"fingerprint": info["fingerprint"], "feeds": feeds}
+    if data == stored:
+        return False
+
+    write_json_atomic(validators_path(scope), data, backup=False)
+    info["stored"] = data
+    return True
+
+
+def clear() -> None:
+    """Forget every cached feed (long-running callers do this between runs)."""
+    with _LOCK:
+        _FEEDS.clear()
+        _URL_LOCKS.clear()
+        _LATEST_VALIDATORS.clear()
+        _SCOPES.clear()
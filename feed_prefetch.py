@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Concurrent download stage behind feed_cache.prefetch.
+
+Every feed URL a run needs is requested at once through one aiohttp session
+with a per-host connection cap, a timeout, and retries for network errors,
+429 and 5xx. Wall-clock time then follows the slowest feed instead of the sum
+of all of them. Results are plain feed_cache.CachedFeed objects, so the
+synchronous checker code that reads them does not change.
+
+Without aiohttp installed (or for a single URL) the same work is done one URL
+at a time through requests.
+"""
+from __future__ import annotations
+
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from config_loader import positive_int_env
+from feed_cache import (
+    FEED_FETCH_RETRIES,
+    FEED_FETCH_TIMEOUT,
+    RETRY_STATUSES,
+    CachedFeed,
+    _download,
+    _request_headers,
+    record_response,
+    retry_delay,
+)
+
+
+FEED_FETCH_LIMIT_PER_HOST = positive_int_env("FEED_FETCH_LIMIT_PER_HOST", 4)
+
+
+async def _fetch(session, url: str, validators: dict | None) -> CachedFeed:
+    for attempt in range(1, FEED_FETCH_RETRIES + 1):
+        try:
+            async with session.get(url, headers=_request_headers(validators)) as resp:
+                body = await resp.read()
+                if resp.status not in RETRY_STATUSES or attempt == FEED_FETCH_RETRIES:
+                    return record_response(url, resp.status, resp.headers, body)
+                print(f"⚠️ Feed fetch for {url} returned HTTP {resp.status}; retrying.")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            print(f"⚠️ Feed fetch failed for {url} (attempt {attempt}/{FEED_FETCH_RETRIES}): {exc!r}")
+
+        if attempt < FEED_FETCH_RETRIES:
+            await asyncio.sleep(retry_delay(attempt))
+
+    return CachedFeed(url, 0, {}, b"")
+
+
+async def fetch_many_async(urls: list[str], validators: dict[str, dict]) -> dict[str, CachedFeed]:
+    """Fetch urls concurrently from inside a running event loop."""
+    if aiohttp is None:
+        results = await asyncio.gather(
+            *(asyncio.to_thread(_download, url, validators.get(url)) for url in urls)
+        )
+        return dict(zip(urls, results))
+
+    connector = aiohttp.TCPConnector(limit_per_host=FEED_FETCH_LIMIT_PER_HOST)
+    timeout = aiohttp.ClientTimeout(total=FEED_FETCH_TIMEOUT)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(
+            *(_fetch(session, url, validators.get(url)) for url in urls)
+        )
+
+    return dict(zip(urls, results))
+
+
+def fetch_many(urls: list[str], validators: dict[str, dict]) -> dict[str, CachedFeed]:
+    """Fetch urls concurrently and return {url: CachedFeed}.
+
+    Blocks until done, so it must not run on an event loop's thread; async
+    callers use fetch_many_async, or call the sync code through
+    asyncio.to_thread (as the bots do with feeds_unchanged).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("fetch_many would block the running event loop; use fetch_many_async")
+
+    if aiohttp is None or len(urls) == 1:
+        return {url: _download(url, validators.get(url)) for url in urls}
+    return asyncio.run(fetch_many_async(urls, validators))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Read only the new items of an rss-feed document.
+
+The chapter and comment bots used to run feedparser over the whole feed,
+reverse it and then drop every item already in state. feedparser builds a
+full FeedParserDict per item, sanitising each description, even for the
+hundreds of items that were announced long ago.
+
+``unseen_entries`` walks the raw XML with ``ElementTree.iterparse`` instead.
+rss-feed writes items newest first, so it can stop after
+FEED_STREAM_STOP_AFTER items in a row that are already seen; the rest of the
+document is never parsed. Each item is keyed like a feedparser entry
+(``id``, ``published``, ``summary``, ``featuredimage`` as {"url": ...}, ...)
+and handed over as a ``message_context.FeedEntry``. Streamed entries have
+no ``published_parsed``; the bots only read ``published``.
+
+Descriptions are taken as written in the feed, without feedparser's HTML
+sanitising. A document that is not well-formed RSS falls back to the
+feedparser entries, with the same stop rule. FEED_STREAM_STOP_AFTER=0 reads
+the whole feed.
+"""
+from __future__ import annotations
+
+import io
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Iterable, Iterator
+
+from config_loader import non_negative_int_env
+from feed_cache import CachedFeed
+from guid_state import entry_guid_identity
+from message_context import FeedEntry
+from run_metrics import count, span
+
+
+FEED_STREAM_STOP_AFTER = non_negative_int_env("FEED_STREAM_STOP_AFTER", 20)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def _item_record(item: ET.Element) -> FeedEntry:
+    record: dict[str, Any] = {}
+    for child in item:
+        key = _local_name(child.tag)
+        text = (child.text or "").strip()
+        # Singleton tags like <featuredImage url="..."/> become {"url": ...},
+        # as feedparser hands them over.
+        value: Any = dict(child.attrib) if child.attrib and not text else text
+
+        if key == "guid":
+            record.setdefault("id", text)
+            record.setdefault("guid", text)
+            record.setdefault("guidislink", child.get("isPermaLink", "true").lower() != "false")
+        elif key == "pubdate":
+            record.setdefault("published", text)
+        elif key == "description":
+            record.setdefault("description", text)
+            record.setdefault("summary", text)
+        elif key == "creator":  # dc:creator
+            record.setdefault("creator", text)
+            record.setdefault("author", text)
+        else:
+            record.setdefault(key, value)  # first <category> wins, like feedparser
+    return FeedEntry.from_entry(record)
+
+
+def iter_items(body: bytes) -> Iterator[FeedEntry]:
+    """Yield the items of an RSS document in document order, parsing lazily.
+
+    Raises ET.ParseError on malformed XML (possibly after some items).
+    """
+    context = ET.iterparse(io.BytesIO(body), events=("start", "end"))
+    _, root = next(context)
+    if _local_name(root.tag) not in {"rss", "rdf"}:
+        raise ET.ParseError(f"not an RSS document: <{root.tag}>")
+
+    open_elements = [root]
+    for event, element in context:
+        if event == "start":
+            open_elements.append(element)
+            continue
+        open_elements.pop()
+        if _local_name(element.tag) == "item":
+            yield _item_record(element)
+            open_elements[-1].remove(element)  # keep memory to the item being read
+
+
+def _take_unseen(
+    entries: Iterable[Any],
+    seen: Any,
+    stop_after: int,
+    identity: Callable[[Any], str],
+) -> list[Any]:
+    unseen: list[Any] = []
+    seen_in_a_row = 0
+    read = 0
+    for entry in entries:
+        read += 1
+        if identity(entry) in seen:
+            seen_in_a_row += 1
+            if stop_after and seen_in_a_row >= stop_after:
+                break
+            continue
+        seen_in_a_row = 0
+        unseen.append(entry)
+    count("entries_parsed", read)
+    return unseen
+
+
+def unseen_entries(
+    cached: CachedFeed,
+    seen: Any,
+    *,
+    stop_after: int = FEED_STREAM_STOP_AFTER,
+    identity: Callable[[Any], str] = entry_guid_identity,
+) -> list[Any]:
+    """Items of the feed whose identity is not in seen, newest first.
+
+    Reading stops after stop_after seen items in a row. Items without an
+    identity are returned too; callers already skip them.
+    """
+    if not cached.body:
+        return []
+
+    try:
+        with span("feed_parse"):
+            return _take_unseen(iter_items(cached.body), seen, stop_after, identity)
+    except ET.ParseError as exc:
+        print(f"⚠️ Could not stream {cached.url} ({exc}); parsing it with feedparser.")
+        return _take_unseen(cached.entries, seen, stop_after, identity)
@@ -1,10 +1,24 @@
+import atexit
 import os
+import signal
 import subprocess
+import threading
 import time
 from pathlib import Path
 
+from run_metrics import count, span
+
 _FALSEY = {"0", "false", "no", "n", "off"}
 
+# Paths recorded during this run, committed together by flush_pending().
+_PENDING: dict[str, None] = {}
+_PENDING_MESSAGES: list[str] = []
+_PENDING_LOCK = threading.Lock()
+_FLUSH_REGISTERED = False
+
+# Checkers may run on several threads (checker_runner); git itself must not.
+_GIT_LOCK = threading.Lock()
+
 
 def _run_git(repo_dir: Path, *args: str, check: bool = False) -> subprocess.CompletedProcess:
     env = os.environ.copy()
@@ -87,6 +101,7 @@ def _push_with_retry(repo_dir: Path) -> bool:
 
     for attempt in range(1, max_attempts + 1):
         print(f"State push attempt {attempt}/{max_attempts}...")
+        count("git_push_attempts")
 
         fetch = _run_git(repo_dir, "fetch", remote, branch)
         if fetch.returncode != 0:
@@ -117,17 +132,7 @@ def _push_with_retry(repo_dir: Path) -> bool:
     return False
 
 
-def commit_paths_if_changed(paths, message: str | None = None) -> bool:
-    """Commit and push changed state/history files with push-race retries.
-
-    This remains best-effort so an announcement does not crash merely because
-    Git is unavailable. Set GIT_STATE_AUTO_COMMIT=0 when a workflow has its own
-    final commit step; that avoids two independent commit mechanisms.
-    """
-    if _disabled():
-        print("ℹ️ GIT_STATE_AUTO_COMMIT=0; skipped Git state commit.")
-        return False
-
+def _commit_and_push(paths, message: str | None = None) -> bool:
     repo_dir = _repo_dir()
     if not (repo_dir / ".git").exists():
         print("ℹ️ No .git directory found; skipped Git state commit.")
@@ -154,7 +159,8 @@ def commit_paths_if_changed(paths, message: str | None = None) -> bool:
         if diff.returncode == 0:
             print(f"ℹ️ No new Git changes to commit for {', '.join(rel_paths)}.")
         elif diff.returncode == 1:
-            commit = _run_git(repo_dir, "commit", "-m", commit_message)
+            with span("git_commit"):
+                commit = _run_git(repo_dir, "commit", "-m", commit_message)
             if commit.returncode != 0:
                 print("⚠️ Git commit failed; state file was saved locally but not committed.")
                 return False
@@ -162,7 +168,9 @@ def commit_paths_if_changed(paths, message: str | None = None) -> bool:
             print(f"⚠️ Could not check staged diff for {', '.join(rel_paths)}; skipped Git state commit.")
             return False
 
-        if not _push_with_retry(repo_dir):
+        with span("git_push"):
+            pushed = _push_with_retry(repo_dir)
+        if not pushed:
             print("⚠️ State commit remains local because all push attempts failed.")
             return False
 
@@ -174,5 +182,88 @@ def commit_paths_if_changed(paths, message: str | None = None) -> bool:
         return False
 
 
+def _batch_enabled() -> bool:
+    return str(os.getenv("GIT_STATE_BATCH", "1")).strip().lower() not in _FALSEY
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def _install_sigterm_exit() -> None:
+    # A job timeout sends SIGTERM, which would skip atexit. Turn it into a
+    # normal exit so whatever was already written still gets pushed. Done at
+    # import, on the main thread: the first commit may come from a worker
+    # thread (checker_runner, the bots' asyncio.to_thread), where signal
+    # handlers cannot be installed.
+    if threading.current_thread() is not threading.main_thread():
+        return
+    try:
+        if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    except (ValueError, OSError):
+        pass
+
+
+_install_sigterm_exit()
+
+
+def _register_flush() -> None:
+    """Flush at interpreter exit, including after an exception or SIGTERM."""
+    global _FLUSH_REGISTERED
+    if _FLUSH_REGISTERED:
+        return
+    _FLUSH_REGISTERED = True
+    atexit.register(flush_pending)
+
+
+def flush_pending(message: str | None = None) -> bool:
+    """Commit every recorded path in one commit and push once."""
+    with _PENDING_LOCK:
+        paths = list(_PENDING)
+        messages = list(dict.fromkeys(_PENDING_MESSAGES))
+        _PENDING.clear()
+        _PENDING_MESSAGES.clear()
+
+    if not paths:
+        return False
+
+    if message is None and len(messages) == 1:
+        message = messages[0]
+    with _GIT_LOCK:
+        return _commit_and_push(paths, message)
+
+
+def commit_paths_if_changed(paths, message: str | None = None) -> bool:
+    """Commit and push changed state/history files with push-race retries.
+
+    By default the paths are only recorded, and one commit plus one push
+    covering everything the run wrote happens at exit (or on an explicit
+    flush_pending()). Set GIT_STATE_BATCH=0 to commit and push on every call.
+
+    This remains best-effort so an announcement does not crash merely because
+    Git is unavailable. Set GIT_STATE_AUTO_COMMIT=0 when a workflow has its own
+    final commit step; that avoids two independent commit mechanisms.
+    """
+    if _disabled():
+        print("ℹ️ GIT_STATE_AUTO_COMMIT=0; skipped Git state commit.")
+        return False
+
+    if not _batch_enabled():
+        with _GIT_LOCK:
+            return _commit_and_push(paths, message)
+
+    repo_dir = _repo_dir()
+    rel_paths = [_relative_path(repo_dir, path) for path in _as_list(paths)]
+    if not rel_paths:
+        return False
+
+    with _PENDING_LOCK:
+        _PENDING.update(dict.fromkeys(rel_paths))
+        _PENDING_MESSAGES.append(message or _default_message(rel_paths))
+    _register_flush()
+    return True
+
+
 def commit_state_update(path: str, message: str | None = None) -> bool:
     return commit_paths_if_changed([path], message)
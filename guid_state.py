@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import hashlib
 import html
-from typing import Any, Iterable
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator
 from urllib.parse import urlsplit, urlunsplit
 
+from message_context import FeedEntry
+
+MESSAGE_NONCE_LENGTH = 25  # Discord's limit for a string nonce
+
 
 def _entry_get(entry: Any, *keys: str, default: str = "") -> Any:
     for key in keys:
@@ -18,8 +24,40 @@ def _entry_get(entry: Any, *keys: str, default: str = "") -> Any:
     return default
 
 
+def _already_normalized(raw: str) -> bool:
+    """True when urlsplit/urlunsplit would hand raw back unchanged.
+
+    Saved GUIDs are written already normalised, so this cheap check keeps
+    loading a large seen list free of URL parsing.
+    """
+    if "\t" in raw or "\r" in raw or "\n" in raw or (raw and raw[0] < " "):
+        return False
+
+    colon = raw.find(":")
+    if colon <= 0 or not raw.startswith("//", colon + 1):
+        # No "scheme://" means no netloc to lowercase.
+        return True
+
+    authority_end = len(raw)
+    for sep in "/?#":
+        pos = raw.find(sep, colon + 3)
+        if pos != -1 and pos < authority_end:
+            authority_end = pos
+    prefix = raw[:authority_end]
+    if prefix != prefix.lower():
+        return False
+
+    # urlunsplit drops empty query / fragment markers.
+    return not (raw.endswith(("?", "#")) or "?#" in raw)
+
+
 def _normalize_raw_guid(raw: Any) -> str:
-    raw = html.unescape(str(raw or "").strip())
+    raw = str(raw or "").strip()
+    if "&" in raw:
+        raw = html.unescape(raw)
+
+    if _already_normalized(raw):
+        return raw
 
     try:
         parsed = urlsplit(raw)
@@ -40,14 +78,20 @@ def _normalize_raw_guid(raw: Any) -> str:
 
 
 def raw_guid_from_entry(entry: Any) -> str:
+    if isinstance(entry, FeedEntry):
+        return _normalize_raw_guid(entry.guid)
     return _normalize_raw_guid(_entry_get(entry, "guid", "id"))
 
 
 def host_from_entry(entry: Any, default: str = "") -> str:
+    if isinstance(entry, FeedEntry):
+        return entry.host or default
     return str(_entry_get(entry, "host", "Host", "HOST", default=default) or "").strip()
 
 
 def short_code_from_entry(entry: Any) -> str:
+    if isinstance(entry, FeedEntry):
+        return entry.short_code.upper()
     return str(
         _entry_get(
             entry,
@@ -81,6 +125,23 @@ def entry_guid_identity(entry: Any) -> str:
     return guid_identity(raw_guid_from_entry(entry))
 
 
+def message_nonce(channel_id: Any, *parts: Any) -> str:
+    """
+    Deterministic Discord nonce for one announcement in one channel.
+
+    Payloads carry it with enforce_nonce, so Discord answers a repeat of the
+    same nonce from the bot (within a few minutes) with the message it
+    already created. A retry after a lost response then does not post twice.
+    """
+    material = "\x1f".join(str(part) for part in (channel_id, *parts))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:MESSAGE_NONCE_LENGTH]
+
+
+def entry_nonce(channel_id: Any, *entries: Any) -> str:
+    """message_nonce of the feed entries one message announces."""
+    return message_nonce(channel_id, *(entry_guid_identity(entry) for entry in entries))
+
+
 def seen_guid_identities(items: Iterable[Any] | None) -> set[str]:
     out: set[str] = set()
     for item in items or []:
@@ -90,6 +151,47 @@ def seen_guid_identities(items: Iterable[Any] | None) -> set[str]:
     return out
 
 
+class SeenGuids:
+    """Bounded, insertion-ordered store of seen GUIDs.
+
+    Keys are duplicate-check identities, values are the strings saved in
+    state_rss.json (``host::short_code::guid``). Membership, insert and
+    eviction of the oldest entry are O(1). Iterating yields the saved
+    strings oldest first, which is also what ``to_json`` returns.
+    """
+
+    def __init__(self, items: Iterable[Any] | None = None, *, cap: int | None = None) -> None:
+        self.cap = cap if cap and cap > 0 else None
+        self._items: OrderedDict[str, str] = OrderedDict()
+        for item in items or []:
+            self.add(item)
+
+    def add(self, saved: Any) -> bool:
+        """Remember a saved-format GUID; return False if it was already known."""
+        saved = str(saved or "")
+        ident = guid_identity(saved)
+        if not ident or ident in self._items:
+            return False
+
+        self._items[ident] = saved
+        if self.cap is not None:
+            while len(self._items) > self.cap:
+                self._items.popitem(last=False)
+        return True
+
+    def __contains__(self, ident: object) -> bool:
+        return ident in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items.values())
+
+    def to_json(self) -> list[str]:
+        return list(self._items.values())
+
+
 def format_seen_guid(entry: Any, *, default_host: str = "") -> str:
     """Format what gets saved in state_rss.json for human readability."""
     guid = entry_guid_identity(entry)
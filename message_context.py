@@ -86,6 +86,95 @@ def get_obj_url(entry: Any, *names: str) -> str:
     return ""
 
 
+class FeedEntry:
+    """
+    One feed item with its fields resolved once, under canonical names.
+
+    entry_get has to try up to four spellings of every key on a
+    feedparser entry. FeedEntry.from_entry does that probing a single time
+    per item (featuredImage / featuredimage, dc_creator / author, ...), and
+    everything after that reads plain slots. Image tags hold their URL.
+
+    get() keeps the dict-style reads of existing code working; it accepts
+    the same spellings entry_get does.
+    """
+
+    __slots__ = (
+        "title", "link", "guid", "guid_is_permalink",
+        "published", "published_parsed", "updated_parsed",
+        "category", "description", "volume", "chapter", "chaptername",
+        "translator", "translator_url", "short_code", "coin", "host",
+        "featured_image", "host_logo", "comment_image",
+        "creator", "author", "reply_chain",
+    )
+
+    # entry_get spellings for each slot, tried in order.
+    _SOURCES = {
+        "title": ("title",),
+        "link": ("link",),
+        "guid": ("guid", "id"),
+        "guid_is_permalink": ("guid_is_permalink", "guidislink", "isPermaLink", "ispermalink"),
+        "published": ("published", "pubDate", "pub_date"),
+        "category": ("category",),
+        "description": ("description",),
+        "volume": ("volume",),
+        "chapter": ("chapter",),
+        "chaptername": ("chaptername", "chapter_name"),
+        "translator": ("translator",),
+        "translator_url": ("translator_url", "translatorUrl", "translatorurl"),
+        "short_code": ("short_code", "shortcode", "shortCode", "short"),
+        "coin": ("coin",),
+        "host": ("host",),
+        "creator": ("creator", "dc_creator", "author"),
+        "author": ("author", "dc_creator", "creator"),
+        "reply_chain": ("reply_chain", "replyChain"),
+    }
+    _IMAGE_SOURCES = {
+        "featured_image": ("featuredImage", "featuredimage", "featured_image"),
+        "host_logo": ("hostLogo", "hostlogo", "host_logo"),
+        "comment_image": ("commentImage", "commentimage", "comment_image"),
+    }
+    _ALIASES: dict[str, str] = {}
+
+    def __init__(self, **fields: Any) -> None:
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name, None if name.endswith("_parsed") else ""))
+
+    @classmethod
+    def from_entry(cls, entry: Any) -> "FeedEntry":
+        """Resolve a feedparser entry (or any dict-like item) once."""
+        if isinstance(entry, cls):
+            return entry
+        fields: dict[str, Any] = {
+            name: norm(entry_get(entry, *keys, default=""))
+            for name, keys in cls._SOURCES.items()
+        }
+        for name, keys in cls._IMAGE_SOURCES.items():
+            fields[name] = get_obj_url(entry, *keys)
+        fields["published_parsed"] = obj_get(entry, "published_parsed", None)
+        fields["updated_parsed"] = obj_get(entry, "updated_parsed", None)
+        return cls(**fields)
+
+    @classmethod
+    def _alias(cls, key: str) -> str | None:
+        if not cls._ALIASES:
+            aliases = {name.replace("_", "").lower(): name for name in cls.__slots__}
+            aliases.update({"id": "guid", "summary": "description"})
+            for name, keys in {**cls._SOURCES, **cls._IMAGE_SOURCES}.items():
+                for source in keys:
+                    aliases.setdefault(source.replace("_", "").lower(), name)
+            cls._ALIASES = aliases
+        return cls._ALIASES.get(key.replace("_", "").lower())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        name = self._alias(key)
+        value = getattr(self, name) if name else None
+        return default if value in (None, "") else value
+
+    def __repr__(self) -> str:
+        return f"FeedEntry(title={self.title!r}, chapter={self.chapter!r}, guid={self.guid!r})"
+
+
 def parse_pub_datetime(entry: Any) -> datetime | None:
     """Return timezone-aware pubDate/published datetime, or None."""
     raw = (
@@ -144,60 +233,36 @@ def build_feed_context(entry: Any) -> dict[str, Any]:
       ctx["button_label"] = "5"
       ctx["button_emoji"] = "<:mistmint_currency:1433046707121422487>"
     """
+    entry = FeedEntry.from_entry(entry)
     pub_dt = parse_pub_datetime(entry)
-    pub_raw = (
-        getattr(entry, "published", None)
-        or entry_get(entry, "published", "pubDate", "pub_date", default="")
-    )
-
-    featured_image = get_obj_url(entry, "featuredImage", "featuredimage", "featured_image")
-    host_logo = get_obj_url(entry, "hostLogo", "hostlogo", "host_logo")
-    comment_image = get_obj_url(entry, "commentImage", "commentimage", "comment_image")
-
-    short_code = norm(entry_get(entry, "short_code", "shortcode", "shortCode", "short", default="")).upper()
-    category = norm(entry_get(entry, "category", default=""))
-
-    # dc:creator from feedparser can appear as author, dc_creator, or creator.
-    creator = norm(entry_get(entry, "creator", "dc_creator", "author", default=""))
-    author = norm(entry_get(entry, "author", "dc_creator", "creator", default=""))
-
-    guid_is_permalink = entry_get(
-        entry,
-        "guid_is_permalink",
-        "guidislink",
-        "isPermaLink",
-        "ispermalink",
-        default="",
-    )
-
-    chaptername = strip_discord_chaptername_format(
-        entry_get(entry, "chaptername", "chapter_name", default="")
-    )
+    pub_raw = entry.published
+    category = entry.category
+    chaptername = strip_discord_chaptername_format(entry.chaptername)
     chaptername_display = discord_chaptername_display(chaptername)
 
     ctx: dict[str, Any] = {
         # Common RSS fields
-        "title": norm(entry_get(entry, "title", default="")),
-        "volume": norm(entry_get(entry, "volume", default="")),
-        "chapter": norm(entry_get(entry, "chapter", default="")) or "New Chapter",
+        "title": entry.title,
+        "volume": entry.volume,
+        "chapter": entry.chapter or "New Chapter",
         "chaptername": chaptername,
         "chaptername_display": chaptername_display,
-        "link": norm(entry_get(entry, "link", default="")),
-        "description": norm(entry_get(entry, "description", default="")),
+        "link": entry.link,
+        "description": entry.description,
         "category": category,
-        "translator": norm(entry_get(entry, "translator", default="")),
-        "translator_url": norm(entry_get(entry, "translator_url", "translatorUrl", "translatorurl", default="")),
-        "short_code": short_code,
-        "coin": norm(entry_get(entry, "coin", default="")),
+        "translator": entry.translator,
+        "translator_url": entry.translator_url,
+        "short_code": entry.short_code.upper(),
+        "coin": entry.coin,
 
         # Image aliases from docs/rss-template-placeholders.md
-        "featured_image": featured_image,
-        "featured_image_url": featured_image,
-        "host": norm(entry_get(entry, "host", default="")),
-        "host_logo": host_logo,
-        "host_logo_url": host_logo,
-        "comment_image": comment_image,
-        "comment_image_url": comment_image,
+        "featured_image": entry.featured_image,
+        "featured_image_url": entry.featured_image,
+        "host": entry.host,
+        "host_logo": entry.host_logo,
+        "host_logo_url": entry.host_logo,
+        "comment_image": entry.comment_image,
+        "comment_image_url": entry.comment_image,
 
         # Date aliases
         "pub_date": norm(pub_raw),
@@ -206,15 +271,15 @@ def build_feed_context(entry: Any) -> dict[str, Any]:
         "published_iso": pub_dt.isoformat() if pub_dt else "",
 
         # GUID aliases
-        "guid": norm(entry_get(entry, "guid", "id", default="")),
-        "id": norm(entry_get(entry, "id", "guid", default="")),
-        "guid_is_permalink": norm(guid_is_permalink),
+        "guid": entry.guid,
+        "id": entry.guid,
+        "guid_is_permalink": entry.guid_is_permalink,
 
         # Comment feed fields
-        "creator": creator,
-        "author": author,
-        "dc_creator": creator,
-        "reply_chain": norm(entry_get(entry, "reply_chain", "replyChain", default="")),
+        "creator": entry.creator,
+        "author": entry.author,
+        "dc_creator": entry.creator,
+        "reply_chain": entry.reply_chain,
 
         # Convenience booleans/aliases for *_when checks
         "is_nsfw": category.upper() == "NSFW",
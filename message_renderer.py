@@ -6,19 +6,8 @@ import re
 from pathlib import Path
 from typing import Any
 
-from config_loader import embed_color, load_toml
-
-try:
-    import discord
-    from discord import Embed
-    from discord.ui import Button, View
-except Exception:
-    # Allows raw-API-only scripts to import this file safely.
-    discord = None
-    Embed = None
-    Button = None
-    View = None
-
+from config_loader import embed_color, load_toml, repo_path
+from run_metrics import span
 
 TEMPLATE_DIR = Path("message_templates")
 PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_\.]*)\}")
@@ -26,6 +15,29 @@ PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_\.]*)\}")
 # Empty lists are important for allowed_mentions = { parse = [] }.
 KEEP_EMPTY_KEYS = {"parse", "users", "roles", "allowed_mentions"}
 
+# name -> (mtime_ns, size, parsed TOML, {variant: compiled template})
+_TEMPLATE_CACHE: dict[str, tuple[int, int, dict[str, Any], dict[Any, Any]]] = {}
+
+
+# discord.py object builders live in discord_py_payload, which imports
+# discord.py. Only the gateway path needs them, so they are loaded on first
+# access and REST-only scripts never import discord.py at all.
+_DISCORD_PY_NAMES = {
+    "parse_custom_emoji",
+    "build_embed",
+    "build_view",
+    "build_allowed_mentions",
+    "to_discord_py_kwargs",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _DISCORD_PY_NAMES:
+        import discord_py_payload
+
+        return getattr(discord_py_payload, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_path(ctx: dict[str, Any], key: str, default: Any = "") -> Any:
     """Support placeholders like {title} and nested placeholders like {novel.url}."""
@@ -68,6 +80,19 @@ def should_drop(key: str, value: Any) -> bool:
     return value in (None, "", {}, [])
 
 
+def resolve_color(color_key: Any, default: Any, ctx: dict[str, Any]) -> int:
+    return embed_color(
+        str(color_key),
+        str(default),
+        short_code=str(ctx.get("short_code", "")),
+        novel_color=str(
+            ctx.get("discord_color", "")
+            or ctx.get("theme_color", "")
+            or ctx.get("novel_color", "")
+        ),
+    )
+
+
 def render_obj(obj: Any, ctx: dict[str, Any]) -> Any:
     """Recursively render strings/lists/dicts from TOML."""
     if isinstance(obj, str):
@@ -108,16 +133,7 @@ def render_obj(obj: Any, ctx: dict[str, Any]) -> Any:
                     color_key = render_text(value, ctx)
                     default = "000000"
 
-                out[key] = embed_color(
-                    str(color_key),
-                    str(default),
-                    short_code=str(ctx.get("short_code", "")),
-                    novel_color=str(
-                        ctx.get("discord_color", "")
-                        or ctx.get("theme_color", "")
-                        or ctx.get("novel_color", "")
-                    ),
-                )
+                out[key] = resolve_color(color_key, default, ctx)
                 continue
 
             rendered = render_obj(value, ctx)
@@ -132,6 +148,177 @@ def render_obj(obj: Any, ctx: dict[str, Any]) -> Any:
     return obj
 
 
+# Compiled templates are nested tuples, built once per template file:
+#   (_CONST, value)                        value used as-is
+#   (_TEXT, [str | tuple[str, ...], ...])  literal segments and placeholder paths
+#   (_LIST, [node, ...])
+#   (_DICT, when, [(key, key_when, node), ...])
+#   (_COLOR, key_node, default_node)
+# _render on a compiled node returns exactly what render_obj returns for the
+# source object, without re-walking *_when keys or re-running PLACEHOLDER_RE.
+_CONST, _TEXT, _LIST, _DICT, _COLOR = range(5)
+
+
+def _compile_text(value: str) -> tuple:
+    parts: list[str | tuple[str, ...]] = []
+    pos = 0
+    for match in PLACEHOLDER_RE.finditer(value):
+        if match.start() > pos:
+            parts.append(value[pos:match.start()])
+        parts.append(tuple(match.group(1).split(".")))
+        pos = match.end()
+
+    if not parts:
+        return (_CONST, value)
+    if pos < len(value):
+        parts.append(value[pos:])
+    return (_TEXT, parts)
+
+
+def _compile_scalar(value: Any) -> tuple:
+    # render_text only substitutes into strings; anything else passes through.
+    return _compile_text(value) if isinstance(value, str) else (_CONST, value)
+
+
+def compile_obj(obj: Any) -> tuple:
+    """Compile a TOML template object for _render."""
+    if isinstance(obj, str):
+        return _compile_text(obj)
+
+    if isinstance(obj, list):
+        return (_LIST, [compile_obj(item) for item in obj])
+
+    if isinstance(obj, dict):
+        fields = []
+        for key, value in obj.items():
+            if key == "when" or key.endswith("_when"):
+                continue
+
+            if key == "color":
+                if isinstance(value, dict):
+                    node = (
+                        _COLOR,
+                        _compile_scalar(value.get("key", "")),
+                        _compile_scalar(value.get("default", "000000")),
+                    )
+                else:
+                    node = (_COLOR, _compile_scalar(value), (_CONST, "000000"))
+            else:
+                node = compile_obj(value)
+
+            fields.append((key, obj.get(f"{key}_when"), node))
+        return (_DICT, obj.get("when"), fields)
+
+    return (_CONST, obj)
+
+
+def _lookup(ctx: dict[str, Any], path: tuple[str, ...]) -> Any:
+    cur: Any = ctx
+    for part in path:
+        if not isinstance(cur, dict) or part not in cur:
+            return ""
+        cur = cur[part]
+    return cur
+
+
+def _render(node: tuple, ctx: dict[str, Any]) -> Any:
+    kind = node[0]
+
+    if kind == _TEXT:
+        out = []
+        for part in node[1]:
+            if part.__class__ is str:
+                out.append(part)
+            else:
+                value = _lookup(ctx, part)
+                out.append("" if value is None else str(value))
+        return "".join(out)
+
+    if kind == _CONST:
+        return node[1]
+
+    if kind == _LIST:
+        items = []
+        for item in node[1]:
+            rendered = _render(item, ctx)
+            if rendered not in (None, "", {}, []):
+                items.append(rendered)
+        return items
+
+    if kind == _DICT:
+        if not is_truthy(ctx, node[1]):
+            return None
+
+        result: dict[str, Any] = {}
+        for key, condition_key, child in node[2]:
+            if condition_key and not is_truthy(ctx, condition_key):
+                continue
+
+            if child[0] == _COLOR:
+                result[key] = resolve_color(_render(child[1], ctx), _render(child[2], ctx), ctx)
+                continue
+
+            rendered = _render(child, ctx)
+            if should_drop(key, rendered):
+                continue
+            result[key] = rendered
+        return result
+
+    raise ValueError(f"Unknown compiled template node: {kind!r}")
+
+
+def _template_entry(name: str) -> tuple[int, int, dict[str, Any], dict[Any, Any]]:
+    """Parse message_templates/{name}.toml once per process and per file change."""
+    relative = TEMPLATE_DIR / f"{name}.toml"
+    try:
+        stat = repo_path(relative).stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        key = (-1, -1)
+
+    cached = _TEMPLATE_CACHE.get(name)
+    if cached is not None and cached[:2] == key:
+        return cached
+
+    entry = (*key, load_toml(relative), {})
+    _TEMPLATE_CACHE[name] = entry
+    return entry
+
+
+def _is_message_table(value: Any) -> bool:
+    return isinstance(value, dict) and ("content" in value or "embeds" in value)
+
+
+def _template_data(name: str, variant: str | None) -> dict[str, Any]:
+    data = _template_entry(name)[2]
+    if variant:
+        if variant not in data:
+            raise RuntimeError(f"Missing [{variant}] in message_templates/{name}.toml")
+        return data[variant]
+    # A top-level message may sit next to variants such as [batch]; those
+    # are not part of it.
+    return {key: value for key, value in data.items() if not _is_message_table(value)}
+
+
+def compiled_template(name: str, *, variant: str | None = None, sequence: bool = False) -> Any:
+    """Return the compiled template (a list of compiled messages when sequence=True)."""
+    entry = _template_entry(name)
+    cache_key = (variant, sequence)
+    compiled = entry[3].get(cache_key)
+    if compiled is None:
+        template = _template_data(name, variant)
+        if sequence:
+            compiled = [compile_obj(message) for message in template.get("messages", [])]
+        else:
+            compiled = compile_obj(template)
+        entry[3][cache_key] = compiled
+    return compiled
+
+
+def clear_template_cache() -> None:
+    _TEMPLATE_CACHE.clear()
+
+
 def load_template(name: str, *, variant: str | None = None) -> dict[str, Any]:
     """
     Load message_templates/{name}.toml.
@@ -142,20 +329,15 @@ def load_template(name: str, *, variant: str | None = None) -> dict[str, Any]:
 
       [free]
       content = "..."
-    """
-    data = load_toml(TEMPLATE_DIR / f"{name}.toml")
 
-    if variant:
-        if variant not in data:
-            raise RuntimeError(f"Missing [{variant}] in message_templates/{name}.toml")
-        return copy.deepcopy(data[variant])
-
-    return copy.deepcopy(data)
+    The parsed file is cached per process; callers get their own deep copy.
+    """
+    return copy.deepcopy(_template_data(name, variant))
 
 
 def render_message(name: str, ctx: dict[str, Any], *, variant: str | None = None) -> dict[str, Any]:
-    template = load_template(name, variant=variant)
-    payload = render_obj(template, ctx) or {}
+    with span("render"):
+        payload = _render(compiled_template(name, variant=variant), ctx) or {}
 
     # mode is template metadata, not a Discord payload field.
     payload.pop("mode", None)
@@ -183,13 +365,11 @@ def render_message_sequence(name: str, ctx: dict[str, Any], *, variant: str | No
       name = "locked"
       content = "..."
     """
-    template = load_template(name, variant=variant)
-    messages = template.get("messages", [])
-
     rendered_messages: list[dict[str, Any]] = []
 
-    for message in messages:
-        rendered = render_obj(message, ctx)
+    for message in compiled_template(name, variant=variant, sequence=True):
+        with span("render"):
+            rendered = _render(message, ctx)
         if not rendered:
             continue
 
@@ -206,27 +386,6 @@ def render_message_sequence(name: str, ctx: dict[str, Any], *, variant: str | No
     return rendered_messages
 
 
-def parse_custom_emoji(value: Any) -> Any:
-    """Return discord.py PartialEmoji for <:name:id>, or unicode emoji string."""
-    if value is None:
-        return None
-
-    s = str(value).strip()
-    if not s:
-        return None
-
-    m = re.match(r"^<(?P<animated>a?):(?P<name>[A-Za-z0-9_]+):(?P<id>\d+)>$", s)
-    if m and discord is not None:
-        return discord.PartialEmoji(
-            name=m.group("name"),
-            id=int(m.group("id")),
-            animated=bool(m.group("animated")),
-        )
-
-    # Unicode emoji / plain text emoji.
-    return s
-
-
 def api_emoji(value: Any) -> dict[str, Any] | None:
     """Return Discord API emoji object for buttons/components."""
     if value is None:
@@ -262,170 +421,6 @@ def button_style_value(style: Any) -> int:
     }.get(s, 5)
 
 
-def build_embed(data: dict[str, Any]) -> Any:
-    """Convert a rendered embed dict into discord.Embed."""
-    if Embed is None:
-        raise RuntimeError("discord.py is not available, cannot build discord.Embed")
-
-    data = dict(data)
-    color = data.pop("color", None)
-
-    embed = Embed(
-        title=data.pop("title", None),
-        url=data.pop("url", None),
-        description=data.pop("description", None),
-        color=color,
-    )
-
-    timestamp = data.pop("timestamp", None)
-    if timestamp:
-        from dateutil import parser as dateparser
-        try:
-            embed.timestamp = dateparser.parse(str(timestamp))
-        except Exception:
-            pass
-
-    author = data.pop("author", None)
-    if isinstance(author, dict) and author.get("name"):
-        embed.set_author(**author)
-
-    thumbnail = data.pop("thumbnail", None)
-    if isinstance(thumbnail, dict) and thumbnail.get("url"):
-        embed.set_thumbnail(url=thumbnail["url"])
-
-    image = data.pop("image", None)
-    if isinstance(image, dict) and image.get("url"):
-        embed.set_image(url=image["url"])
-
-    footer = data.pop("footer", None)
-    if isinstance(footer, dict) and (footer.get("text") or footer.get("icon_url")):
-        embed.set_footer(**footer)
-
-    for field in data.pop("fields", []) or []:
-        if not isinstance(field, dict):
-            continue
-        embed.add_field(
-            name=field.get("name") or "\u200b",
-            value=field.get("value") or "\u200b",
-            inline=bool(field.get("inline", False)),
-        )
-
-    return embed
-
-
-def build_view(components: Any) -> Any:
-    """Convert rendered TOML components into a discord.ui.View for classic buttons."""
-    if not components:
-        return None
-    if View is None or Button is None:
-        raise RuntimeError("discord.py is not available, cannot build discord.ui.View")
-
-    # Expected TOML shape:
-    # [components]
-    # [[components.action_rows]]
-    # [[components.action_rows.buttons]]
-    rows = []
-    if isinstance(components, dict):
-        rows = components.get("action_rows") or []
-    elif isinstance(components, list):
-        rows = components
-
-    view = View()
-
-    for row in rows:
-        if not isinstance(row, dict):
-            continue
-
-        for button in row.get("buttons", []) or row.get("components", []) or []:
-            if not isinstance(button, dict):
-                continue
-
-            style = str(button.get("style", "link")).strip().lower()
-
-            # For now, only link buttons are safe/generic for your current scripts.
-            if style != "link" and button_style_value(style) != 5:
-                continue
-
-            kwargs = {
-                "label": button.get("label") or None,
-                "url": button.get("url") or None,
-            }
-
-            emoji = parse_custom_emoji(button.get("emoji"))
-            if emoji:
-                kwargs["emoji"] = emoji
-
-            if kwargs["url"]:
-                view.add_item(Button(**kwargs))
-
-    return view if view.children else None
-
-
-def build_allowed_mentions(allowed_mentions: Any) -> Any:
-    """Convert rendered allowed_mentions dict into discord.AllowedMentions."""
-    if discord is None:
-        raise RuntimeError("discord.py is not available, cannot build AllowedMentions")
-
-    if not isinstance(allowed_mentions, dict):
-        return None
-
-    parse = set(allowed_mentions.get("parse") or [])
-
-    users_value: bool | list[Any]
-    roles_value: bool | list[Any]
-
-    if "users" in parse:
-        users_value = True
-    else:
-        users = [str(x).strip() for x in allowed_mentions.get("users", []) if str(x).strip()]
-        users_value = [discord.Object(id=int(x)) for x in users] if users else False
-
-    if "roles" in parse:
-        roles_value = True
-    else:
-        roles = [str(x).strip() for x in allowed_mentions.get("roles", []) if str(x).strip()]
-        roles_value = [discord.Object(id=int(x)) for x in roles] if roles else False
-
-    return discord.AllowedMentions(
-        everyone=("everyone" in parse),
-        users=users_value,
-        roles=roles_value,
-        replied_user=bool(allowed_mentions.get("replied_user", False)),
-    )
-
-
-def to_discord_py_kwargs(payload: dict[str, Any]) -> dict[str, Any]:
-    """
-    Convert rendered payload into kwargs for discord.py:
-      await channel_or_thread.send(**kwargs)
-    """
-    kwargs: dict[str, Any] = {}
-
-    if payload.get("content") not in (None, ""):
-        kwargs["content"] = payload["content"]
-
-    embeds_data = payload.get("embeds") or []
-    embeds = [build_embed(e) for e in embeds_data if isinstance(e, dict)]
-
-    if len(embeds) == 1:
-        kwargs["embed"] = embeds[0]
-    elif len(embeds) > 1:
-        kwargs["embeds"] = embeds
-
-    view = build_view(payload.get("components"))
-    if view:
-        kwargs["view"] = view
-
-    allowed_mentions = build_allowed_mentions(payload.get("allowed_mentions"))
-    if allowed_mentions is not None:
-        kwargs["allowed_mentions"] = allowed_mentions
-
-    if int(payload.get("flags", 0)) & 4:
-        kwargs["suppress_embeds"] = True
-
-    return kwargs
-
-
 def api_components(components: Any) -> list[dict[str, Any]] | None:
     """Convert TOML component shape into Discord API component JSON."""
     if not components:
@@ -503,6 +498,11 @@ def to_discord_api_payload(payload: dict[str, Any]) -> dict[str, Any]:
         "flags",
         "tts",
         "message_reference",
+        "nonce",
     }
 
-    return {k: v for k, v in out.items() if k in allowed and v not in (None, "")}
+    out = {k: v for k, v in out.items() if k in allowed and v not in (None, "")}
+    if "nonce" in out:
+        # Discord then returns the existing message for a repeated nonce.
+        out["enforce_nonce"] = True
+    return out
@@ -1,13 +1,18 @@
 import requests
-import feedparser
 import os
-import json
 import re
 import sys
+from datetime import datetime, timedelta, timezone
 
 from novel_mappings import HOSTING_SITE_DATA, get_nsfw_novels
 from message_renderer import render_message_sequence, to_discord_api_payload
+from guid_state import message_nonce
+from feed_cache import feed_entries, feeds_unchanged, inputs_fingerprint, save_validators, validators_path
+from outbox import Outbox
 from git_state_commit import commit_state_update
+from atomic_json import read_json, write_json_atomic
+from run_metrics import start_run
+from arc_state import ArcHistory, arc_number
 
 
 # ─── CONFIG ────────────────────────────────────────────────────────────────────
@@ -16,6 +21,7 @@ from config_loader import (
     get_novel_role_id,
     get_novel_custom_emoji,
     get_novel_role_url,
+    positive_float_env,
     require_server_value,
     require_file_value,
     require_role_value,
@@ -26,6 +32,9 @@ BOT_TOKEN  = os.environ["DISCORD_BOT_TOKEN"]
 CHANNEL_ID = server_channel_id_str("announcements")
 
 STATE_PATH = require_file_value("state_path")
+FEED_SCOPE = "new_arc_checker"
+OUTBOX = Outbox(FEED_SCOPE)
+SCAN_MARKS_PATH = validators_path(f"{FEED_SCOPE}_scan_marks")
 
 ONGOING_ROLE = role_id_to_mention(require_role_value("ongoing"))
 NSFW_ROLE = role_id_to_mention(require_role_value("nsfw"))
@@ -50,6 +59,15 @@ ANNOUNCE_FIRST_ARC_RELEASE = setting_bool(
     False,
 )
 
+# feed_validators/new_arc_checker_scan_marks.json remembers, per novel, the
+# newest free and paid entry already scanned, so a run only examines entries
+# past them. They live next to the feed validators rather than in the arc
+# history files, so a new chapter alone does not rewrite (and commit) the
+# history. Every ARC_FULL_RESCAN_DAYS (or whenever ARC_FULL_RESCAN=1) the
+# whole feed is scanned again to repair anything a partial scan missed.
+ARC_FULL_RESCAN = setting_bool("ARC_FULL_RESCAN", "arc_full_rescan", False)
+ARC_FULL_RESCAN_DAYS = positive_float_env("ARC_FULL_RESCAN_DAYS", 7.0)
+
 # ────────────────────────────────────────────────────────────────────────────────
 
 # === HELPER FUNCTIONS ===
@@ -74,68 +92,41 @@ def join_role_mentions(*parts):
     return " | ".join(out)
 
 def send_bot_payload(bot_token: str, channel_id: str, message_payload: dict):
-    url = f"https://discord.com/api/v10/channels/{channel_id}/messages"
-    headers = {
-        "Authorization": f"Bot {bot_token}",
-        "Content-Type":  "application/json",
-    }
-
-    payload = to_discord_api_payload(message_payload)
-
-    resp = requests.post(url, headers=headers, json=payload, timeout=20)
-
-    if not resp.ok:
-        print(f"⚠️ Bot error {resp.status_code}: {resp.text}")
-
-    resp.raise_for_status()
-    return resp
+    return OUTBOX.post(bot_token, channel_id, to_discord_api_payload(message_payload))
 
 def load_history(history_file):
     """
     Loads the novel's arc history from JSON file.
-    If the file is missing OR it's empty / invalid JSON,
+    A damaged file is restored from its .bak when there is one. If the file
+    is missing, OR it's empty / invalid JSON with no backup,
     we fall back to a fresh structure so the run doesn't die.
     """
-    if os.path.exists(history_file):
-        with open(history_file, "r", encoding="utf-8") as f:
-            raw = f.read().strip()
-
-        if not raw:
-            # file exists but is blank
-            print(f"📂 {history_file} is empty, initializing fresh history")
-            return {"unlocked": [], "locked": [], "last_announced": ""}
-
-        try:
-            history = json.loads(raw)
-        except json.JSONDecodeError:
-            # file exists but has garbage / half-written JSON
-            print(f"📂 {history_file} was invalid JSON, re-initializing fresh history")
-            history = {"unlocked": [], "locked": [], "last_announced": ""}
+    try:
+        history = read_json(history_file)
+    except FileNotFoundError:
+        # no file at all -> brand new novel
+        print(f"📂 No history file found at {history_file}, starting fresh")
+        return ArcHistory()
+    except ValueError:
+        # file exists but is blank or has garbage / half-written JSON
+        print(f"📂 {history_file} was empty or invalid JSON, re-initializing fresh history")
+        history = {}
 
-        # make sure keys exist
-        history.setdefault("unlocked", [])
-        history.setdefault("locked", [])
-        history.setdefault("last_announced", "")
+    # missing keys and duplicate titles are sorted out by ArcHistory
+    history = ArcHistory(history)
 
-        print(
-            f"📂 Loaded history from {history_file}: "
-            f"{len(history['unlocked'])} unlocked, "
-            f"{len(history['locked'])} locked, "
-            f"last_announced={history['last_announced']}"
-        )
-        return history
-
-    # no file at all -> brand new novel
-    print(f"📂 No history file found at {history_file}, starting fresh")
-    return {"unlocked": [], "locked": [], "last_announced": ""}
+    print(
+        f"📂 Loaded history from {history_file}: "
+        f"{len(history.unlocked)} unlocked, "
+        f"{len(history.locked)} locked, "
+        f"last_announced={history.last_announced}"
+    )
+    return history
 
 def load_state(path=STATE_PATH):
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except json.JSONDecodeError:
+        return read_json(path, {})
+    except ValueError:
         return {}
 
 def launch_announcement_done(novel_title: str) -> bool:
@@ -144,17 +135,53 @@ def launch_announcement_done(novel_title: str) -> bool:
 
 def save_history(history, history_file):
     """Saves the novel's arc history to JSON file with proper encoding."""
-    os.makedirs(os.path.dirname(history_file), exist_ok=True)
     print(
         f"📂 Saving history to {history_file} "
-        f"(unlocked={len(history['unlocked'])}, "
-        f"locked={len(history['locked'])}, "
-        f"last_announced={history['last_announced']})"
+        f"(unlocked={len(history.unlocked)}, "
+        f"locked={len(history.locked)}, "
+        f"last_announced={history.last_announced})"
     )
-    with open(history_file, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=4, ensure_ascii=False)
+    write_json_atomic(history_file, history.to_json(), indent=4)
     print(f"✅ Successfully updated history file: {history_file}")
 
+def load_scan_marks() -> dict:
+    """{novel_title: {"free": guid, "paid": guid, "last_full_scan": iso}}"""
+    try:
+        marks = read_json(SCAN_MARKS_PATH, {})
+    except ValueError:
+        return {}
+    return marks if isinstance(marks, dict) else {}
+
+def save_scan_marks(marks: dict, stored: dict) -> bool:
+    """Write the marks if they moved; True when the file changed."""
+    if marks == stored:
+        return False
+    write_json_atomic(SCAN_MARKS_PATH, marks, backup=False)
+    return True
+
+def full_rescan_due(marks) -> bool:
+    """True when this run should scan whole feeds instead of new entries only."""
+    if ARC_FULL_RESCAN or not marks:
+        return True
+    try:
+        last = datetime.fromisoformat(marks.get("last_full_scan") or "")
+    except ValueError:
+        return True
+    if last.tzinfo is None:
+        last = last.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - last >= timedelta(days=ARC_FULL_RESCAN_DAYS)
+
+def entry_guid(entry) -> str:
+    return entry.guid
+
+def newest_first(entries) -> bool:
+    """True when the feed lists its newest entry first (needed to stop early)."""
+    if len(entries) < 2:
+        return True
+    first = entries[0].published_parsed
+    last = entries[-1].published_parsed
+    return bool(first and last and first >= last)
+
 def commit_history_update(history_file):
     """Commit/push the updated arc history file via the shared Git helper."""
     return commit_state_update(history_file, f"Auto-update: {history_file}")
@@ -175,8 +202,7 @@ def format_stored_title(title):
 
 def extract_arc_number(title):
     """Extracts arc number from a title that begins with 【Arc N】."""
-    match = re.search(r"【Arc\s*(\d+)】", title)
-    return int(match.group(1)) if match else None
+    return arc_number(title)
 
 def deduplicate(lst):
     """Removes duplicates while preserving order."""
@@ -221,19 +247,12 @@ def strip_any_number_prefix(s: str) -> str:
 
 def next_arc_number(history):
     """Returns last announced arc number + 1, or 1 if none."""
-    last = history.get("last_announced", "")
-    n = extract_arc_number(last)
+    n = extract_arc_number(history.last_announced)
     if n:
         print(f"🔢 Last announced arc is {n}, so next will be {n+1}")
         return n + 1
-    # fallback: scan unlocked+locked
-    nums = []
-    for section in ("unlocked","locked"):
-        for title in history[section]:
-            m = extract_arc_number(title)
-            if m:
-                nums.append(m)
-    m = max(nums) if nums else 0
+    # fallback: highest number in unlocked+locked (cached by ArcHistory)
+    m = history.max_number
     print(f"🔢 No valid last_announced; max seen in history is {m}, so next will be {m+1}")
     return m + 1
 
@@ -261,14 +280,24 @@ def number_to_emoji(n: int) -> str:
 # ──────────────────────────────────────────────────────────────────────────────
 # === PROCESS NOVEL FUNCTION ===
 
-def process_arc(novel):
+def process_arc(novel, marks=None):
+    """Check one novel for new arcs and announce them.
+
+    ``marks`` is the novel's scan-marks record; it is updated in place and
+    only worth keeping when this returns True.
+
+    Returns False when the novel still needs another look on a later run
+    (deferred first arc or failed header send), True otherwise.
+    """
+    if marks is None:
+        marks = {}
     print(f"\n=== Processing novel: {novel['novel_title']} ===")
     history_changed = False  # track mutations even if we don't announce
 
     # 0. Fetch feeds for this novel
-    free_feed = feedparser.parse(novel["free_feed"])
-    paid_feed = feedparser.parse(novel["paid_feed"])
-    print(f"🌐 Fetched feeds: {len(free_feed.entries)} free entries, {len(paid_feed.entries)} paid entries")
+    free_entries = feed_entries(novel["free_feed"])
+    paid_entries = feed_entries(novel["paid_feed"])
+    print(f"🌐 Fetched feeds: {len(free_entries)} free entries, {len(paid_entries)} paid entries")
 
     # 1. NSFW check
     is_nsfw = (
@@ -284,14 +313,14 @@ def process_arc(novel):
     history_file = novel.get("history_file")
     if not history_file:
         print(f"⚠️ No history_file configured for '{novel['novel_title']}', skipping arcs.")
-        return
+        return True
 
     # 2. Load history
     history = load_history(history_file)
 
     # snapshot BEFORE we mutate history so we know if this is truly first-ever arc
-    had_any_locked_before    = bool(history["locked"])
-    had_any_unlocked_before  = bool(history["unlocked"])
+    had_any_locked_before    = history.newest_locked is not None
+    had_any_unlocked_before  = bool(history.unlocked)
 
     # Helper: does string look like a "new arc start" marker
     # Helper: does this entry look like the FIRST chapter of a new arc/world?
@@ -336,13 +365,23 @@ def process_arc(novel):
     
         return False
 
-    def extract_new_bases(feed, current_title):
+    def extract_new_bases(entries, current_title, stop_at=""):
+        """Arc-start bases in entries newer than stop_at, plus the new mark."""
+        if stop_at and not newest_first(entries):
+            stop_at = ""
+
         bases = []
-        for e in feed.entries:
+        newest = ""
+        for e in entries:
+            guid = entry_guid(e)
+            if stop_at and guid == stop_at:
+                break
+
             # only consider entries that actually belong to THIS novel
             entry_title = (e.get("title") or "").strip()
             if entry_title != current_title:
                 continue
+            newest = newest or guid
 
             raw_vol    = (e.get("volume", "") or "").replace("\u00A0", " ").strip()
             raw_extend = (e.get("chaptername", "") or "").replace("\u00A0", " ").strip()
@@ -381,64 +420,56 @@ def process_arc(novel):
 
             bases.append(base)
 
-        return bases
+        return bases, newest or stop_at
 
-    
-    free_new = extract_new_bases(free_feed, novel["novel_title"])
-    paid_new = extract_new_bases(paid_feed, novel["novel_title"])
+    full_scan = full_rescan_due(marks)
+    stop_at = {} if full_scan else marks
+    if full_scan:
+        print("🔁 Full rescan of both feeds for this novel.")
+
+    free_new, free_mark = extract_new_bases(free_entries, novel["novel_title"], stop_at.get("free", ""))
+    paid_new, paid_mark = extract_new_bases(paid_entries, novel["novel_title"], stop_at.get("paid", ""))
     print(f"🔍 Detected {len(free_new)} new free arcs, {len(paid_new)} new paid arcs")
 
+    # Move the high-water marks. The caller keeps them only when this novel
+    # is done, so a run that defers or fails rescans the same entries.
+    marks["free"], marks["paid"] = free_mark, paid_mark
+    if full_scan:
+        marks["last_full_scan"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
     # 3. Update history with free-start arcs / paid-start arcs
     free_created_new_arc = False
     paid_created_new_arc = False
 
     # --- 3A. Handle free arcs
     for base in free_new:
-        matched_locked = False
-
         # Case: arc was previously locked, now unlocked
-        for full in history["locked"][:]:
-            if full.endswith(base):
-                matched_locked = True
-                history["locked"].remove(full)
-                if full not in history["unlocked"]:
-                    history["unlocked"].append(full)
-                    history_changed = True
-                    print(f"🔓 Unlocked arc: {full}")
-                break
+        full = history.find_locked(base)
+        if full is not None:
+            if history.unlock(full):
+                history_changed = True
+                print(f"🔓 Unlocked arc: {full}")
 
         # Case: completely new arc that STARTED free (never in locked)
-        if not matched_locked:
-            seen_bases = [
-                re.sub(r"^【Arc\s*\d+】\s*", "", t).strip()
-                for t in (history["unlocked"] + history["locked"])
-            ]
-            if base not in seen_bases:
-                n = next_arc_number(history)
-                full = f"【Arc {n}】 {base.strip()}"
-                history["unlocked"].append(full)
-                free_created_new_arc = True
-                history_changed = True
-                print(f"🌿 Registered brand-new free arc: {full}")
+        elif not history.has_base(base):
+            n = next_arc_number(history)
+            full = f"【Arc {n}】 {base.strip()}"
+            history.add_unlocked(full)
+            free_created_new_arc = True
+            history_changed = True
+            print(f"🌿 Registered brand-new free arc: {full}")
 
     # --- 3B. Handle paid arcs
-    seen_bases_after_free = [
-        re.sub(r"^【Arc\s*\d+】\s*", "", f).strip()
-        for f in (history["unlocked"] + history["locked"])
-    ]
+    # (ArcHistory keeps both lists free of duplicates as they change)
     for base in paid_new:
-        if base not in seen_bases_after_free:
+        if not history.has_base(base):
             n = next_arc_number(history)
             full = f"【Arc {n}】 {base.strip()}"
-            history["locked"].append(full)
+            history.add_locked(full)
             paid_created_new_arc = True
             history_changed = True
             print(f"🔐 New locked arc: {full}")
 
-    # 4. Deduplicate lists
-    history["unlocked"] = deduplicate(history["unlocked"])
-    history["locked"]   = deduplicate(history["locked"])
-
     # --- NEW: unified first-run bootstrap guard ---
     # If history was empty before this run, don't announce anything even if both
     # free and paid created entries. Just save numbering and exit.
@@ -455,29 +486,29 @@ def process_arc(novel):
             f"⏳ First arc detected for {novel['novel_title']}, "
             "but launch_free is not recorded yet. Deferring arc announcement."
         )
-        return
+        return False
 
     if first_run and (free_created_new_arc or paid_created_new_arc) and not ANNOUNCE_FIRST_ARC_RELEASE:
-        if history["locked"]:
-            history["last_announced"] = history["locked"][-1]
-            print(f"🌱 Bootstrap: marking last_announced = {history['last_announced']}")
+        if history.newest_locked:
+            history.last_announced = history.newest_locked
+            print(f"🌱 Bootstrap: marking last_announced = {history.last_announced}")
         else:
             print("🌱 Bootstrap: no locked arcs yet; saving numbering only.")
         save_history(history, novel["history_file"])
         commit_history_update(novel["history_file"])
-        return
+        return True
 
     scenario_first_arc_free_only = (
         free_created_new_arc
         and not paid_created_new_arc
-        and not history["locked"]
+        and not history.newest_locked
     )
 
     if scenario_first_arc_free_only and not is_first_arc_release_announcement:
         print("🌱 First arc started free. Saving numbering to history, no Discord ping.")
         save_history(history, novel["history_file"])
         commit_history_update(novel["history_file"])
-        return
+        return True
 
     scenario_first_arc_paid_only = (
         paid_created_new_arc
@@ -490,25 +521,25 @@ def process_arc(novel):
         print("💸 First arc started paid-only. Saving numbering to history, no Discord ping.")
         save_history(history, novel["history_file"])
         commit_history_update(novel["history_file"])
-        return
+        return True
 
-    if not history["locked"] and not is_first_arc_release_announcement:
+    if not history.newest_locked and not is_first_arc_release_announcement:
         if history_changed:
             save_history(history, novel["history_file"])
             commit_history_update(novel["history_file"])
         print("ℹ️ No locked arcs exist. Nothing to announce.")
-        return
+        return True
 
     if is_first_arc_release_announcement:
-        all_arcs = history["unlocked"] + history["locked"]
+        all_arcs = history.unlocked + history.locked
         new_full = next(
             (t for t in all_arcs if extract_arc_number(t) == 1),
             all_arcs[0],
         )
     else:
-        new_full = history["locked"][-1]
+        new_full = history.newest_locked
 
-    last_announced = history.get("last_announced", "")
+    last_announced = history.last_announced
 
     is_first_arc_release_announcement = (
         ANNOUNCE_FIRST_ARC_RELEASE
@@ -522,15 +553,15 @@ def process_arc(novel):
             save_history(history, novel["history_file"])
             commit_history_update(novel["history_file"])
         print(f"✅ Already announced latest locked arc: {new_full}")
-        return
+        return True
 
     # 6. Build display strings with UPDATED history
     world_number = extract_arc_number(new_full)
     world_emoji  = number_to_emoji(world_number) if world_number is not None else ""
 
     # Build pretty text lists for unlocked / locked arcs
-    unlocked_list = history["unlocked"]
-    locked_list   = history["locked"]
+    unlocked_list = history.unlocked
+    locked_list   = history.locked
 
     has_unlocked = bool(unlocked_list)
 
@@ -568,6 +599,7 @@ def process_arc(novel):
 
     for idx, message_payload in enumerate(arc_messages):
         message_name = message_payload.get("name") or f"message {idx + 1}"
+        message_payload["nonce"] = message_nonce(CHANNEL_ID, novel["novel_title"], new_full, idx)
 
         try:
             send_bot_payload(BOT_TOKEN, CHANNEL_ID, message_payload)
@@ -582,7 +614,7 @@ def process_arc(novel):
 
     # 9. Mark it announced, save, commit.
     if header_ok:
-        history["last_announced"] = new_full
+        history.last_announced = new_full
         save_history(history, novel["history_file"])
         commit_history_update(novel["history_file"])
         print(f"📌 Finished announcing and recorded last_announced = {new_full}")
@@ -593,10 +625,13 @@ def process_arc(novel):
             commit_history_update(novel["history_file"])
             print("📌 Saved history changes despite header failure (last_announced untouched).")
         print("⚠️ Did not update last_announced because header send failed.")
+        return False
 
+    return True
 
-# === LOAD & RUN ===
-if __name__ == "__main__":
+
+def load_novels():
+    novels = []
     for host, host_data in HOSTING_SITE_DATA.items():
         novels_dict = host_data.get("novels", {})
         for title, d in reversed(list(novels_dict.items())):
@@ -618,4 +653,49 @@ if __name__ == "__main__":
                 "discord_role_url": get_novel_role_url(short_code),
                 "history_file":     d.get("history_file", "")
             }
-            process_arc(novel)
+            novels.append(novel)
+    return novels
+
+
+def main():
+    OUTBOX.drain(BOT_TOKEN)
+    try:
+        _run()
+    finally:
+        if OUTBOX.settle(BOT_TOKEN):
+            commit_state_update(str(OUTBOX.path.parent))
+
+
+def _run() -> None:
+    novels = load_novels()
+    feed_urls = [url for novel in novels for url in (novel["free_feed"], novel["paid_feed"])]
+    fingerprint = inputs_fingerprint([novels, ANNOUNCE_FIRST_ARC_RELEASE])
+
+    if feeds_unchanged(feed_urls, scope=FEED_SCOPE, fingerprint=fingerprint):
+        print("🛑 Arc feeds unchanged since the last run; nothing to check.")
+        return
+
+    # Marks of novels no longer in the mappings are dropped.
+    stored_marks = load_scan_marks()
+    scan_marks = {}
+    all_done = True
+    for novel in novels:
+        title = novel["novel_title"]
+        marks = dict(stored_marks.get(title) or {})
+        if process_arc(novel, marks):
+            scan_marks[title] = marks
+        else:
+            all_done = False
+            if title in stored_marks:
+                scan_marks[title] = stored_marks[title]
+
+    if save_scan_marks(scan_marks, stored_marks):
+        commit_state_update(str(SCAN_MARKS_PATH))
+    if all_done and save_validators(FEED_SCOPE):
+        commit_state_update(str(validators_path(FEED_SCOPE)))
+
+
+# === LOAD & RUN ===
+if __name__ == "__main__":
+    start_run("new_arc_checker")
+    main()
@@ -1,11 +1,14 @@
 import os
-import json
 import re
 import requests
-import feedparser
 import sys
 from message_renderer import render_message, to_discord_api_payload
+from guid_state import message_nonce
+from feed_cache import feed_entries, feeds_unchanged, inputs_fingerprint, save_validators, validators_path
+from outbox import Outbox
 from git_state_commit import commit_state_update
+from atomic_json import read_json, write_json_atomic
+from run_metrics import start_run
 from novel_mappings import HOSTING_SITE_DATA, get_nsfw_novels
 
 # ─── CONFIG ────────────────────────────────────────────────────────────────────
@@ -18,6 +21,8 @@ from config_loader import (
 )
 
 STATE_PATH = require_file_value("state_path")
+FEED_SCOPE = "new_extra_checker"
+OUTBOX = Outbox(FEED_SCOPE)
 
 ONGOING_ROLE = role_id_to_mention(require_role_value("ongoing"))
 NSFW_ROLE    = role_id_to_mention(require_role_value("nsfw"))
@@ -46,21 +51,7 @@ def join_role_mentions(*parts):
     return " | ".join(out)
 
 def send_bot_payload(bot_token: str, channel_id: str, message_payload: dict):
-    url = f"https://discord.com/api/v10/channels/{channel_id}/messages"
-    headers = {
-        "Authorization": f"Bot {bot_token}",
-        "Content-Type":  "application/json",
-    }
-
-    payload = to_discord_api_payload(message_payload)
-
-    r = requests.post(url, headers=headers, json=payload, timeout=20)
-
-    if not r.ok:
-        print(f"⚠️ Bot error {r.status_code}: {r.text}")
-
-    r.raise_for_status()
-    return r
+    return OUTBOX.post(bot_token, channel_id, to_discord_api_payload(message_payload))
 
 
 def safe_send_bot_payload(bot_token: str, channel_id: str, message_payload: dict) -> bool:
@@ -70,24 +61,19 @@ def safe_send_bot_payload(bot_token: str, channel_id: str, message_payload: dict
         return True
 
     except requests.RequestException as e:
-        status = e.response.status_code if e.response else "?"
-        body   = e.response.text if e.response else ""
+        status = e.response.status_code if e.response is not None else "?"
+        body   = e.response.text if e.response is not None else ""
         print(f"⚠️ Failed to send via bot ({status}):\n{body or e}", file=sys.stderr)
         return False
         
 
 def load_state(path=STATE_PATH):
-    try:
-        with open(path, encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    return read_json(path, {})
 
 def save_state(state, path=STATE_PATH):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
+    write_json_atomic(path, state)
 
-def find_released_extras(paid_feed, raw_kw):
+def find_released_extras(entries, raw_kw):
     """Return released bonus indices for extra / side-story labels.
 
     Supports numbered labels such as ``Extra 2`` and safe unnumbered labels
@@ -109,7 +95,7 @@ def find_released_extras(paid_feed, raw_kw):
     )
 
     seen = set()
-    for e in paid_feed.entries:
+    for e in entries:
         values = [
             e.get(field, "") or ""
             for field in ("chapter", "chaptername", "volume")
@@ -130,26 +116,30 @@ def find_released_extras(paid_feed, raw_kw):
     return seen
 
 def process_extras(novel):
-    # 1) parse the paid feed up‐front
-    paid_feed = feedparser.parse(novel["paid_feed"])
+    """Announce newly dropped extras/side stories for one novel.
+
+    Returns False when a send failed and the novel must be checked again.
+    """
+    # 1) parse the paid feed up‐front (shared with the other checkers in this run)
+    paid_entries = feed_entries(novel["paid_feed"])
 
-    # 🔒 TITLE GUARD — keep only entries that belong to THIS novel
+    # 🔒 TITLE GUARD — keep only entries that belong to THIS novel.
+    # Filter into a local list; the cached feed object is shared.
     novel_title = novel["novel_title"].strip()
-    filtered = []
-    for e in paid_feed.entries:
+    entries = []
+    for e in paid_entries:
         entry_title = (e.get("title") or "").strip()
         if entry_title and entry_title == novel_title:
-            filtered.append(e)
+            entries.append(e)
 
-    paid_feed.entries = filtered
-    print(f"🔐 Title-guarded extras feed for {novel_title}: {len(filtered)} entries kept")
+    print(f"🔐 Title-guarded extras feed for {novel_title}: {len(entries)} entries kept")
 
     last_chap = novel.get("last_chapter", "")
-    for e in paid_feed.entries:
+    for e in entries:
         chap = (e.get("chapter") or "") + (e.get("chaptername") or "")
         if last_chap and last_chap in chap:
             print(f"→ skipping extras for {novel['novel_id']} — full series complete on feed")
-            return
+            return True
 
     # 2) now load state and guard against completion in state.json
     state    = load_state()
@@ -164,10 +154,9 @@ def process_extras(novel):
         )
     ):
         print(f"→ skipping extras for {novel_id} — already completed (state.json)")
-        return
+        return True
 
     # 3) NSFW check
-    entries = paid_feed.entries
     is_nsfw = (
         novel["novel_title"] in get_nsfw_novels()
     )
@@ -179,15 +168,15 @@ def process_extras(novel):
     )
 
     # 4) see what’s actually dropped in the feed
-    dropped_extras = find_released_extras(paid_feed, "extra")
-    dropped_ss     = find_released_extras(paid_feed, "side story")
+    dropped_extras = find_released_extras(entries, "extra")
+    dropped_ss     = find_released_extras(entries, "side story")
     max_ex = max(dropped_extras) if dropped_extras else 0
     max_ss = max(dropped_ss)     if dropped_ss     else 0
 
     # 5) only announce when something new appears
     # 🔒 cap to one announcement ever
     if meta.get("extra_announced"):
-        return
+        return True
     last = state.get(novel_id, {}).get("last_extra_announced", 0)
     current = max(max_ex, max_ss)
     if current > last:
@@ -266,13 +255,14 @@ def process_extras(novel):
         }
 
         message_payload = render_message("new_extras", ctx)
+        message_payload["nonce"] = message_nonce(CHANNEL_ID, novel_title, "extras", current)
 
         bot_token  = BOT_TOKEN
         channel_id = CHANNEL_ID
 
         if not (bot_token and channel_id):
             print("⚠️ Bot token or channel ID missing; skipped bot post")
-            return
+            return False
 
         ok = safe_send_bot_payload(bot_token, channel_id, message_payload)
 
@@ -286,8 +276,12 @@ def process_extras(novel):
             commit_state_update(STATE_PATH)
         else:
             print("→ Send failed; not updating state.json")
+            return False
 
-if __name__ == "__main__":
+    return True
+
+
+def load_novels():
     novels = []
     for host, host_data in HOSTING_SITE_DATA.items():
         for title, d in host_data.get("novels", {}).items():
@@ -307,5 +301,35 @@ if __name__ == "__main__":
                 "novel_link":    d.get("novel_url",""),
                 "role_mention":  get_series_role_from_short_code(short_code),
             })
+    return novels
+
+
+def main():
+    OUTBOX.drain(BOT_TOKEN)
+    try:
+        _run()
+    finally:
+        if OUTBOX.settle(BOT_TOKEN):
+            commit_state_update(str(OUTBOX.path.parent))
+
+
+def _run() -> None:
+    novels = load_novels()
+    fingerprint = inputs_fingerprint(novels)
+
+    if feeds_unchanged([n["paid_feed"] for n in novels], scope=FEED_SCOPE, fingerprint=fingerprint):
+        print("🛑 Paid feeds unchanged since the last run; nothing to check.")
+        return
+
+    all_done = True
     for novel in reversed(novels):
-        process_extras(novel)
+        if not process_extras(novel):
+            all_done = False
+
+    if all_done and save_validators(FEED_SCOPE):
+        commit_state_update(str(validators_path(FEED_SCOPE)))
+
+
+if __name__ == "__main__":
+    start_run("new_extra_checker")
+    main()
@@ -24,17 +24,20 @@ Env vars required:
 """
 
 import argparse
-import json
 import os
 import sys
 import re
 import html
-import feedparser
 import requests
 from datetime import datetime, timezone
 
 from message_renderer import render_message, to_discord_api_payload
+from guid_state import entry_nonce
+from feed_cache import feeds_unchanged, fetch_feed, inputs_fingerprint, save_validators, validators_path
+from outbox import Outbox
 from git_state_commit import commit_state_update
+from atomic_json import read_json, write_json_atomic
+from run_metrics import start_run
 
 from novel_mappings import (
     HOSTING_SITE_DATA,
@@ -54,6 +57,8 @@ from config_loader import (
 )
 
 STATE_PATH = require_file_value("state_path")
+FEED_SCOPE = "new_novel_checker"
+OUTBOX = Outbox(FEED_SCOPE)
 BOT_TOKEN  = os.environ["DISCORD_BOT_TOKEN"]
 CHANNEL_ID = server_channel_id_str("announcements")
 
@@ -74,17 +79,12 @@ def get_entry_translator_url(entry) -> str:
 
 def load_state(path=STATE_PATH):
     """Load state.json so we know what we've already announced."""
-    try:
-        with open(path, encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
+    return read_json(path, {})
 
 
 def save_state(state, path=STATE_PATH):
     """Persist state.json back to disk."""
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
+    write_json_atomic(path, state)
 
 
 def parsed_time_to_aware(struct_t, fallback_now):
@@ -113,17 +113,7 @@ def send_bot_payload(bot_token: str, channel_id: str, message_payload: dict):
     """
     Send rendered TOML payload to Discord via raw API.
     """
-    url = f"https://discord.com/api/v10/channels/{channel_id}/messages"
-    headers = {
-        "Authorization": f"Bot {bot_token}",
-        "Content-Type":  "application/json",
-    }
-
-    payload = to_discord_api_payload(message_payload)
-
-    r = requests.post(url, headers=headers, json=payload, timeout=20)
-    r.raise_for_status()
-    return r
+    return OUTBOX.post(bot_token, channel_id, to_discord_api_payload(message_payload))
 
 
 def safe_send_bot_payload(bot_token: str, channel_id: str, message_payload: dict) -> bool:
@@ -134,8 +124,8 @@ def safe_send_bot_payload(bot_token: str, channel_id: str, message_payload: dict
         send_bot_payload(bot_token, channel_id, message_payload)
         return True
     except requests.RequestException as e:
-        status = e.response.status_code if e.response else "?"
-        body   = e.response.text if e.response else ""
+        status = e.response.status_code if e.response is not None else "?"
+        body   = e.response.text if e.response is not None else str(e)
         print(f"⚠️ Bot send failed ({status}):\n{body}", file=sys.stderr)
         return False
 
@@ -317,7 +307,7 @@ def load_novels_from_mapping():
     return novels
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--feed",
@@ -325,15 +315,31 @@ def main():
         required=True,
         help="We only announce once free/public chapters are available."
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     bot_token  = BOT_TOKEN
     channel_id = CHANNEL_ID
     if not (bot_token and channel_id):
         sys.exit("❌ Missing DISCORD_BOT_TOKEN or config/server.json announcements channel")
 
-    state  = load_state()
+    OUTBOX.drain(bot_token)
+    try:
+        _run(bot_token, channel_id)
+    finally:
+        if OUTBOX.settle(bot_token):
+            commit_state_update(str(OUTBOX.path.parent))
+
+
+def _run(bot_token: str, channel_id: str) -> None:
     novels = load_novels_from_mapping()
+    fingerprint = inputs_fingerprint(novels)
+
+    if feeds_unchanged([n["free_feed"] for n in novels], scope=FEED_SCOPE, fingerprint=fingerprint):
+        print("🛑 Free feeds unchanged since the last run; nothing to check.")
+        return
+
+    state  = load_state()
+    all_done = True
 
     # current local time (aware) for fallback + footer diff
     now_local = datetime.now(timezone.utc).astimezone()
@@ -352,15 +358,15 @@ def main():
             continue  # shouldn't happen because we filtered
 
         print(f"Fetching free feed for {novel_title} from {feed_url}")
-        resp = requests.get(feed_url)
-        feed = feedparser.parse(resp.text)
+        cached = fetch_feed(feed_url)
+        entries = cached.entries
         print(
-            f"Parsed {len(feed.entries)} entries "
-            f"(Content-Type: {resp.headers.get('Content-Type')})"
+            f"Parsed {len(entries)} entries "
+            f"(Content-Type: {cached.content_type})"
         )
 
         # scan feed entries for "first chapter" of THIS novel
-        for entry in feed.entries:
+        for entry in entries:
             entry_title = (entry.get("title") or "").strip()
 
             # Make sure this entry is actually for THIS novel.
@@ -428,6 +434,7 @@ def main():
             }
 
             message_payload = render_message("new_novels", ctx)
+            message_payload["nonce"] = entry_nonce(channel_id, entry)
 
             print(
                 f"→ Built launch message for {novel_title} "
@@ -450,11 +457,16 @@ def main():
                 save_state(state)
                 commit_state_update(STATE_PATH)
             else:
+                all_done = False
                 print("→ Send failed; not updating state.json")
 
             # we only announce once per novel, so break after first match
             break
 
+    if all_done and save_validators(FEED_SCOPE):
+        commit_state_update(str(validators_path(FEED_SCOPE)))
+
 
 if __name__ == "__main__":
+    start_run("new_novel_checker")
     main()
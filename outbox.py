@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""Durable queue for Discord messages that could not be delivered yet.
+
+The senders already retry 429s, 5xx and network errors a few times within
+seconds. When Discord or the network stays down longer than that, a chapter
+bot used to leave the entry unseen for the next workflow trigger, hours
+later. A checker logged "send failed" and moved on.
+
+Now such a message goes into the sender's outbox instead: outbox/<scope>.json
+holds the rendered API payload, its channel, the attempt count and the time
+of the next attempt. The sender treats a queued message as handed over, so
+state moves on exactly as after a successful send. Only errors that cannot
+succeed on retry (other 4xx) still count as failures.
+
+Each run drains its outbox before sending anything new, and keeps retrying
+with exponential backoff for up to OUTBOX_DRAIN_WAIT seconds at the end.
+Whatever is still queued is committed with the state and drained by the
+next run, or by the next pass in the daemon. While a channel has queued
+messages, new ones for it join the queue, so announcements keep their order.
+Attachments (completion banners) are stored next to the queue until sent.
+
+Drains always go over REST with post_message, whatever delivery mode queued
+the message.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import requests
+
+from atomic_json import read_json, write_json_atomic
+from config_loader import file_value, positive_float_env, repo_path
+from discord_delivery import RETRY_STATUSES, post_message
+from message_renderer import to_discord_api_payload
+from run_metrics import count
+
+
+OUTBOX_DIR = str(file_value("outbox_dir", "outbox") or "outbox")
+OUTBOX_RETRY_DELAY = positive_float_env("OUTBOX_RETRY_DELAY", 15)
+OUTBOX_RETRY_MAX_DELAY = positive_float_env("OUTBOX_RETRY_MAX_DELAY", 3600)
+OUTBOX_MAX_ATTEMPTS = int(positive_float_env("OUTBOX_MAX_ATTEMPTS", 30))
+OUTBOX_DRAIN_WAIT = positive_float_env("OUTBOX_DRAIN_WAIT", 120)
+
+
+def transient_status(status: int | None) -> bool:
+    """True for failures worth queueing: no response (0), 429 or 5xx."""
+    return status is not None and (status == 0 or status in RETRY_STATUSES)
+
+
+def error_status(exc: BaseException) -> int:
+    """HTTP status behind a send error; 0 when there was no response."""
+    response = getattr(exc, "response", None)
+    if response is not None and getattr(response, "status_code", None):
+        return int(response.status_code)
+    status = getattr(exc, "status", None)  # discord.HTTPException, aiohttp errors
+    return int(status) if isinstance(status, int) else 0
+
+
+class Outbox:
+    """Queued messages of one sender (scope), persisted in outbox/<scope>.json."""
+
+    def __init__(self, scope: str) -> None:
+        self.scope = scope
+        self.path = repo_path(Path(OUTBOX_DIR) / f"{scope}.json")
+        self.files_dir = self.path.parent / "files"
+        self._lock = threading.Lock()  # guards items; never held while sending
+        self._drain_lock = threading.Lock()  # one drain at a time
+        self._items: list[dict[str, Any]] | None = None
+        self.changed = False  # written since the owner last committed it
+
+    # ── storage ──────────────────────────────────────────────────────────────
+
+    @property
+    def items(self) -> list[dict[str, Any]]:
+        if self._items is None:
+            try:
+                items = read_json(self.path, [])
+            except ValueError:
+                items = []
+            self._items = [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+        return self._items
+
+    def _save(self) -> None:
+        # An empty queue is written as [] rather than deleted, like the
+        # state journals, so a drained outbox shows up as a plain change.
+        write_json_atomic(self.path, self.items, backup=False)
+        self.changed = True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.items)
+
+    def has_pending(self, channel_id: int | str) -> bool:
+        with self._lock:
+            return any(item["channel_id"] == str(channel_id) for item in self.items)
+
+    # ── queueing ─────────────────────────────────────────────────────────────
+
+    def enqueue(
+        self,
+        channel_id: int | str,
+        payload: dict[str, Any],
+        *,
+        files: dict[str, tuple] | None = None,
+        error: str = "",
+    ) -> None:
+        """Queue one API-shaped payload (as given to post_message)."""
+        item_id = uuid.uuid4().hex
+        stored_files = []
+        for field, (filename, data, content_type) in (files or {}).items():
+            path = self.files_dir / f"{item_id}-{len(stored_files)}{Path(filename).suffix}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            stored_files.append({
+                "field": field,
+                "filename": filename,
+                "content_type": content_type,
+                "path": path.relative_to(self.path.parent).as_posix(),
+            })
+
+        now = time.time()
+        with self._lock:
+            self.items.append({
+                "id": item_id,
+                "channel_id": str(channel_id),
+                "payload": payload,
+                "files": stored_files,
+                "attempts": 0,
+                "next_attempt": now + OUTBOX_RETRY_DELAY,
+                "queued_at": now,
+                "last_error": error,
+            })
+            self._save()
+        count("outbox_queued")
+        print(f"📮 Queued message for channel {channel_id} in {self.path.name} ({error or 'queued'})")
+
+    def _load_files(self, item: dict[str, Any]) -> dict[str, tuple] | None:
+        files = {}
+        for stored in item.get("files") or []:
+            try:
+                data = (self.path.parent / stored["path"]).read_bytes()
+            except FileNotFoundError:
+                print(f"⚠️ Queued attachment {stored['path']} is missing; sending without it.")
+                continue
+            files[stored["field"]] = (stored["filename"], data, stored["content_type"])
+        return files or None
+
+    def _remove(self, item: dict[str, Any]) -> None:
+        self.items.remove(item)
+        for stored in item.get("files") or []:
+            (self.path.parent / stored["path"]).unlink(missing_ok=True)
+
+    # ── draining ─────────────────────────────────────────────────────────────
+
+    def drain(self, token: str) -> int:
+        """Send every queued message that is due; return how many are left.
+
+        Messages go out in queue order. After a failure, later messages for
+        the same channel wait for the next drain so they stay in order. The
+        queue lock is only held between sends, so enqueue and has_pending
+        never wait on Discord.
+        """
+        with self._drain_lock:
+            with self._lock:
+                queued = list(self.items)
+            if not queued:
+                return 0
+
+            now = time.time()
+            blocked: set[str] = set()
+            changed = False
+            for item in queued:
+                channel = item["channel_id"]
+                if channel in blocked:
+                    continue
+                if item.get("next_attempt", 0) > now:
+                    blocked.add(channel)
+                    continue
+
+                try:
+                    post_message(token, channel, item["payload"], files=self._load_files(item))
+                except requests.RequestException as exc:
+                    status = error_status(exc)
+                    changed = True
+                    with self._lock:
+                        item["attempts"] = int(item.get("attempts", 0)) + 1
+                        item["last_error"] = f"HTTP {status}" if status else str(exc)
+                        if not transient_status(status) or item["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                            print(
+                                f"❌ Dropping queued message for channel {channel} after "
+                                f"{item['attempts']} attempt(s): {item['last_error']}"
+                            )
+                            self._remove(item)
+                            continue
+                        delay = min(OUTBOX_RETRY_MAX_DELAY, OUTBOX_RETRY_DELAY * 2 ** (item["attempts"] - 1))
+                        item["next_attempt"] = time.time() + delay
+                    blocked.add(channel)
+                    print(f"⏳ Queued message for channel {channel} failed ({item['last_error']}); next try in {delay:.0f}s")
+                    continue
+
+                print(f"📬 Delivered queued message for channel {channel} from {self.path.name}")
+                count("outbox_delivered")
+                changed = True
+                with self._lock:
+                    self._remove(item)
+
+            with self._lock:
+                if changed:
+                    self._save()
+                return len(self.items)
+
+    def next_due_in(self) -> float | None:
+        """Seconds until the first message of some channel is due."""
+        with self._lock:
+            heads: dict[str, float] = {}
+            for item in self.items:
+                heads.setdefault(item["channel_id"], item.get("next_attempt", 0))
+            if not heads:
+                return None
+            return max(0.0, min(heads.values()) - time.time())
+
+    def drain_until_empty(self, token: str, wait: float = OUTBOX_DRAIN_WAIT) -> int:
+        """Keep draining with backoff for up to wait seconds; return how many are left."""
+        deadline = time.monotonic() + wait
+        left = self.drain(token)
+        while left:
+            due_in = self.next_due_in() or 0.0
+            if time.monotonic() + due_in > deadline:
+                break
+            time.sleep(due_in)
+            left = self.drain(token)
+        if left:
+            print(f"📮 {left} message(s) stay queued in {self.path.name} for the next run.")
+        return left
+
+    def settle(self, token: str) -> bool:
+        """End-of-run drain; True if the queue file changed and needs committing."""
+        if len(self):
+            self.drain_until_empty(token)
+        changed, self.changed = self.changed, False
+        return changed
+
+    # ── sending through the queue ────────────────────────────────────────────
+
+    def post(
+        self,
+        token: str,
+        channel_id: int | str,
+        payload: dict[str, Any],
+        *,
+        files: dict[str, tuple] | None = None,
+    ) -> requests.Response | None:
+        """post_message, queueing on transient failure; None when queued.
+
+        Raises like post_message for errors a retry cannot fix.
+        """
+        if self.has_pending(channel_id):
+            self.enqueue(channel_id, payload, files=files, error="behind earlier queued messages")
+            return None
+        try:
+            return post_message(token, channel_id, payload, files=files)
+        except requests.RequestException as exc:
+            status = error_status(exc)
+            if not transient_status(status):
+                raise
+            self.enqueue(channel_id, payload, files=files, error=f"HTTP {status}" if status else str(exc))
+            return None
+
+    def wrap(
+        self,
+        channel_id: int | str,
+        send: Callable[[dict[str, Any]], Awaitable[bool]],
+    ) -> Callable[[dict[str, Any]], Awaitable[bool]]:
+        """Wrap a bot's async send so transient failures are queued (and count as sent)."""
+
+        async def queued_send(payload: dict[str, Any]) -> bool:
+            if await asyncio.to_thread(self.has_pending, channel_id):
+                await asyncio.to_thread(
+                    self.enqueue, channel_id, to_discord_api_payload(payload),
+                    error="behind earlier queued messages",
+                )
+                return True
+            try:
+                if await send(payload):
+                    return True
+                status = getattr(send, "last_status", None)
+                error = f"HTTP {status}" if status else "network error"
+            except Exception as exc:
+                status = error_status(exc)
+                if not status and not isinstance(exc, (OSError, asyncio.TimeoutError)):
+                    raise  # not a delivery problem
+                if not transient_status(status):
+                    raise
+                error = f"HTTP {status}" if status else repr(exc)
+            if not transient_status(status):
+                return False
+            await asyncio.to_thread(self.enqueue, channel_id, to_discord_api_payload(payload), error=error)
+            return True
+
+        return queued_send
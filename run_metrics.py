@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Per-stage timings and counters for one run, written out as a report.
+
+The scripts only printed emoji progress lines, so a slow run gave no hint
+whether the time went to fetching feeds, parsing, rendering, Discord or the
+git push retries. The shared modules now wrap those stages in ``span(...)``
+and bump ``count(...)`` counters; both cost a lock and a dict update.
+
+An entry point calls ``start_run(name)`` once. At exit (also after an
+exception or a SIGTERM turned into SystemExit by git_state_commit) the totals
+go to run_reports/<name>.json, and also to
+<PROMETHEUS_TEXTFILE_DIR>/discord_webhook_<name>.prom when that variable is
+set, for node_exporter's textfile collector. The daemon writes the report
+after every pass, with totals since it started.
+
+Stages: feed_fetch, feed_parse, render, discord_send, discord_login,
+git_commit, git_push, plus checker.<name> / bot.<module> in the runner and
+the daemon. Overlapping spans on different threads are each counted in full.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+from atomic_json import write_json_atomic, write_text_atomic
+from config_loader import file_value, repo_path
+
+_FALSEY = {"0", "false", "no", "n", "off"}
+
+RUN_REPORT_DIR = str(file_value("run_report_dir", "run_reports") or "run_reports")
+PROMETHEUS_TEXTFILE_DIR = str(os.getenv("PROMETHEUS_TEXTFILE_DIR", "") or "").strip()
+METRIC_PREFIX = "discord_webhook"
+
+_LOCK = threading.Lock()
+_SPANS: dict[str, dict[str, float]] = {}
+_COUNTERS: dict[str, float] = {}
+_RUN: dict[str, Any] = {}
+
+
+def reports_enabled() -> bool:
+    return str(os.getenv("RUN_REPORT", "1")).strip().lower() not in _FALSEY
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Add one timed occurrence of a stage."""
+    with _LOCK:
+        stats = _SPANS.get(name)
+        if stats is None:
+            stats = _SPANS[name] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+        stats["count"] += 1
+        stats["seconds"] += seconds
+        if seconds > stats["max_seconds"]:
+            stats["max_seconds"] = seconds
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the block as one occurrence of stage name (wall time, awaits included)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def count(name: str, amount: float = 1) -> None:
+    if not amount:
+        return
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + amount
+
+
+def snapshot() -> dict[str, Any]:
+    """The report as it would be written now."""
+    now = time.time()
+    with _LOCK:
+        spans = {
+            name: {
+                "count": int(stats["count"]),
+                "seconds": round(stats["seconds"], 4),
+                "max_seconds": round(stats["max_seconds"], 4),
+            }
+            for name, stats in sorted(_SPANS.items())
+        }
+        counters = {name: (round(value, 4) if isinstance(value, float) else value)
+                    for name, value in sorted(_COUNTERS.items())}
+    started = _RUN.get("started", now)
+    return {
+        "entry_point": _RUN.get("entry_point", ""),
+        "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "finished_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        "duration_seconds": round(now - started, 4),
+        "spans": spans,
+        "counters": counters,
+    }
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(report: dict[str, Any]) -> str:
+    entry = _label(report["entry_point"])
+    lines = [
+        f"# HELP {METRIC_PREFIX}_run_duration_seconds Wall time of the last run.",
+        f"# TYPE {METRIC_PREFIX}_run_duration_seconds gauge",
+        f'{METRIC_PREFIX}_run_duration_seconds{{entry_point="{entry}"}} {report["duration_seconds"]}',
+        f"# HELP {METRIC_PREFIX}_run_finished_timestamp_seconds When the last run finished.",
+        f"# TYPE {METRIC_PREFIX}_run_finished_timestamp_seconds gauge",
+        f'{METRIC_PREFIX}_run_finished_timestamp_seconds{{entry_point="{entry}"}} {time.time():.0f}',
+        f"# HELP {METRIC_PREFIX}_stage_seconds Time spent per stage in the last run.",
+        f"# TYPE {METRIC_PREFIX}_stage_seconds gauge",
+    ]
+    for name, stats in report["spans"].items():
+        lines.append(f'{METRIC_PREFIX}_stage_seconds{{entry_point="{entry}",stage="{_label(name)}"}} {stats["seconds"]}')
+    lines += [
+        f"# HELP {METRIC_PREFIX}_stage_calls Occurrences per stage in the last run.",
+        f"# TYPE {METRIC_PREFIX}_stage_calls gauge",
+    ]
+    for name, stats in report["spans"].items():
+        lines.append(f'{METRIC_PREFIX}_stage_calls{{entry_point="{entry}",stage="{_label(name)}"}} {stats["count"]}')
+    lines += [
+        f"# HELP {METRIC_PREFIX}_events Counters of the last run (feeds, bytes, messages, 429s, git attempts).",
+        f"# TYPE {METRIC_PREFIX}_events gauge",
+    ]
+    for name, value in report["counters"].items():
+        lines.append(f'{METRIC_PREFIX}_events{{entry_point="{entry}",counter="{_label(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def write_report() -> Path | None:
+    """Write the JSON report (and the Prometheus textfile if configured)."""
+    if not _RUN or not reports_enabled():
+        return None
+
+    report = snapshot()
+    name = report["entry_point"]
+    try:
+        path = repo_path(Path(RUN_REPORT_DIR) / f"{name}.json")
+        write_json_atomic(path, report, backup=False)
+        if PROMETHEUS_TEXTFILE_DIR:
+            # The textfile collector may read at any moment; never show it half a file.
+            write_text_atomic(
+                Path(PROMETHEUS_TEXTFILE_DIR) / f"{METRIC_PREFIX}_{name}.prom",
+                prometheus_text(report),
+            )
+    except OSError as exc:
+        print(f"⚠️ Could not write run report for {name}: {exc}")
+        return None
+
+    timings = ", ".join(
+        f"{stage} {stats['seconds']:.2f}s"
+        for stage, stats in report["spans"].items()
+        if "." not in stage
+    )
+    print(f"⏱️ {name} took {report['duration_seconds']:.2f}s ({timings or 'no stages recorded'}); report in {path}")
+    return path
+
+
+def start_run(entry_point: str) -> None:
+    """Name this process's report and write it at exit. Call once per entry point."""
+    with _LOCK:
+        if _RUN:
+            return
+        _RUN.update(entry_point=entry_point, started=time.time())
+    atexit.register(write_report)
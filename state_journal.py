@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Write-behind layer for the RSS state file.
+
+The bots used to rewrite the whole state_rss.json (three feeds' worth of
+seen GUIDs) after every single send. Now each delivery becomes one small
+line appended to a per-bot journal in state_journal/, flushed and fsynced
+before the next message goes out. The JSON file itself is written once,
+when the run ends.
+
+Crash safety matches the old per-send save: a delivered message is on disk
+before the next one is attempted. On the next load the journal is replayed
+over the JSON file, and whatever the previous run recorded counts as seen.
+The journal files are committed with the state, so a job killed by its
+timeout still hands its deliveries to the next run. Replay is idempotent,
+so a crash between writing the JSON and truncating the journal is harmless.
+"""
+from __future__ import annotations
+
+import copy
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from atomic_json import read_json, write_json_atomic
+from config_loader import file_value, repo_path
+
+STATE_JOURNAL_DIR = str(file_value("state_journal_dir", "state_journal") or "state_journal")
+
+
+def journal_path(scope: str) -> Path:
+    return repo_path(Path(STATE_JOURNAL_DIR) / f"{scope}.jsonl")
+
+
+def _to_json(value: Any) -> Any:
+    # Live containers such as guid_state.SeenGuids know their saved form.
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _apply(data: dict[str, Any], record: dict[str, Any]) -> None:
+    for key, value in (record.get("append") or {}).items():
+        items = data.get(key)
+        if hasattr(items, "add"):
+            items.add(value)
+            continue
+        if not isinstance(items, list):
+            items = data[key] = []
+        if value not in items:
+            items.append(value)
+    for key, value in (record.get("set") or {}).items():
+        data[key] = value
+
+
+class JournaledState:
+    """One JSON state file plus its append-only journal.
+
+    ``load`` returns the live state dict; mutate it through ``update`` for
+    anything that must survive a crash, or directly plus ``mark_dirty`` for
+    bookkeeping that is safe to redo. ``compact`` writes the JSON file and
+    empties the journal.
+    """
+
+    def __init__(self, path: str | Path, journal: str | Path) -> None:
+        self.path = Path(path)
+        self.journal = Path(journal)
+        self.data: dict[str, Any] = {}
+        self.dirty = False
+        self._handle = None
+        self._stamp: tuple[int, int] | None = None
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self, default: dict[str, Any]) -> dict[str, Any]:
+        # A long-running process keeps its live state (seen-sets included)
+        # between passes, as long as nothing else rewrote the file meanwhile.
+        stamp = self._file_stamp()
+        if self.data and not self.dirty and stamp is not None and stamp == self._stamp:
+            return self.data
+
+        data = read_json(self.path, None)
+        if data is None:
+            data = copy.deepcopy(default)
+            self.dirty = True
+
+        replayed = self._replay(data)
+        if replayed:
+            print(f"♻️ Replayed {replayed} journaled change(s) from {self.journal} into {self.path}")
+            self.dirty = True
+
+        self.data = data
+        self._stamp = stamp
+        return data
+
+    def _replay(self, data: dict[str, Any]) -> int:
+        try:
+            lines = self.journal.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return 0
+
+        count = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn line from a kill mid-append; that send never finished
+                # being recorded, same as before the journal existed.
+                continue
+            if isinstance(record, dict):
+                _apply(data, record)
+                count += 1
+        return count
+
+    def update(
+        self,
+        *,
+        append: dict[str, Any] | None = None,
+        set: dict[str, Any] | None = None,
+    ) -> None:
+        """Apply one change to the state and make it durable in the journal."""
+        record = {}
+        if append:
+            record["append"] = append
+        if set:
+            record["set"] = set
+        if not record:
+            return
+
+        _apply(self.data, record)
+
+        if self._handle is None:
+            self._open_journal()
+        self._handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self.dirty = True
+
+    def _open_journal(self) -> None:
+        self.journal.parent.mkdir(parents=True, exist_ok=True)
+        torn = False
+        if self.journal.exists() and self.journal.stat().st_size:
+            with self.journal.open("rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._handle = self.journal.open("a", encoding="utf-8")
+        if torn:
+            self._handle.write("\n")
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+
+    def compact(self) -> bool:
+        """Write the JSON file and empty the journal; return True if written."""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+        if not self.dirty:
+            return False
+
+        write_json_atomic(self.path, self.data, default=_to_json)
+
+        # Truncate instead of deleting: the file is tracked, so an empty
+        # journal shows up as "no change" to git.
+        if self.journal.exists():
+            self.journal.write_text("", encoding="utf-8")
+
+        self.dirty = False
+        self._stamp = self._file_stamp()
+        return True
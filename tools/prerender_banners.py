@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Pre-render completion banners into banner_cache/.
+
+Builds the banner completed_novel_checker would attach for every novel with
+a last_chapter, using the same template settings, so a completion post only
+reads a cached file. Novels whose completions are all recorded in state.json
+are skipped unless --all is given. It does not post to Discord.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import completed_novel_checker as checker  # noqa: E402
+
+
+def pending_completion(novel: dict, state: dict) -> bool:
+    keys = []
+    if novel.get("paid_feed"):
+        keys.append(checker.completion_key_for(novel, "paid"))
+    if novel.get("free_feed"):
+        keys.append(checker.completion_key_for(novel, "free"))
+    done = state.get(novel["novel_title"], {})
+    return any(not done.get(key) for key in keys)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-render completion banners into the banner cache.")
+    parser.add_argument("--all", action="store_true", help="Include novels whose completions were already sent.")
+    args = parser.parse_args(argv)
+
+    if not checker.COMPLETION_BANNER_SETTINGS["enabled"]:
+        print("ℹ️ Completion banners are disabled in completed_novels.toml; nothing to render.")
+        return 0
+
+    state = checker.load_state()
+    novels = [novel for novel in checker.load_novels() if args.all or pending_completion(novel, state)]
+    print(f"🖼️ Pre-rendering banners for {len(novels)} novel(s)")
+
+    failures = 0
+    for novel in novels:
+        if not (novel.get("featured_image") or "").strip():
+            continue
+        if checker.build_completion_attachment(novel) is None:
+            failures += 1
+
+    print(f"✅ Banner cache ready ({failures} failed)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
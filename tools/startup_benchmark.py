@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Startup benchmark for the bot and checker scripts.
+
+Imports each script module in a fresh interpreter several times and reports
+the median import time, plus whether discord.py or aiohttp got loaded along
+the way. It does not run the scripts, post to Discord, or touch state.
+
+The REST-only modules (the checkers and the renderer) must start without
+discord.py; --check turns that into a failing exit code.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules that only ever talk to Discord over REST.
+REST_MODULES = [
+    "message_renderer",
+    "discord_delivery",
+    "new_arc_checker",
+    "new_extra_checker",
+    "new_novel_checker",
+    "completed_novel_checker",
+]
+BOT_MODULES = [
+    "bot_free_chapters",
+    "bot_paid_chapters",
+    "bot_comments",
+]
+HEAVY_MODULES = ("discord", "aiohttp")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int) -> dict:
+    samples: list[float] = []
+    loaded: list[str] = []
+
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            lines = (proc.stderr or proc.stdout).strip().splitlines()
+            return {"module": module, "error": lines[-1] if lines else f"exit {proc.returncode}"}
+
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(result["ms"])
+        loaded = result["loaded"]
+
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(samples), 2),
+        "min_ms": round(min(samples), 2),
+        "loaded": loaded,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure import time of the bot and checker scripts.")
+    parser.add_argument("modules", nargs="*", help="Modules to measure (default: all scripts).")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (default 5).")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON, for tracking over time.")
+    parser.add_argument("--check", action="store_true", help="Fail if a REST-only module loads discord.py.")
+    args = parser.parse_args()
+
+    modules = args.modules or REST_MODULES + BOT_MODULES
+    results = [measure(module, max(1, args.runs)) for module in modules]
+
+    print(f"{'module':<28} {'median ms':>10} {'min ms':>8}  loaded")
+    failures = 0
+    for result in results:
+        if "error" in result:
+            print(f"⚠️ {result['module']:<26} skipped: {result['error']}")
+            continue
+
+        loaded = ", ".join(result["loaded"]) or "-"
+        print(f"{result['module']:<28} {result['median_ms']:>10.2f} {result['min_ms']:>8.2f}  {loaded}")
+        if args.check and result["module"] in REST_MODULES and "discord" in result["loaded"]:
+            print(f"❌ {result['module']} imports discord.py but only needs the REST payload.")
+            failures += 1
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())